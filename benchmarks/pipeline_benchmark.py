@@ -0,0 +1,331 @@
+"""Offline end-to-end benchmarks for the agent pipeline.
+
+Every provider is replaced by a ReplayProvider that serves recorded replies
+with a configurable latency distribution, so no network access or API key
+is needed. Run from the repository root:
+
+    python -m benchmarks.pipeline_benchmark --iterations 20 --latency lognormal:0.05,0.4
+
+Pass --record PATH (with real API keys) to capture live replies for later
+replay with --recordings PATH.
+"""
+
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+# Keep every store the components open inside a throwaway directory
+WORK_DIR = tempfile.mkdtemp(prefix="agent-benchmark-")
+atexit.register(shutil.rmtree, WORK_DIR, ignore_errors=True)
+for name in ("GROQ_API_KEY", "OPENAI_API_KEY", "OPENROUTER_API_KEY"):
+    os.environ.setdefault(name, "offline")
+os.environ.setdefault("MEMORY_DB_PATH", os.path.join(WORK_DIR, "memory.db"))
+os.environ.setdefault("TASK_HISTORY_DB", os.path.join(WORK_DIR, "task_history.db"))
+os.environ.setdefault("JOB_DB", os.path.join(WORK_DIR, "jobs.db"))
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+os.environ.setdefault("PLAN_LIBRARY_ENABLED", "false")
+os.environ.setdefault("PLAN_LIBRARY_DB", os.path.join(WORK_DIR, "plan_library.db"))
+os.environ.setdefault("EXECUTOR_SIMULATED_DELAY", "0,0")
+# Replayed providers have no quotas to protect
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import numpy as np
+from benchmarks.replay_provider import (
+    LatencyDistribution,
+    Recordings,
+    RecordingProvider,
+    ReplayProvider,
+)
+from components import (
+    AgentPipeline,
+    Evaluator,
+    Executor,
+    Memory,
+    Optimizer,
+    Planner,
+    Reasoner,
+)
+from config.config import GROQ_MODELS
+from src.clients.gateway import LLMGateway
+from src.clients.registry import registry
+from src.storage.memory_store import SQLiteMemoryStore
+from src.storage.task_history import TaskHistoryStore
+
+DEFAULT_RECORDINGS = os.path.join(os.path.dirname(__file__), "recordings.json")
+TASK = "Write a short market analysis for a new note-taking app"
+CONTEXT = {"audience": "product team", "deadline": "one week"}
+APIS = ["groq", "openai", "openrouter", "local"]
+
+Stage = Callable[[int], Awaitable[Any]]
+
+
+class Agent:
+    def __init__(self, providers: Dict[str, Any], api: str):
+        self.api = api
+        self.gateway = LLMGateway(
+            providers["groq"],
+            providers["openai"],
+            providers["openrouter"],
+            GROQ_MODELS[0],
+            local_client=providers["local"],
+        )
+        model = GROQ_MODELS[0]
+        self.planner = Planner(self.gateway, model)
+        self.reasoner = Reasoner(self.gateway, model)
+        self.executor = Executor(self.gateway, model)
+        self.evaluator = Evaluator(self.gateway, model)
+        self.memory = Memory(
+            self.gateway,
+            model,
+            storage_file=os.path.join(WORK_DIR, "memory.json"),
+            store=SQLiteMemoryStore(os.path.join(WORK_DIR, f"memory-{id(self)}.db")),
+        )
+        self.optimizer = Optimizer(self.gateway, model)
+        self.task_history = TaskHistoryStore(
+            os.path.join(WORK_DIR, f"task_history-{id(self)}.db")
+        )
+        self.pipeline = AgentPipeline(
+            self.planner,
+            self.executor,
+            self.evaluator,
+            self.optimizer,
+            self.task_history,
+            reasoner=self.reasoner,
+        )
+
+    async def prepare(self) -> Dict[str, Any]:
+        # One warm-up run supplies the plan, results and history the stages reuse
+        return await self.pipeline.run(TASK, dict(CONTEXT), self.api)
+
+    def stages(self, run: Dict[str, Any]) -> Dict[str, Stage]:
+        api, plan, results = self.api, run["plan"], run["results"]
+
+        async def memory_stage(i: int):
+            self.memory.add_to_short_term_memory(f"run-{i}", run["evaluation"])
+            await self.memory.summarize_and_store(run["evaluation"], CONTEXT, api)
+            return await self.memory.retrieve_relevant_info(TASK, CONTEXT, api)
+
+        return {
+            "planner": lambda i: self.planner.create_plan(TASK, api),
+            "reasoner": lambda i: asyncio.gather(
+                *(self.reasoner.analyze_step(step, CONTEXT, api) for step in plan)
+            ),
+            "executor": lambda i: self.executor.execute_plan(plan, dict(CONTEXT), api),
+            "evaluator": lambda i: self.evaluator.evaluate_plan(
+                plan, results, CONTEXT, api
+            ),
+            "memory": memory_stage,
+            "optimizer": lambda i: self.optimizer.optimize_all_components(
+                self.task_history.summary(), TASK, CONTEXT, api
+            ),
+            "pipeline": lambda i: self.pipeline.run(TASK, dict(CONTEXT), api),
+        }
+
+    def close(self):
+        self.memory.close()
+        self.task_history.close()
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "mean_ms": round(float(np.mean(latencies)) * 1000, 2),
+        "p50_ms": round(float(p50) * 1000, 2),
+        "p95_ms": round(float(p95) * 1000, 2),
+        "p99_ms": round(float(p99) * 1000, 2),
+    }
+
+
+def allocation_stats(before: tracemalloc.Snapshot, peak: int) -> Dict[str, float]:
+    after = tracemalloc.take_snapshot()
+    diff = after.compare_to(before, "filename")
+    return {
+        "alloc_blocks": sum(stat.count_diff for stat in diff if stat.count_diff > 0),
+        "alloc_kb": round(sum(stat.size_diff for stat in diff if stat.size_diff > 0) / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+async def bench_stage(
+    name: str,
+    stage: Stage,
+    providers: Dict[str, Any],
+    iterations: int,
+    concurrency: int,
+) -> Dict[str, Any]:
+    calls_before = sum(provider.total_calls() for provider in providers.values())
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def run_once(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await stage(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_once(i) for i in range(iterations)))
+    wall = time.perf_counter() - started
+    calls = sum(provider.total_calls() for provider in providers.values()) - calls_before
+
+    # Allocations are measured on a separate run so tracing does not skew timings
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    await stage(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    allocations = allocation_stats(before, peak)
+    tracemalloc.stop()
+
+    return {
+        "stage": name,
+        "iterations": iterations,
+        "throughput_per_s": round(iterations / wall, 2),
+        **percentiles(latencies),
+        "llm_calls_per_iter": round(calls / iterations, 2),
+        **allocations,
+    }
+
+
+def bench_run_task(
+    providers: Dict[str, Any], api: str, iterations: int
+) -> Dict[str, Any]:
+    # Importing main builds the app's own components; swap in the replay providers
+    import main
+    from fastapi.testclient import TestClient
+
+    main.gateway.clients.update(providers)
+    payload = {"task": TASK, "context": {**CONTEXT, "api": api}}
+    calls_before = sum(provider.total_calls() for provider in providers.values())
+    latencies: List[float] = []
+    with TestClient(main.app) as client:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            request_started = time.perf_counter()
+            response = client.post("/run_task", json=payload)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - request_started)
+        wall = time.perf_counter() - started
+        calls = sum(provider.total_calls() for provider in providers.values()) - calls_before
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        client.post("/run_task", json=payload).raise_for_status()
+        _, peak = tracemalloc.get_traced_memory()
+        allocations = allocation_stats(before, peak)
+        tracemalloc.stop()
+
+    return {
+        "stage": "run_task (http)",
+        "iterations": iterations,
+        "throughput_per_s": round(iterations / wall, 2),
+        **percentiles(latencies),
+        "llm_calls_per_iter": round(calls / iterations, 2),
+        **allocations,
+    }
+
+
+async def run_benchmarks(
+    providers: Dict[str, Any],
+    api: str,
+    iterations: int,
+    concurrency: int,
+    stages: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    agent = Agent(providers, api)
+    try:
+        run = await agent.prepare()
+        report = []
+        for name, stage in agent.stages(run).items():
+            if stages and name not in stages:
+                continue
+            report.append(
+                await bench_stage(name, stage, providers, iterations, concurrency)
+            )
+        return report
+    finally:
+        agent.close()
+
+
+async def record(path: str, api: str):
+    recordings = Recordings.load(path) if os.path.exists(path) else Recordings.load(
+        DEFAULT_RECORDINGS
+    )
+    providers = {
+        name: RecordingProvider(registry.async_client(name), recordings) for name in APIS
+    }
+    agent = Agent(providers, api)
+    try:
+        run = await agent.prepare()
+        for stage in agent.stages(run).values():
+            await stage(0)
+    finally:
+        agent.close()
+    recordings.save(path)
+    print(f"Recorded {len(recordings.responses)} replies to {path}")
+
+
+def print_report(report: List[Dict[str, Any]]):
+    columns = list(report[0].keys())
+    widths = {
+        column: max(len(column), *(len(str(row[column])) for row in report))
+        for column in columns
+    }
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in report:
+        print("  ".join(str(row[column]).ljust(widths[column]) for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument(
+        "--latency",
+        default="fixed:0",
+        help="fixed:S | uniform:A,B | normal:MEAN,STD | lognormal:MEDIAN,SIGMA (seconds)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--api", default="groq", choices=APIS)
+    parser.add_argument("--stages", nargs="*", help="Only run these stages")
+    parser.add_argument("--no-http", action="store_true", help="Skip the FastAPI run_task stage")
+    parser.add_argument("--recordings", default=DEFAULT_RECORDINGS)
+    parser.add_argument("--record", metavar="PATH", help="Record live replies instead of benchmarking")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record(args.record, args.api))
+        return
+
+    recordings = Recordings.load(args.recordings)
+    latency = LatencyDistribution(args.latency, args.seed)
+    providers = {name: ReplayProvider(recordings, latency) for name in APIS}
+
+    report = asyncio.run(
+        run_benchmarks(providers, args.api, args.iterations, args.concurrency, args.stages)
+    )
+    if not args.no_http and (not args.stages or "run_task" in args.stages):
+        report.append(bench_run_task(providers, args.api, args.iterations))
+
+    print(
+        f"latency={args.latency} iterations={args.iterations} "
+        f"concurrency={args.concurrency} api={args.api}"
+    )
+    print_report(report)
+    calls = sum((provider.calls for provider in providers.values()), Counter())
+    print("\nLLM calls by route: " + ", ".join(f"{k}={v}" for k, v in calls.most_common()))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "report": report, "calls": dict(calls)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import types
+import orjson
+from src.utils.tokens import estimate_tokens
+
+
+class LatencyDistribution:
+    """Simulated provider latency, in seconds, parsed from a spec string.
+
+    Supported specs: "fixed:0.05", "uniform:0.02,0.2", "normal:0.1,0.02"
+    (mean, stddev) and "lognormal:0.08,0.5" (median, sigma). Sampling is
+    seeded so two runs with the same spec see the same latencies.
+    """
+
+    def __init__(self, spec: str = "fixed:0", seed: Optional[int] = 0):
+        kind, _, args = spec.partition(":")
+        self.spec = spec
+        self.kind = kind
+        self.args = [float(arg) for arg in args.split(",") if arg]
+        self.rng = random.Random(seed)
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Invalid latency distribution: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.args[0] if self.args else 0.0
+        if self.kind == "uniform":
+            return self.rng.uniform(*self.args)
+        if self.kind == "normal":
+            return max(0.0, self.rng.gauss(*self.args))
+        median, sigma = self.args
+        return self.rng.lognormvariate(math.log(median), sigma)
+
+
+def request_key(kwargs: Dict[str, Any]) -> str:
+    payload = {
+        "messages": kwargs["messages"],
+        "json_mode": "response_format" in kwargs,
+    }
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def message_text(kwargs: Dict[str, Any]) -> str:
+    return "\n".join(message["content"] for message in kwargs["messages"])
+
+
+class Recordings:
+    """Recorded provider replies for offline replay.
+
+    Exact replies are keyed on a hash of the request messages. Anything not
+    recorded falls back to the first route whose "match" text appears in the
+    request; a route with a "repeat" pattern returns its reply repeated N
+    times as a JSON list, N being the number captured from the request.
+    """
+
+    def __init__(
+        self,
+        responses: Optional[Dict[str, str]] = None,
+        routes: Optional[List[Dict[str, str]]] = None,
+    ):
+        self.responses = responses or {}
+        self.routes = routes or []
+
+    @classmethod
+    def load(cls, path: str) -> "Recordings":
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(data.get("responses"), data.get("routes"))
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"routes": self.routes, "responses": self.responses}, f, indent=2)
+
+    def route(self, kwargs: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        text = message_text(kwargs)
+        return next((route for route in self.routes if route["match"] in text), None)
+
+    def lookup(self, kwargs: Dict[str, Any]) -> Tuple[str, str]:
+        route = self.route(kwargs)
+        name = route["name"] if route else "unmatched"
+        key = request_key(kwargs)
+        if key in self.responses:
+            return name, self.responses[key]
+        if route is None:
+            return name, "{}"
+        if "repeat" in route:
+            match = re.search(route["repeat"], message_text(kwargs))
+            count = int(match.group(1)) if match else 1
+            return name, "[" + ", ".join([route["response"]] * count) + "]"
+        return name, route["response"]
+
+
+def completion(content: str, kwargs: Dict[str, Any]) -> Any:
+    prompt_tokens = estimate_tokens(message_text(kwargs))
+    completion_tokens = estimate_tokens(content)
+    return types.SimpleNamespace(
+        choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))],
+        usage=types.SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        ),
+    )
+
+
+def chunk(content: str) -> Any:
+    delta = types.SimpleNamespace(content=content)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+
+class ReplayCompletions:
+    def __init__(self, recordings: Recordings, latency: LatencyDistribution):
+        self.recordings = recordings
+        self.latency = latency
+        self.calls: Counter = Counter()
+
+    async def create(self, **kwargs: Any):
+        route, content = self.recordings.lookup(kwargs)
+        self.calls[route] += 1
+        # The sampled latency is time to first token; the rest streams immediately
+        await asyncio.sleep(self.latency.sample())
+        if kwargs.get("stream"):
+            return self.stream(content)
+        return completion(content, kwargs)
+
+    async def stream(self, content: str, size: int = 16) -> AsyncIterator[Any]:
+        for start in range(0, len(content), size):
+            await asyncio.sleep(0)
+            yield chunk(content[start : start + size])
+
+
+class ReplayProvider:
+    """Stand-in for an async SDK client that replays recorded replies."""
+
+    def __init__(self, recordings: Recordings, latency: LatencyDistribution):
+        self.completions = ReplayCompletions(recordings, latency)
+        self.chat = types.SimpleNamespace(completions=self.completions)
+
+    @property
+    def calls(self) -> Counter:
+        return self.completions.calls
+
+    def total_calls(self) -> int:
+        return sum(self.completions.calls.values())
+
+    async def close(self):
+        pass
+
+
+class RecordingCompletions:
+    def __init__(self, client: Any, recordings: Recordings):
+        self.client = client
+        self.recordings = recordings
+
+    async def create(self, **kwargs: Any):
+        key = request_key(kwargs)
+        response = await self.client.chat.completions.create(**kwargs)
+        if not kwargs.get("stream"):
+            self.recordings.responses[key] = response.choices[0].message.content
+            return response
+        return self.record_stream(key, response)
+
+    async def record_stream(self, key: str, stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        parts = []
+        async for part in stream:
+            if part.choices and part.choices[0].delta.content:
+                parts.append(part.choices[0].delta.content)
+            yield part
+        self.recordings.responses[key] = "".join(parts)
+
+
+class RecordingProvider:
+    """Wraps a live async SDK client and records every reply for replay."""
+
+    def __init__(self, client: Any, recordings: Recordings):
+        self.client = client
+        self.chat = types.SimpleNamespace(
+            completions=RecordingCompletions(client, recordings)
+        )
+
+    async def close(self):
+        await self.client.close()
@@ -4,5 +4,7 @@ from .executor import Executor
 from .evaluator import Evaluator
 from .memory import Memory
 from .optimizer import Optimizer
+from .staged_runner import StagedRunner
+from .pipeline import AgentPipeline
 
-__all__ = ['Planner', 'Reasoner', 'Executor', 'Evaluator', 'Memory', 'Optimizer']
\ No newline at end of file
+__all__ = ['Planner', 'Reasoner', 'Executor', 'Evaluator', 'Memory', 'Optimizer', 'StagedRunner', 'AgentPipeline']
\ No newline at end of file
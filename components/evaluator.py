@@ -1,25 +1,49 @@
-from typing import Dict, Any, List
-from openai import OpenAI
-from groq import Groq
-from config.config import GROQ_MODELS, OPENAI_MODEL, OPENROUTER_MODEL
+from typing import Dict, Any, List, Optional
+import asyncio
+import time
+from config.config import (
+    EVALUATOR_MODE,
+    EVALUATOR_MAX_CONCURRENCY,
+    EVALUATOR_BATCH_SIZE,
+)
+from components.schemas import ActionEvaluation, ActionEvaluations, PlanEvaluation
+from src.clients.gateway import LLMGateway
+from src.utils.prompt_budget import build_prompt, call_budget, compact
+from src.utils.tracing import instrument
 
+EVALUATION_MODES = ["sequential", "concurrent", "batch"]
 
 
+@instrument("evaluator")
 class Evaluator:
-    def __init__(self, groq_client: Groq, openai_client: OpenAI, openrouter_client: OpenAI, default_groq_model: str):
-        self.groq_client = groq_client
-        self.openai_client = openai_client
-        self.openrouter_client = openrouter_client
+    def __init__(
+        self,
+        gateway: LLMGateway,
+        default_groq_model: str,
+        mode: str = EVALUATOR_MODE,
+        max_concurrency: int = EVALUATOR_MAX_CONCURRENCY,
+        batch_size: int = EVALUATOR_BATCH_SIZE,
+    ):
+        if mode not in EVALUATION_MODES:
+            raise ValueError(f"Invalid evaluation mode: {mode}")
+        self.gateway = gateway
         self.default_groq_model = default_groq_model
+        self.mode = mode
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        # "mode:api" -> accumulated timings for scoring the actions of a plan
+        self.timings: Dict[str, Dict[str, float]] = {}
 
-    def evaluate_action(
+    async def evaluate_action(
         self,
         action: Dict[str, str],
         result: Dict[str, Any],
         context: Dict[str, Any],
         api: str = "groq",
     ) -> Dict[str, Any]:
-        prompt = f"""
+        prompt = build_prompt(
+            "evaluator.evaluate_action",
+            """
         Action: {action}
         Result: {result}
         Context: {context}
@@ -31,63 +55,158 @@ class Evaluator:
         4. Unexpected outcomes or surprises
         5. Recommendations for future actions
 
-        Format the output as a Python dictionary with keys: 'score', 'achievements', 'improvements', 'surprises', and 'recommendations'.
-        """
-
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI evaluator. Your job is to assess the outcomes of actions and provide constructive feedback.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI evaluator. Your job is to assess the outcomes of actions and provide constructive feedback.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
+        Format the output as a JSON object with keys: 'score', 'achievements', 'improvements', 'surprises', and 'recommendations'.
+        """,
+            action=action,
+            result=result,
+            context=context,
+        )
+
+        evaluation = await self.gateway.complete_structured(
+            api,
+            "You are an AI evaluator. Your job is to assess the outcomes of actions and provide constructive feedback.",
+            prompt,
+            ActionEvaluation,
+            call="evaluator.evaluate_action",
+        )
+        return evaluation
+
+    async def evaluate_actions(
+        self,
+        plan: List[Dict[str, Any]],
+        results: List[Dict[str, Any]],
+        context: Dict[str, Any],
+        api: str = "groq",
+        mode: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        mode = mode or self.mode
+        started = time.perf_counter()
+
+        if mode == "sequential":
+            evaluations = [
+                await self.evaluate_action(action, result, context, api)
+                for action, result in zip(plan, results)
+            ]
+        elif mode == "concurrent":
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def evaluate(action, result):
+                async with semaphore:
+                    return await self.evaluate_action(action, result, context, api)
+
+            evaluations = await asyncio.gather(
+                *(evaluate(action, result) for action, result in zip(plan, results))
             )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI evaluator. Your job is to assess the outcomes of actions and provide constructive feedback.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
+        elif mode == "batch":
+            pairs = list(zip(plan, results))
+            batches = [
+                pairs[i : i + self.batch_size]
+                for i in range(0, len(pairs), self.batch_size)
+            ]
+            batch_evaluations = await asyncio.gather(
+                *(self.evaluate_action_batch(batch, context, api) for batch in batches)
             )
+            evaluations = [
+                evaluation for batch in batch_evaluations for evaluation in batch
+            ]
         else:
-            raise ValueError(f"Invalid API: {api}")
+            raise ValueError(f"Invalid evaluation mode: {mode}")
 
-        evaluation = eval(response.choices[0].message.content)
-        return evaluation
+        self.record_timing(mode, api, len(evaluations), time.perf_counter() - started)
+        return list(evaluations)
 
-    def evaluate_plan(
+    async def evaluate_action_batch(
         self,
-        plan: List[Dict[str, str]],
+        pairs: List[tuple],
+        context: Dict[str, Any],
+        api: str = "groq",
+    ) -> List[Dict[str, Any]]:
+        # Every action must stay in the prompt, so each pair gets an equal share of the
+        # budget up front and the list itself is exempt from compaction
+        pair_budget = call_budget("evaluator.evaluate_action_batch") // (len(pairs) + 2)
+        actions_str = "\n".join(
+            f"{index}. Action: {compact(action, pair_budget // 2)}\n"
+            f"   Result: {compact(result, pair_budget // 2)}"
+            for index, (action, result) in enumerate(pairs, start=1)
+        )
+        prompt = build_prompt(
+            "evaluator.evaluate_action_batch",
+            """
+        Actions and results:
+        {actions_str}
+        Context: {context}
+
+        Evaluate the outcome of each action independently and provide:
+        1. A success score (0-100)
+        2. Key achievements
+        3. Areas for improvement
+        4. Unexpected outcomes or surprises
+        5. Recommendations for future actions
+
+        Format the output as a JSON list with exactly {count} objects, one per action and in the same order,
+        each with keys: 'score', 'achievements', 'improvements', 'surprises', and 'recommendations'.
+        """,
+            keep=("actions_str", "count"),
+            actions_str=actions_str,
+            context=context,
+            count=len(pairs),
+        )
+
+        evaluations = await self.gateway.complete_structured(
+            api,
+            "You are an AI evaluator. Your job is to assess the outcomes of actions and provide constructive feedback.",
+            prompt,
+            ActionEvaluations,
+            call="evaluator.evaluate_action_batch",
+        )
+        if not isinstance(evaluations, list) or len(evaluations) != len(pairs):
+            # The model lost track of the batch; score these actions one by one
+            return await asyncio.gather(
+                *(
+                    self.evaluate_action(action, result, context, api)
+                    for action, result in pairs
+                )
+            )
+        return evaluations
+
+    def record_timing(self, mode: str, api: str, actions: int, seconds: float):
+        timing = self.timings.setdefault(
+            f"{mode}:{api}", {"runs": 0, "actions": 0, "seconds": 0.0}
+        )
+        timing["runs"] += 1
+        timing["actions"] += actions
+        timing["seconds"] += seconds
+
+    def get_timing_metrics(self) -> Dict[str, Dict[str, float]]:
+        return {
+            key: {
+                **timing,
+                "avg_seconds_per_run": timing["seconds"] / timing["runs"],
+                "avg_seconds_per_action": (
+                    timing["seconds"] / timing["actions"] if timing["actions"] else 0.0
+                ),
+            }
+            for key, timing in self.timings.items()
+        }
+
+    async def evaluate_plan(
+        self,
+        plan: List[Dict[str, Any]],
         results: List[Dict[str, Any]],
         context: Dict[str, Any],
         api: str = "groq",
+        mode: Optional[str] = None,
+        evaluations: Optional[List[Dict[str, Any]]] = None,
     ) -> Dict[str, Any]:
-        evaluations = [
-            self.evaluate_action(action, result, context, api)
-            for action, result in zip(plan, results)
-        ]
+        # Actions already scored while the plan ran (staged pipeline) are not scored again
+        if evaluations is None:
+            evaluations = await self.evaluate_actions(plan, results, context, api, mode)
 
         overall_score = sum(eval["score"] for eval in evaluations) / len(evaluations)
 
-        prompt = f"""
+        prompt = build_prompt(
+            "evaluator.evaluate_plan",
+            """
         Plan: {plan}
         Results: {results}
         Individual Evaluations: {evaluations}
@@ -100,53 +219,31 @@ class Evaluator:
         3. Lessons learned
         4. Recommendations for future planning and execution
 
-        Format the output as a Python dictionary with keys: 'summary', 'improvements', 'lessons', and 'recommendations'.
-        """
-
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI evaluator. Your job is to provide an overall assessment of plan execution and offer strategic insights.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI evaluator. Your job is to provide an overall assessment of plan execution and offer strategic insights.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI evaluator. Your job is to provide an overall assessment of plan execution and offer strategic insights.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        else:
-            raise ValueError(f"Invalid API: {api}")
+        Format the output as a JSON object with keys: 'summary', 'improvements', 'lessons', and 'recommendations'.
+        """,
+            plan=plan,
+            results=results,
+            evaluations=evaluations,
+            overall_score=overall_score,
+            context=context,
+        )
 
-        overall_evaluation = eval(response.choices[0].message.content)
+        overall_evaluation = await self.gateway.complete_structured(
+            api,
+            "You are an AI evaluator. Your job is to provide an overall assessment of plan execution and offer strategic insights.",
+            prompt,
+            PlanEvaluation,
+            call="evaluator.evaluate_plan",
+        )
         overall_evaluation["score"] = overall_score
         overall_evaluation["action_evaluations"] = evaluations
 
         return overall_evaluation
 
-    def generate_report(self, evaluation: Dict[str, Any], api: str = "groq") -> str:
-        prompt = f"""
+    async def generate_report(self, evaluation: Dict[str, Any], api: str = "groq") -> str:
+        prompt = build_prompt(
+            "evaluator.generate_report",
+            """
         Evaluation: {evaluation}
 
         Generate a detailed report based on this evaluation. The report should include:
@@ -158,43 +255,14 @@ class Evaluator:
         6. Next steps
 
         Format the report in Markdown.
-        """
-
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI report generator. Your job is to create clear, insightful reports based on evaluation data.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI report generator. Your job is to create clear, insightful reports based on evaluation data.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI report generator. Your job is to create clear, insightful reports based on evaluation data.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        else:
-            raise ValueError(f"Invalid API: {api}")
+        """,
+            evaluation=evaluation,
+        )
 
-        report = response.choices[0].message.content
+        report = await self.gateway.complete(
+            api,
+            "You are an AI report generator. Your job is to create clear, insightful reports based on evaluation data.",
+            prompt,
+            call="evaluator.generate_report",
+        )
         return report
@@ -1,26 +1,43 @@
-from typing import Dict, Any, List
-from openai import OpenAI
-from groq import Groq
-import time
+from typing import Dict, Any, List, Optional, Callable, Awaitable, AsyncIterable, Tuple, Union
+import asyncio
+import logging
 import random
-from config.config import GROQ_MODELS, OPENAI_MODEL, OPENROUTER_MODEL
+import re
+from config.config import EXECUTOR_MAX_CONCURRENCY, EXECUTOR_SIMULATED_DELAY
+from components.schemas import ErrorHandling, ExecutionResult
+from src.clients.gateway import LLMGateway
+from src.utils.prompt_budget import build_prompt
+from src.utils.tracing import instrument
 
+# A 1-based step number, optionally written as "Step 2"
+STEP_NUMBER_PATTERN = re.compile(r"^\s*(?:step\s*)?#?(\d+)\s*$", re.IGNORECASE)
 
+StepCallback = Callable[[int, Dict[str, Any], Dict[str, Any]], Awaitable[None]]
 
+
+@instrument("executor")
 class Executor:
-    def __init__(self, groq_client: Groq, openai_client: OpenAI, openrouter_client: OpenAI, default_groq_model: str):
-        self.groq_client = groq_client
-        self.openai_client = openai_client
-        self.openrouter_client = openrouter_client
+    def __init__(
+        self,
+        gateway: LLMGateway,
+        default_groq_model: str,
+        max_concurrency: int = EXECUTOR_MAX_CONCURRENCY,
+        simulated_delay: Tuple[float, float] = EXECUTOR_SIMULATED_DELAY,
+    ):
+        self.gateway = gateway
         self.default_groq_model = default_groq_model
+        self.max_concurrency = max_concurrency
+        self.simulated_delay = simulated_delay
 
-    def execute_action(
+    async def execute_action(
         self, action: Dict[str, str], context: Dict[str, Any], api: str = "groq"
     ) -> Dict[str, Any]:
         # Simulate action execution
-        time.sleep(random.uniform(0.5, 2.0))  # Simulate varying execution times
+        await asyncio.sleep(random.uniform(*self.simulated_delay))  # Simulate varying execution times
 
-        prompt = f"""
+        prompt = build_prompt(
+            "executor.execute_action",
+            """
         Action to execute: {action}
         Context: {context}
 
@@ -30,72 +47,168 @@ class Executor:
         3. Resources used during execution
         4. Time taken to complete (in minutes)
 
-        Format the output as a Python dictionary with keys: 'result', 'side_effects', 'resources_used', and 'time_taken'.
-        """
-
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI executor. Your job is to simulate the execution of actions and provide realistic outcomes.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI executor. Your job is to simulate the execution of actions and provide realistic outcomes.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI executor. Your job is to simulate the execution of actions and provide realistic outcomes.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        else:
-            raise ValueError(f"Invalid API: {api}")
-
-        execution_result = eval(response.choices[0].message.content)
+        Format the output as a JSON object with keys: 'result', 'side_effects', 'resources_used', and 'time_taken'.
+        """,
+            action=action,
+            context=context,
+        )
+
+        execution_result = await self.gateway.complete_structured(
+            api,
+            "You are an AI executor. Your job is to simulate the execution of actions and provide realistic outcomes.",
+            prompt,
+            ExecutionResult,
+            call="executor.execute_action",
+        )
         return execution_result
 
-    def execute_plan(
-        self, plan: List[Dict[str, str]], context: Dict[str, Any], api: str = "groq"
+    async def execute_plan(
+        self,
+        plan: Union[List[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+        context: Dict[str, Any],
+        api: str = "groq",
+        on_step: Optional[StepCallback] = None,
     ) -> List[Dict[str, Any]]:
-        results = []
-        for step in plan:
-            result = self.execute_action(step, context, api)
-            results.append(result)
-
-            # Update context based on the result
-            context.update(
-                {
-                    "last_action": step["action"],
-                    "last_result": result["result"],
-                    "resources_used": result["resources_used"],
-                    "total_time": context.get("total_time", 0) + result["time_taken"],
-                }
+        # A plan can also be an async iterator of steps (Planner.stream_plan):
+        # each step starts as soon as it and the steps it depends on are known
+        streamed = not isinstance(plan, list)
+        steps: List[Dict[str, Any]] = [] if streamed else plan
+        dependencies: Dict[int, List[int]] = {}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        base_context = dict(context)
+        step_contexts: Dict[int, Dict[str, Any]] = {}
+        tasks: Dict[int, asyncio.Task] = {}
+
+        async def run_step(index: int) -> Dict[str, Any]:
+            if dependencies[index]:
+                await asyncio.gather(*(tasks[dep] for dep in dependencies[index]))
+            # Each branch works on its own snapshot, built from its dependencies
+            step_context = self.merge_contexts(
+                base_context, [step_contexts[dep] for dep in dependencies[index]]
             )
+            async with semaphore:
+                result = await self.execute_action(steps[index], step_context, api)
+
+            self.advance_context(step_context, steps[index], result)
+            step_contexts[index] = step_context
+            if on_step is not None:
+                await on_step(index, steps[index], result)
+            return result
+
+        def start(index: int, deps: List[int]):
+            dependencies[index] = deps
+            tasks[index] = asyncio.create_task(run_step(index))
+
+        try:
+            await self._schedule(plan, steps, tasks, start)
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        dependents = {dep for deps in dependencies.values() for dep in deps}
+        sinks = [index for index in range(len(steps)) if index not in dependents]
+        context.update(
+            self.merge_contexts(base_context, [step_contexts[index] for index in sinks])
+        )
+
+        return [tasks[index].result() for index in range(len(steps))]
+
+    async def _schedule(
+        self,
+        plan: Union[List[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+        steps: List[Dict[str, Any]],
+        tasks: Dict[int, asyncio.Task],
+        start: Callable[[int, List[int]], None],
+    ):
+        # Steps only depend on earlier ones, so each starts as soon as it is known
+        indices_by_action: Dict[str, int] = {}
+
+        async def planned():
+            if isinstance(plan, list):
+                for step in plan:
+                    yield step
+            else:
+                async for step in plan:
+                    steps.append(step)
+                    yield step
+
+        index = 0
+        async for step in planned():
+            start(index, self.resolve_step(step, index, indices_by_action))
+            indices_by_action.setdefault(step["action"], index)
+            index += 1
+            # Stop consuming the plan once a step has failed
+            for task in tasks.values():
+                if task.done() and not task.cancelled() and task.exception():
+                    raise task.exception()
+
+    @staticmethod
+    def resolve_step(
+        step: Dict[str, Any], index: int, indices_by_action: Dict[str, int]
+    ) -> List[int]:
+        # "depends_on" names earlier steps by action, or by step number counting from 1
+        # (2, "2" or "Step 2"). A step without it follows the previous one; an empty list
+        # means no dependencies. indices_by_action only holds the earlier steps.
+        refs = step.get("depends_on")
+        if refs is None:
+            return [index - 1] if index else []
+        resolved = set()
+        for ref in refs:
+            match = STEP_NUMBER_PATTERN.match(ref) if isinstance(ref, str) else None
+            if isinstance(ref, str) and ref in indices_by_action:
+                resolved.add(indices_by_action[ref])
+            elif isinstance(ref, int) and not isinstance(ref, bool) and 1 <= ref <= index:
+                resolved.add(ref - 1)
+            elif match and 1 <= int(match.group(1)) <= index:
+                resolved.add(int(match.group(1)) - 1)
+            else:
+                # Self, forward and unknown references are dropped rather than failing the plan
+                logging.warning(
+                    f"Step {index + 1} ('{step['action']}') ignores dependency {ref!r}: "
+                    "not an earlier step"
+                )
+        if refs and not resolved:
+            # The step meant to wait on something; the previous step is the safe choice
+            return [index - 1] if index else []
+        return sorted(resolved)
+
+    @staticmethod
+    def advance_context(
+        step_context: Dict[str, Any], step: Dict[str, Any], result: Dict[str, Any]
+    ):
+        # Update context based on the result
+        step_context.update(
+            {
+                "last_action": step["action"],
+                "last_result": result["result"],
+                "resources_used": result["resources_used"],
+                "total_time": step_context.get("total_time", 0) + result["time_taken"],
+            }
+        )
+
+    @staticmethod
+    def merge_contexts(
+        base_context: Dict[str, Any], branch_contexts: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        # Branches are merged in plan order; the join waits on the slowest branch
+        merged = dict(base_context)
+        for branch_context in branch_contexts:
+            merged.update(branch_context)
+        if branch_contexts:
+            merged["total_time"] = max(
+                branch_context.get("total_time", 0) for branch_context in branch_contexts
+            )
+        return merged
 
-        return results
-
-    def handle_error(
+    async def handle_error(
         self, error: Dict[str, Any], context: Dict[str, Any], api: str = "groq"
     ) -> Dict[str, Any]:
-        prompt = f"""
+        prompt = build_prompt(
+            "executor.handle_error",
+            """
         Error encountered: {error}
         Context: {context}
 
@@ -105,44 +218,17 @@ class Executor:
         3. Potential fixes or workarounds
         4. Steps to implement the solution
 
-        Format the output as a Python dictionary with keys: 'analysis', 'solution', and 'implementation_steps'.
-        """
-
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI error handler. Your job is to analyze errors and propose solutions.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI error handler. Your job is to analyze errors and propose solutions.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI error handler. Your job is to analyze errors and propose solutions.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        else:
-            raise ValueError(f"Invalid API: {api}")
-
-        error_handling = eval(response.choices[0].message.content)
+        Format the output as a JSON object with keys: 'analysis', 'solution', and 'implementation_steps'.
+        """,
+            error=error,
+            context=context,
+        )
+
+        error_handling = await self.gateway.complete_structured(
+            api,
+            "You are an AI error handler. Your job is to analyze errors and propose solutions.",
+            prompt,
+            ErrorHandling,
+            call="executor.handle_error",
+        )
         return error_handling
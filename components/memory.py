@@ -1,59 +1,156 @@
-from typing import Dict, Any, List
-from openai import OpenAI
-from groq import Groq
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
 import json
 import os
-from config.config import GROQ_MODELS, OPENAI_MODEL, OPENROUTER_MODEL
-
-
+from config.config import (
+    GROQ_MODELS,
+    MEMORY_DB_PATH,
+    MEMORY_BATCH_SIZE,
+    MEMORY_INDEX_BACKEND,
+    MEMORY_TOP_K,
+    MEMORY_TOKEN_BUDGET,
+    MEMORY_MIN_SCORE,
+    EMBEDDING_DIM,
+)
+from components.schemas import Insights, RetrievalResult
+from src.clients.gateway import LLMGateway
+from src.storage.memory_store import SQLiteMemoryStore
+from src.storage.vector_index import VectorIndex
+from src.utils.embeddings import HashingEmbedder
+from src.utils.tokens import estimate_tokens
+from src.utils.prompt_budget import build_prompt
+from src.utils.tracing import instrument
+
+
+@instrument("memory")
 class Memory:
     def __init__(
         self,
-        groq_client: Groq,
-        openai_client: OpenAI,
-        openrouter_client: OpenAI,
+        gateway: LLMGateway,
         default_groq_model: str,
         storage_file: str = "memory_storage.json",
+        store: Optional[SQLiteMemoryStore] = None,
     ):
-        self.groq_client = groq_client
-        self.openai_client = openai_client
-        self.openrouter_client = openrouter_client
+        self.gateway = gateway
         self.default_groq_model = default_groq_model
         self.storage_file = storage_file
         self.short_term_memory = {}
-        self.long_term_memory = self.load_long_term_memory()
-
-    def load_long_term_memory(self) -> Dict[str, Any]:
-        if os.path.exists(self.storage_file):
-            with open(self.storage_file, "r") as f:
-                return json.load(f)
-        return {}
-
-    def save_long_term_memory(self):
-        with open(self.storage_file, "w") as f:
-            json.dump(self.long_term_memory, f)
+        self.store = store or SQLiteMemoryStore(MEMORY_DB_PATH, MEMORY_BATCH_SIZE)
+        # One-time migration from the legacy JSON file into an empty store
+        if len(self.store) == 0 and os.path.exists(self.storage_file):
+            self.load_long_term_memory()
+        self.embedder = HashingEmbedder(EMBEDDING_DIM)
+        # Built on first retrieval (or by load_index at startup), then kept up to
+        # date by the add_to_* methods
+        self.index: Optional[VectorIndex] = None
+        self.index_task: Optional[asyncio.Task] = None
+        # Changes made while the index is being built in a worker thread, as
+        # (tier, key, value) with value None for a removal
+        self.index_backlog: Optional[List[Tuple[str, str, Any]]] = None
+
+    @property
+    def long_term_memory(self) -> Dict[str, Any]:
+        return dict(self.store.items())
+
+    def load_long_term_memory(self, path: Optional[str] = None) -> int:
+        count = self.store.import_json(path or self.storage_file)
+        self.index = None
+        return count
+
+    def save_long_term_memory(self, path: Optional[str] = None):
+        self.store.export_json(path or self.storage_file)
 
     def add_to_short_term_memory(self, key: str, value: Any):
         self.short_term_memory[key] = value
+        self.index_entry("short-term", key, value)
 
     def add_to_long_term_memory(self, key: str, value: Any):
-        self.long_term_memory[key] = value
-        self.save_long_term_memory()
+        self.store.set(key, value)
+        self.index_entry("long-term", key, value)
+
+    def index_entry(self, tier: str, key: str, value: Any):
+        if self.index is None:
+            if self.index_backlog is not None:
+                self.index_backlog.append((tier, key, value))
+            return
+        self.upsert_entry(self.index, tier, key, value)
+
+    def upsert_entry(self, index: VectorIndex, tier: str, key: str, value: Any):
+        text = f"{key}: {json.dumps(value, default=str)}"
+        index.upsert(f"{tier}:{key}", self.embedder.embed(text), (tier, text))
+
+    def embed_all(self, short_term: List[Tuple[str, Any]]) -> VectorIndex:
+        index = VectorIndex(self.embedder.dim, MEMORY_INDEX_BACKEND)
+        for key, value in self.store.items():
+            self.upsert_entry(index, "long-term", key, value)
+        for key, value in short_term:
+            self.upsert_entry(index, "short-term", key, value)
+        return index
+
+    def build_index(self) -> VectorIndex:
+        self.index = self.embed_all(list(self.short_term_memory.items()))
+        return self.index
+
+    async def load_index(self) -> VectorIndex:
+        # Embedding the whole store is CPU-bound, so it runs in a worker thread;
+        # concurrent callers share one build
+        if self.index is not None:
+            return self.index
+        if self.index_task is None:
+            self.index_task = asyncio.create_task(self._build_index_in_thread())
+        return await asyncio.shield(self.index_task)
+
+    async def _build_index_in_thread(self) -> VectorIndex:
+        self.index_backlog = []
+        try:
+            index = await asyncio.to_thread(
+                self.embed_all, list(self.short_term_memory.items())
+            )
+            for tier, key, value in self.index_backlog:
+                if value is None:
+                    index.remove(f"{tier}:{key}")
+                else:
+                    self.upsert_entry(index, tier, key, value)
+            self.index = index
+            return index
+        finally:
+            self.index_backlog = None
+            self.index_task = None
+
+    def search_memories(
+        self,
+        query: str,
+        top_k: int = MEMORY_TOP_K,
+        token_budget: int = MEMORY_TOKEN_BUDGET,
+    ) -> List[Tuple[str, str, float]]:
+        index = self.index if self.index is not None else self.build_index()
+        hits = index.search(self.embedder.embed(query), top_k, MEMORY_MIN_SCORE)
+        selected = []
+        used_tokens = 0
+        for _, score, (tier, text) in hits:
+            tokens = estimate_tokens(text)
+            if used_tokens + tokens > token_budget:
+                continue
+            selected.append((tier, text, score))
+            used_tokens += tokens
+        return selected
 
     def get_from_short_term_memory(self, key: str) -> Any:
         return self.short_term_memory.get(key)
 
     def get_from_long_term_memory(self, key: str) -> Any:
-        return self.long_term_memory.get(key)
+        return self.store.get(key)
 
-    def summarize_and_store(
+    async def summarize_and_store(
         self,
         data: Dict[str, Any],
         context: Dict[str, Any],
         api: str = "groq",
         model: str = None,
     ):
-        prompt = f"""
+        prompt = build_prompt(
+            "memory.summarize_and_store",
+            """
         Data: {data}
         Context: {context}
 
@@ -64,170 +161,86 @@ class Memory:
         3. Common pitfalls or errors to avoid
         4. Relevant statistics or metrics
 
-        Format the output as a Python dictionary with keys representing categories of information 
+        Format the output as a JSON object with keys representing categories of information 
         and values containing the summarized insights.
-        """
-
-        if api == "groq":
-            model = model or self.default_groq_model
-            if model not in GROQ_MODELS:
-                raise ValueError(
-                    f"Invalid Groq model. Available models are: {', '.join(GROQ_MODELS)}"
-                )
-            response = self.groq_client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI memory manager. Your job is to extract and summarize key information for long-term storage.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI memory manager. Your job is to extract and summarize key information for long-term storage.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model=OPENROUTER_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI memory manager. Your job is to extract and summarize key information for long-term storage.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
+        """,
+            data=data,
+            context=context,
+        )
+
+        # Without an explicit model the gateway picks the call's model tier
+        if api == "groq" and model is not None and model not in GROQ_MODELS:
+            raise ValueError(
+                f"Invalid Groq model. Available models are: {', '.join(GROQ_MODELS)}"
             )
-        else:
-            raise ValueError(f"Invalid API: {api}")
 
-        summary = eval(response.choices[0].message.content)
+        summary = await self.gateway.complete_structured(
+            api,
+            "You are an AI memory manager. Your job is to extract and summarize key information for long-term storage.",
+            prompt,
+            Insights,
+            model=model,
+            call="memory.summarize_and_store",
+        )
 
+        self.store.set_many(summary.items())
         for category, insights in summary.items():
-            self.add_to_long_term_memory(category, insights)
-
-    def retrieve_relevant_info(
-        self, query: str, context: Dict[str, Any], api: str = "groq", model: str = None
-    ) -> Dict[str, Any]:
-        prompt = f"""
-        Query: {query}
-        Context: {context}
-        Long-term memory: {self.long_term_memory}
-        Short-term memory: {self.short_term_memory}
-
-        Retrieve and synthesize relevant information from the provided memories that could be useful 
-        for addressing the query. Consider both long-term and short-term memories.
+            self.index_entry("long-term", category, insights)
 
-        Format the output as a Python dictionary with keys 'relevant_info' (a list of relevant pieces of information) 
-        and 'synthesis' (a brief summary of how this information relates to the query).
-        """
-
-        if api == "groq":
-            model = model or self.default_groq_model
-            if model not in GROQ_MODELS:
-                raise ValueError(
-                    f"Invalid Groq model. Available models are: {', '.join(GROQ_MODELS)}"
-                )
-            response = self.groq_client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI memory retrieval system. Your job is to find and synthesize relevant information from stored memories.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI memory retrieval system. Your job is to find and synthesize relevant information from stored memories.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model=OPENROUTER_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI memory retrieval system. Your job is to find and synthesize relevant information from stored memories.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        else:
-            raise ValueError(f"Invalid API: {api}")
-
-        retrieval_result = eval(response.choices[0].message.content)
-        return retrieval_result
-
-    def retrieve_relevant_info(
-        self, query: str, context: Dict[str, Any], api: str = "groq"
+    async def retrieve_relevant_info(
+        self,
+        query: str,
+        context: Dict[str, Any],
+        api: str = "groq",
+        model: str = None,
+        top_k: int = MEMORY_TOP_K,
     ) -> Dict[str, Any]:
-        prompt = f"""
+        # Only the top-k most similar memories that fit the token budget reach the prompt
+        await self.load_index()
+        memories_str = "\n".join(
+            f"- [{tier}] {text}" for tier, text, _ in self.search_memories(query, top_k)
+        )
+        prompt = build_prompt(
+            "memory.retrieve_relevant_info",
+            """
         Query: {query}
         Context: {context}
-        Long-term memory: {self.long_term_memory}
-        Short-term memory: {self.short_term_memory}
+        Relevant memories:
+        {memories_str}
 
         Retrieve and synthesize relevant information from the provided memories that could be useful 
         for addressing the query. Consider both long-term and short-term memories.
 
-        Format the output as a Python dictionary with keys 'relevant_info' (a list of relevant pieces of information) 
+        Format the output as a JSON object with keys 'relevant_info' (a list of relevant pieces of information) 
         and 'synthesis' (a brief summary of how this information relates to the query).
-        """
-
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI memory retrieval system. Your job is to find and synthesize relevant information from stored memories.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
+        """,
+            query=query,
+            context=context,
+            memories_str=memories_str,
+        )
+
+        if api == "groq" and model is not None and model not in GROQ_MODELS:
+            raise ValueError(
+                f"Invalid Groq model. Available models are: {', '.join(GROQ_MODELS)}"
             )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI memory retrieval system. Your job is to find and synthesize relevant information from stored memories.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI memory retrieval system. Your job is to find and synthesize relevant information from stored memories.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        else:
-            raise ValueError(f"Invalid API: {api}")
 
-        retrieval_result = eval(response.choices[0].message.content)
+        retrieval_result = await self.gateway.complete_structured(
+            api,
+            "You are an AI memory retrieval system. Your job is to find and synthesize relevant information from stored memories.",
+            prompt,
+            RetrievalResult,
+            model=model,
+            call="memory.retrieve_relevant_info",
+        )
         return retrieval_result
 
     def clear_short_term_memory(self):
+        for key in self.short_term_memory:
+            if self.index is not None:
+                self.index.remove(f"short-term:{key}")
+            elif self.index_backlog is not None:
+                self.index_backlog.append(("short-term", key, None))
         self.short_term_memory.clear()
+
+    def close(self):
+        self.store.close()
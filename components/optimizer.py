@@ -1,75 +1,75 @@
-from typing import Dict, Any, List
-from openai import OpenAI
-from groq import Groq
-from config.config import GROQ_MODELS, OPENAI_MODEL, OPENROUTER_MODEL
+from typing import Dict, Any, List, Tuple
+import asyncio
+import hashlib
+import json
+from components.schemas import Insights, OptimizationSuggestions, PerformanceAnalysis
+from src.clients.gateway import LLMGateway
+from src.utils.prompt_budget import build_prompt
+from src.utils.tracing import instrument
 
+COMPONENTS = ["planning", "reasoning", "execution", "evaluation"]
 
 
+@instrument("optimizer")
 class Optimizer:
-    def __init__(self, groq_client: Groq, openai_client: OpenAI, openrouter_client: OpenAI, default_groq_model: str):
-        self.groq_client = groq_client
-        self.openai_client = openai_client
-        self.openrouter_client = openrouter_client
+    def __init__(self, gateway: LLMGateway, default_groq_model: str):
+        self.gateway = gateway
         self.default_groq_model = default_groq_model
+        # api -> (history summary digest, analysis); replaced when new history arrives
+        self.analysis_cache: Dict[str, Tuple[str, Dict[str, Any]]] = {}
 
-    def analyze_performance(
-        self, task_history: List[Dict[str, Any]], api: str = "groq"
+    @staticmethod
+    def history_digest(history_summary: Dict[str, Any]) -> str:
+        encoded = json.dumps(history_summary, sort_keys=True, default=str).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    async def get_performance_analysis(
+        self, history_summary: Dict[str, Any], api: str = "groq"
+    ) -> Dict[str, Any]:
+        digest = self.history_digest(history_summary)
+        cached = self.analysis_cache.get(api)
+        if cached and cached[0] == digest:
+            return cached[1]
+
+        analysis = await self.analyze_performance(history_summary, api)
+        self.analysis_cache[api] = (digest, analysis)
+        return analysis
+
+    async def analyze_performance(
+        self, history_summary: Dict[str, Any], api: str = "groq"
     ) -> Dict[str, Any]:
-        prompt = f"""
-        Task History: {task_history}
+        prompt = build_prompt(
+            "optimizer.analyze_performance",
+            """
+        Task History Summary: {history_summary}
 
-        Analyze the performance across these tasks and provide:
+        The summary holds per-backend aggregates (task counts, failure rates, average scores,
+        latency percentiles) and the most recent tasks. Analyze the performance across these tasks and provide:
         1. Common patterns in successful strategies
         2. Recurring issues or bottlenecks
         3. Trends in performance over time
         4. Potential areas for improvement in planning and reasoning
 
-        Format the output as a Python dictionary with keys: 'success_patterns', 'issues', 'trends', and 'improvement_areas'.
-        """
-
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI performance analyst. Your job is to identify patterns and suggest improvements based on historical task performance.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI performance analyst. Your job is to identify patterns and suggest improvements based on historical task performance.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI performance analyst. Your job is to identify patterns and suggest improvements based on historical task performance.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        else:
-            raise ValueError(f"Invalid API: {api}")
+        Format the output as a JSON object with keys: 'success_patterns', 'issues', 'trends', and 'improvement_areas'.
+        """,
+            history_summary=history_summary,
+        )
 
-        analysis = eval(response.choices[0].message.content)
+        analysis = await self.gateway.complete_structured(
+            api,
+            "You are an AI performance analyst. Your job is to identify patterns and suggest improvements based on historical task performance.",
+            prompt,
+            PerformanceAnalysis,
+            call="optimizer.analyze_performance",
+        )
         return analysis
 
-    def generate_optimization_suggestions(
+    async def generate_optimization_suggestions(
         self, analysis: Dict[str, Any], current_task: str, api: str = "groq"
     ) -> Dict[str, Any]:
-        prompt = f"""
+        prompt = build_prompt(
+            "optimizer.generate_optimization_suggestions",
+            """
         Performance Analysis: {analysis}
         Current Task: {current_task}
 
@@ -81,58 +81,33 @@ class Optimizer:
 
         For each suggestion, provide a brief explanation of its potential impact.
 
-        Format the output as a Python dictionary with keys: 'planning_suggestions', 'reasoning_suggestions', 
-        'execution_suggestions', and 'evaluation_suggestions'. Each value should be a list of tuples, 
-        where each tuple contains (suggestion, explanation).
-        """
-
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI optimization expert. Your job is to suggest improvements to an AI agent's strategies based on past performance and the current task.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI optimization expert. Your job is to suggest improvements to an AI agent's strategies based on past performance and the current task.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI optimization expert. Your job is to suggest improvements to an AI agent's strategies based on past performance and the current task.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        else:
-            raise ValueError(f"Invalid API: {api}")
+        Format the output as a JSON object with keys: 'planning_suggestions', 'reasoning_suggestions', 
+        'execution_suggestions', and 'evaluation_suggestions'. Each value should be a list of pairs, 
+        where each pair is a two-element list [suggestion, explanation].
+        """,
+            analysis=analysis,
+            current_task=current_task,
+        )
 
-        suggestions = eval(response.choices[0].message.content)
+        suggestions = await self.gateway.complete_structured(
+            api,
+            "You are an AI optimization expert. Your job is to suggest improvements to an AI agent's strategies based on past performance and the current task.",
+            prompt,
+            OptimizationSuggestions,
+            call="optimizer.generate_optimization_suggestions",
+        )
         return suggestions
 
-    def apply_optimizations(
+    async def apply_optimizations(
         self,
         component: str,
         suggestions: List[tuple],
         context: Dict[str, Any],
         api: str = "groq",
     ) -> Dict[str, Any]:
-        prompt = f"""
+        prompt = build_prompt(
+            "optimizer.apply_optimizations",
+            """
         Component: {component}
         Optimization Suggestions: {suggestions}
         Current Context: {context}
@@ -142,78 +117,63 @@ class Optimizer:
         2. The expected impact of the change
         3. Any potential risks or trade-offs
 
-        Format the output as a Python dictionary with keys matching the suggestions, where each value is 
+        Format the output as a JSON object with keys matching the suggestions, where each value is 
         another dictionary containing 'implementation', 'impact', and 'risks'.
-        """
-
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI system architect. Your job is to determine how to implement optimization suggestions in specific components of an AI agent.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI system architect. Your job is to determine how to implement optimization suggestions in specific components of an AI agent.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI system architect. Your job is to determine how to implement optimization suggestions in specific components of an AI agent.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        else:
-            raise ValueError(f"Invalid API: {api}")
+        """,
+            component=component,
+            suggestions=suggestions,
+            context=context,
+        )
 
-        optimizations = eval(response.choices[0].message.content)
+        optimizations = await self.gateway.complete_structured(
+            api,
+            "You are an AI system architect. Your job is to determine how to implement optimization suggestions in specific components of an AI agent.",
+            prompt,
+            Insights,
+            call="optimizer.apply_optimizations",
+        )
         return optimizations
 
-    def optimize_component(
+    async def optimize_component(
         self,
         component: str,
-        task_history: List[Dict[str, Any]],
+        history_summary: Dict[str, Any],
         current_task: str,
         context: Dict[str, Any],
         api: str = "groq",
     ) -> Dict[str, Any]:
-        analysis = self.analyze_performance(task_history, api)
-        suggestions = self.generate_optimization_suggestions(
+        analysis = await self.get_performance_analysis(history_summary, api)
+        suggestions = await self.generate_optimization_suggestions(
             analysis, current_task, api
         )
         component_suggestions = suggestions.get(f"{component}_suggestions", [])
-        optimizations = self.apply_optimizations(
+        optimizations = await self.apply_optimizations(
             component, component_suggestions, context, api
         )
         return optimizations
 
-    def optimize_all_components(
+    async def optimize_all_components(
         self,
-        task_history: List[Dict[str, Any]],
+        history_summary: Dict[str, Any],
         current_task: str,
         context: Dict[str, Any],
         api: str = "groq",
     ) -> Dict[str, Dict[str, Any]]:
-        components = ["planning", "reasoning", "execution", "evaluation"]
-        optimizations = {}
-        for component in components:
-            optimizations[component] = self.optimize_component(
-                component, task_history, current_task, context, api
+        # Analysis and suggestions are shared by every component, so compute
+        # them once and only fan out the per-component apply step.
+        analysis = await self.get_performance_analysis(history_summary, api)
+        suggestions = await self.generate_optimization_suggestions(
+            analysis, current_task, api
+        )
+        results = await asyncio.gather(
+            *(
+                self.apply_optimizations(
+                    component,
+                    suggestions.get(f"{component}_suggestions", []),
+                    context,
+                    api,
+                )
+                for component in COMPONENTS
             )
-        return optimizations
+        )
+        return dict(zip(COMPONENTS, results))
@@ -0,0 +1,193 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+from config.config import PIPELINE_MODE, PLAN_STREAMING_ENABLED
+from components.planner import Planner
+from components.reasoner import Reasoner
+from components.executor import Executor
+from components.evaluator import Evaluator
+from components.optimizer import Optimizer
+from components.staged_runner import StagedRunner
+from src.clients.gateway import called_backends
+from src.storage.task_history import TaskHistoryStore
+from src.utils.tracing import instrument
+
+EventCallback = Callable[[str, Any], Awaitable[None]]
+
+
+async def ignore_event(event: str, data: Any):
+    pass
+
+
+@instrument("pipeline")
+class AgentPipeline:
+    def __init__(
+        self,
+        planner: Planner,
+        executor: Executor,
+        evaluator: Evaluator,
+        optimizer: Optimizer,
+        task_history: TaskHistoryStore,
+        reasoner: Optional[Reasoner] = None,
+        stream_plan: bool = PLAN_STREAMING_ENABLED,
+        mode: str = PIPELINE_MODE,
+    ):
+        if mode not in ("staged", "dag"):
+            raise ValueError(f"Invalid pipeline mode: {mode}")
+        self.planner = planner
+        self.executor = executor
+        self.evaluator = evaluator
+        self.optimizer = optimizer
+        self.task_history = task_history
+        self.stream_plan = stream_plan
+        # The staged runner needs a reasoner; without one the plan runs as a DAG
+        self.mode = mode if reasoner is not None else "dag"
+        self.staged_runner = (
+            StagedRunner(reasoner, executor, evaluator) if reasoner is not None else None
+        )
+
+    def calls(self) -> List[str]:
+        # Component calls a run can make, so admission can check the models they resolve to
+        calls = ["planner.create_plan", "executor.execute_action"]
+        if self.planner.library is not None:
+            calls.append("planner.refine_plan")
+        if self.mode == "staged":
+            calls.append("reasoner.analyze_step")
+        calls.append("evaluator.evaluate_action")
+        if self.evaluator.mode == "batch":
+            calls.append("evaluator.evaluate_action_batch")
+        calls += [
+            "evaluator.evaluate_plan",
+            "optimizer.analyze_performance",
+            "optimizer.generate_optimization_suggestions",
+            "optimizer.apply_optimizations",
+        ]
+        return calls
+
+    async def optimize(
+        self, task: str, context: Dict[str, Any], api: str, emit: EventCallback
+    ) -> Dict[str, Any]:
+        logging.info(f"Optimizing with {len(self.task_history)} past tasks")
+        optimizations = await self.optimizer.optimize_all_components(
+            self.task_history.summary(), task, context, api
+        )
+        logging.info(f"Optimizations: {optimizations}")
+        await emit("optimization", optimizations)
+        return optimizations
+
+    async def run(
+        self,
+        task: str,
+        context: Dict[str, Any],
+        api: str,
+        emit: Optional[EventCallback] = None,
+        stream_tokens: bool = False,
+    ) -> Dict[str, Any]:
+        emit = emit or ignore_event
+        # History records the models this run's calls went to, including the optimizer's
+        backends: Dict[Tuple[str, str], None] = {}
+        tracking = called_backends.set(backends)
+
+        # Optimization only informs future runs, so it overlaps with this one
+        # instead of delaying the plan
+        optimization = None
+        if len(self.task_history):
+            optimization = asyncio.create_task(
+                self.optimize(task, dict(context), api, emit)
+            )
+        else:
+            logging.info("No task history available for optimization")
+
+        async def on_token(token: str):
+            await emit("plan_token", token)
+
+        async def on_step(index: int, step: Dict[str, Any], result: Dict[str, Any]):
+            await emit(
+                "step", {"index": index, "action": step["action"], "result": result}
+            )
+
+        started = time.perf_counter()
+        plan_seconds = 0.0
+        try:
+            recalled = await self.planner.recall_plan(task, api)
+            if recalled is not None:
+                plan = recalled["plan"]
+                await emit("plan", plan)
+                steps = plan
+            elif self.stream_plan:
+                plan = []
+
+                async def planned_steps():
+                    nonlocal plan_seconds
+                    async for step in self.planner.stream_plan(
+                        task, api, on_token=on_token if stream_tokens else None
+                    ):
+                        plan.append(step)
+                        await emit("plan_step", {"index": len(plan) - 1, **step})
+                        yield step
+                    plan_seconds = time.perf_counter() - planning_started
+                    await emit("plan", plan)
+
+                planning_started = time.perf_counter()
+                steps = planned_steps()
+            else:
+                planning_started = time.perf_counter()
+                plan = await self.planner.create_plan(
+                    task, api, on_token=on_token if stream_tokens else None
+                )
+                plan_seconds = time.perf_counter() - planning_started
+                await emit("plan", plan)
+                steps = plan
+
+            if self.mode == "staged":
+                staged = await self.staged_runner.run(steps, context, api, on_step=on_step)
+                results = staged["results"]
+                evaluation = await self.evaluator.evaluate_plan(
+                    staged["steps"],
+                    results,
+                    context,
+                    api,
+                    evaluations=staged["evaluations"],
+                )
+                if staged["aborted"] is not None:
+                    evaluation["aborted"] = staged["aborted"]
+            else:
+                results = await self.executor.execute_plan(
+                    steps, context, api, on_step=on_step
+                )
+                evaluation = await self.evaluator.evaluate_plan(
+                    plan, results, context, api
+                )
+            await emit("evaluation", evaluation)
+            if "aborted" not in evaluation:
+                self.planner.remember_plan(
+                    task, plan, evaluation["score"], plan_seconds, recalled
+                )
+            if optimization is not None:
+                await optimization
+        except Exception as e:
+            self.task_history.record(
+                task, api, list(backends), time.perf_counter() - started, error=str(e)
+            )
+            raise
+        finally:
+            if optimization is not None and not optimization.done():
+                optimization.cancel()
+            called_backends.reset(tracking)
+
+        self.task_history.record(
+            task,
+            api,
+            list(backends),
+            time.perf_counter() - started,
+            plan=plan,
+            results=results,
+            evaluation=evaluation,
+        )
+        return {
+            "task": task,
+            "plan": plan,
+            "results": results,
+            "evaluation": evaluation,
+        }
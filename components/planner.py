@@ -1,124 +1,162 @@
-from typing import List, Dict
-from openai import OpenAI
-from groq import Groq
-from config.config import GROQ_MODELS, OPENAI_MODEL, OPENROUTER_MODEL
-
+from typing import List, Dict, Any, AsyncIterator, Optional
+import logging
+import time
+from config.config import PLAN_LIBRARY_SEED_SIMILARITY
+from components.schemas import Plan, PlanStep
+from src.clients.gateway import LLMGateway, TokenCallback
+from src.storage.plan_library import PlanLibrary, task_key
+from src.utils.prompt_budget import build_prompt
+from src.utils.tracing import instrument
 
 
+@instrument("planner")
 class Planner:
     def __init__(
         self,
-        groq_client: Groq,
-        openai_client: OpenAI,
-        openrouter_client: OpenAI,
+        gateway: LLMGateway,
         groq_model: str,
+        library: Optional[PlanLibrary] = None,
+        seed_similarity: float = PLAN_LIBRARY_SEED_SIMILARITY,
     ):
-        self.groq_client = groq_client
-        self.openai_client = openai_client
-        self.openrouter_client = openrouter_client
+        self.gateway = gateway
         self.groq_model = groq_model
+        self.library = library
+        self.seed_similarity = seed_similarity
 
-    def create_plan(self, task: str, api: str = "groq") -> List[Dict[str, str]]:
-        prompt = f"""
+    def plan_prompt(self, task: str) -> str:
+        return build_prompt(
+            "planner.create_plan",
+            """
         Task: {task}
-        
+
         Create a detailed step-by-step plan to accomplish this task. Each step should be concise but clear.
-        Format the output as a Python list of dictionaries, where each dictionary represents a step with 'action' and 'description' keys.
-        
+        Format the output as a JSON list of objects, where each object represents a step with 'action', 'description'
+        and 'depends_on' keys. 'depends_on' lists the earlier steps that must finish first, each given by its exact
+        'action' (or by its step number, counting from 1); leave it empty for steps that can start immediately so
+        independent steps can run in parallel.
+
         Example format:
         [
-            {{"action": "Step 1", "description": "Description of step 1"}},
-            {{"action": "Step 2", "description": "Description of step 2"}},
+            {"action": "Step 1", "description": "Description of step 1", "depends_on": []},
+            {"action": "Step 2", "description": "Description of step 2", "depends_on": []},
+            {"action": "Step 3", "description": "Description of step 3", "depends_on": ["Step 1", "Step 2"]},
             ...
         ]
-        """
+        """,
+            task=task,
+        )
+
+    async def create_plan(
+        self, task: str, api: str = "groq", on_token: Optional[TokenCallback] = None
+    ) -> List[Dict[str, Any]]:
+        plan = await self.gateway.complete_structured(
+            api,
+            "You are an AI planner. Your job is to break down tasks into clear, actionable steps.",
+            self.plan_prompt(task),
+            Plan,
+            on_token=on_token,
+            call="planner.create_plan",
+        )
+        return plan
+
+    async def stream_plan(
+        self, task: str, api: str = "groq", on_token: Optional[TokenCallback] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # Same plan as create_plan, but each step is yielded as soon as it has
+        # been generated, so execution can start while the rest is planned
+        async for step in self.gateway.stream_items(
+            api,
+            "You are an AI planner. Your job is to break down tasks into clear, actionable steps.",
+            self.plan_prompt(task),
+            PlanStep,
+            on_token=on_token,
+            call="planner.create_plan",
+        ):
+            yield step
 
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=self.groq_model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI planner. Your job is to break down tasks into clear, actionable steps.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI planner. Your job is to break down tasks into clear, actionable steps.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI planner. Your job is to break down tasks into clear, actionable steps.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
+    async def recall_plan(
+        self, task: str, api: str = "groq"
+    ) -> Optional[Dict[str, Any]]:
+        # A stored plan for the same task is reused as is; one for a similar task
+        # is refined for this one, which is cheaper than planning it (tasks that
+        # differ in one key term still score as very similar)
+        if self.library is None:
+            return None
+        started = time.perf_counter()
+        match = self.library.lookup(task, self.seed_similarity)
+        if match is None:
+            self.library.record_lookup("miss")
+            return None
+
+        if match["key"] == task_key(task):
+            plan, source = match["plan"], "reuse"
         else:
-            raise ValueError(f"Invalid API: {api}")
+            try:
+                plan = await self.refine_plan(
+                    match["plan"],
+                    f"This plan was made for the task '{match['task']}'. "
+                    f"Adapt it to the new task: {task}",
+                    api,
+                )
+            except Exception as e:
+                logging.warning(f"Refining a stored plan failed, planning from scratch: {e}")
+                self.library.record_lookup("miss")
+                return None
+            source = "refine"
 
-        plan = eval(response.choices[0].message.content)
-        return plan
+        saved = max(0.0, match["plan_seconds"] - (time.perf_counter() - started))
+        self.library.record_lookup(source, saved)
+        logging.info(
+            f"Plan library {source}: similarity {match['similarity']:.2f} "
+            f"to '{match['task']}'"
+        )
+        return {
+            "plan": plan,
+            "source": source,
+            "key": match["key"],
+            "similarity": match["similarity"],
+            "plan_seconds": match["plan_seconds"],
+        }
+
+    def remember_plan(
+        self,
+        task: str,
+        plan: List[Dict[str, Any]],
+        score: float,
+        plan_seconds: float,
+        recalled: Optional[Dict[str, Any]] = None,
+    ):
+        if self.library is None:
+            return
+        if recalled is not None and recalled["source"] == "reuse":
+            self.library.record(task, plan, score, plan_seconds, reused_key=recalled["key"])
+        elif recalled is not None:
+            # Saved time is measured against planning from scratch, not the refinement
+            self.library.record(task, plan, score, recalled["plan_seconds"])
+        else:
+            self.library.record(task, plan, score, plan_seconds)
+
+    async def refine_plan(
+        self, plan: List[Dict[str, Any]], feedback: str, api: str = "groq"
+    ) -> List[Dict[str, Any]]:
+        prompt = build_prompt(
+            "planner.refine_plan",
+            """
+        Current plan: {plan}
 
-    def refine_plan(
-        self, plan: List[Dict[str, str]], feedback: str, api: str = "groq"
-    ) -> List[Dict[str, str]]:
-        plan_str = str(plan)
-        prompt = f"""
-        Current plan: {plan_str}
-        
         Feedback: {feedback}
-        
-        Please refine the plan based on the given feedback. Maintain the same format as the original plan.
-        """
 
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI planner. Your job is to refine existing plans based on feedback.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI planner. Your job is to refine existing plans based on feedback.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI planner. Your job is to refine existing plans based on feedback.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        else:
-            raise ValueError(f"Invalid API: {api}")
+        Please refine the plan based on the given feedback. Maintain the same format as the original plan.
+        """,
+            plan=plan,
+            feedback=feedback,
+        )
 
-        refined_plan = eval(response.choices[0].message.content)
+        refined_plan = await self.gateway.complete_structured(
+            api,
+            "You are an AI planner. Your job is to refine existing plans based on feedback.",
+            prompt,
+            Plan,
+            call="planner.refine_plan",
+        )
         return refined_plan
@@ -1,21 +1,36 @@
-from typing import List, Dict, Any
-from openai import OpenAI
-from groq import Groq
-from config.config import GROQ_MODELS, OPENAI_MODEL, OPENROUTER_MODEL
-
-
-
+from typing import List, Dict, Any, Optional
+import asyncio
+import logging
+import numpy as np
+from config.config import REASONER_DECISION_MODE, REASONER_DECISION_TOP_K
+from components.schemas import CriteriaScores, Decision, Solution, StepAnalysis
+from src.clients.gateway import LLMGateway
+from src.utils.decision import missing_cells, rank, score_matrix, weighted_scores
+from src.utils.prompt_budget import build_prompt, call_budget
+from src.utils.tokens import estimate_tokens
+from src.utils.tracing import instrument
+
+
+@instrument("reasoner")
 class Reasoner:
-    def __init__(self, groq_client: Groq, openai_client: OpenAI, openrouter_client: OpenAI, default_groq_model: str):
-        self.groq_client = groq_client
-        self.openai_client = openai_client
-        self.openrouter_client = openrouter_client
+    def __init__(
+        self,
+        gateway: LLMGateway,
+        default_groq_model: str,
+        decision_mode: str = REASONER_DECISION_MODE,
+        decision_top_k: int = REASONER_DECISION_TOP_K,
+    ):
+        self.gateway = gateway
         self.default_groq_model = default_groq_model
+        self.decision_mode = decision_mode
+        self.decision_top_k = decision_top_k
 
-    def analyze_step(
+    async def analyze_step(
         self, step: Dict[str, str], context: Dict[str, Any], api: str = "groq"
     ) -> Dict[str, Any]:
-        prompt = f"""
+        prompt = build_prompt(
+            "reasoner.analyze_step",
+            """
         Step to analyze: {step}
         Context: {context}
 
@@ -25,61 +40,135 @@ class Reasoner:
         3. Alternative approaches
         4. Success criteria
 
-        Format the output as a Python dictionary with keys: 'challenges', 'resources', 'alternatives', and 'success_criteria'.
-        """
-
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI reasoner. Your job is to analyze steps in a plan and provide insights.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI reasoner. Your job is to analyze steps in a plan and provide insights.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
+        Format the output as a JSON object with keys: 'challenges', 'resources', 'alternatives', and 'success_criteria'.
+        """,
+            step=step,
+            context=context,
+        )
+
+        analysis = await self.gateway.complete_structured(
+            api,
+            "You are an AI reasoner. Your job is to analyze steps in a plan and provide insights.",
+            prompt,
+            StepAnalysis,
+            call="reasoner.analyze_step",
+        )
+        return analysis
+
+    async def make_decision(
+        self,
+        options: List[str],
+        criteria: Dict[str, float],
+        context: Dict[str, Any],
+        api: str = "groq",
+        mode: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        mode = mode or self.decision_mode
+        if mode == "narrative" or not criteria:
+            return await self.narrate_decision(options, criteria, context, api)
+        if mode != "score":
+            raise ValueError(f"Invalid decision mode: {mode}")
+        if not options:
+            raise ValueError("No options to decide between")
+
+        # Known per-criterion scores come from context["scores"] ({option: {criterion: score}},
+        # on a common scale such as 0-100); the LLM only fills in the missing ones
+        names = list(criteria)
+        weights = np.array([float(criteria[name]) for name in names])
+        matrix = score_matrix(options, names, context.get("scores") or {})
+        missing = missing_cells(matrix, options, names)
+        requested = unscored = sum(len(pending) for pending in missing.values())
+        if missing:
+            scored = await self.score_criteria(
+                missing, {k: v for k, v in context.items() if k != "scores"}, api
             )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI reasoner. Your job is to analyze steps in a plan and provide insights.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
+            matrix = np.where(
+                np.isnan(matrix), score_matrix(options, names, scored), matrix
             )
-        else:
-            raise ValueError(f"Invalid API: {api}")
+            unscored = int(np.isnan(matrix).sum())
+            if unscored:
+                logging.warning(
+                    f"{unscored} of {requested} criterion scores were left unscored; "
+                    f"using the criterion average for them"
+                )
+
+        ranking = rank(options, weighted_scores(matrix, weights), self.decision_top_k)
+        decision, best = ranking[0]
+        reasoning = f"Highest weighted score ({best}) over criteria: {', '.join(names)}"
+        if len(ranking) > 1:
+            reasoning += f"; runner-up '{ranking[1][0]}' scored {ranking[1][1]}"
+        return {
+            "decision": decision,
+            "reasoning": reasoning,
+            "ranking": [{"option": option, "score": score} for option, score in ranking],
+            "llm_scored": requested - unscored,
+        }
+
+    async def score_criteria(
+        self, missing: Dict[str, List[str]], context: Dict[str, Any], api: str = "groq"
+    ) -> Dict[str, Dict[str, Any]]:
+        # Every option must reach the model, so the list is exempt from compaction and
+        # split into batches that each fit half the call's budget, scored concurrently
+        batch_budget = call_budget("reasoner.score_criteria") // 2
+        batches: List[List[str]] = [[]]
+        used = 0
+        for option, names in missing.items():
+            line = f"- {option}: {', '.join(names)}"
+            size = estimate_tokens(line)
+            if batches[-1] and used + size > batch_budget:
+                batches.append([])
+                used = 0
+            batches[-1].append(line)
+            used += size
+
+        scored = await asyncio.gather(
+            *(self.score_criteria_batch("\n".join(lines), context, api) for lines in batches)
+        )
+        return {option: scores for batch in scored for option, scores in batch.items()}
+
+    async def score_criteria_batch(
+        self, missing_str: str, context: Dict[str, Any], api: str = "groq"
+    ) -> Dict[str, Dict[str, Any]]:
+        prompt = build_prompt(
+            "reasoner.score_criteria",
+            """
+        Context: {context}
 
-        analysis = eval(response.choices[0].message.content)
-        return analysis
+        Score each option on the criteria listed after it, from 0 (worst) to 100 (best):
+        {missing_str}
+
+        Format your response as a JSON object with key 'scores', mapping each option (exactly as written above)
+        to an object of criterion: score.
+        """,
+            keep=("missing_str",),
+            missing_str=missing_str,
+            context=context,
+        )
+
+        scored = await self.gateway.complete_structured(
+            api,
+            "You are an AI reasoner. Your job is to score options against decision criteria.",
+            prompt,
+            CriteriaScores,
+            call="reasoner.score_criteria",
+        )
+        return scored["scores"]
 
-    def make_decision(
+    async def narrate_decision(
         self,
         options: List[str],
         criteria: Dict[str, float],
         context: Dict[str, Any],
         api: str = "groq",
-    ) -> str:
+    ) -> Dict[str, Any]:
         options_str = "\n".join(f"- {option}" for option in options)
         criteria_str = "\n".join(
             f"- {criterion}: {weight}" for criterion, weight in criteria.items()
         )
 
-        prompt = f"""
+        prompt = build_prompt(
+            "reasoner.make_decision",
+            """
         Options:
         {options_str}
 
@@ -88,52 +177,26 @@ class Reasoner:
 
         Context: {context}
 
-        Based on the given options, decision criteria (with their relative importance as weights), and context, 
+        Based on the given options, decision criteria (with their relative importance as weights), and context,
         choose the best option. Explain your reasoning, showing how you weighted each criterion for each option.
-        
-        Format your response as a Python dictionary with keys 'decision' (the chosen option) and 'reasoning' (explanation for the decision).
-        """
-
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI reasoner. Your job is to make decisions based on given criteria and context.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI reasoner. Your job is to make decisions based on given criteria and context.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI reasoner. Your job is to make decisions based on given criteria and context.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        else:
-            raise ValueError(f"Invalid API: {api}")
 
-        decision = eval(response.choices[0].message.content)
+        Format your response as a JSON object with keys 'decision' (the chosen option) and 'reasoning' (explanation for the decision).
+        """,
+            options_str=options_str,
+            criteria_str=criteria_str,
+            context=context,
+        )
+
+        decision = await self.gateway.complete_structured(
+            api,
+            "You are an AI reasoner. Your job is to make decisions based on given criteria and context.",
+            prompt,
+            Decision,
+            call="reasoner.make_decision",
+        )
         return decision
 
-    def solve_problem(
+    async def solve_problem(
         self,
         problem: str,
         constraints: List[str],
@@ -142,56 +205,32 @@ class Reasoner:
     ) -> Dict[str, Any]:
         constraints_str = "\n".join(f"- {constraint}" for constraint in constraints)
 
-        prompt = f"""
+        prompt = build_prompt(
+            "reasoner.solve_problem",
+            """
         Problem: {problem}
-        
+
         Constraints:
         {constraints_str}
 
         Context: {context}
 
-        Propose a solution to this problem, taking into account the given constraints and context. 
+        Propose a solution to this problem, taking into account the given constraints and context.
         Your solution should be creative yet practical.
 
-        Format your response as a Python dictionary with keys 'solution' (a brief description of your proposed solution) 
+        Format your response as a JSON object with keys 'solution' (a brief description of your proposed solution)
         and 'steps' (a list of steps to implement the solution).
-        """
-
-        if api == "groq":
-            response = self.groq_client.chat.completions.create(
-                model=GROQ_MODELS[0],
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI reasoner. Your job is to solve problems creatively while adhering to given constraints.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openai":
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI reasoner. Your job is to solve problems creatively while adhering to given constraints.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        elif api == "openrouter":
-            response = self.openrouter_client.chat.completions.create(
-                model="meta-llama/llama-3.1-8b-instruct:free",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an AI reasoner. Your job is to solve problems creatively while adhering to given constraints.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-            )
-        else:
-            raise ValueError(f"Invalid API: {api}")
+        """,
+            problem=problem,
+            constraints_str=constraints_str,
+            context=context,
+        )
 
-        solution = eval(response.choices[0].message.content)
+        solution = await self.gateway.complete_structured(
+            api,
+            "You are an AI reasoner. Your job is to solve problems creatively while adhering to given constraints.",
+            prompt,
+            Solution,
+            call="reasoner.solve_problem",
+        )
         return solution
@@ -0,0 +1,107 @@
+from typing import Any, Dict, List, Optional
+import re
+from pydantic import BaseModel, ConfigDict, field_validator
+
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def coerce_number(value: Any) -> Any:
+    # Models often answer "5 minutes" or "85/100" where a number is expected
+    if isinstance(value, str):
+        match = NUMBER_PATTERN.search(value)
+        if match:
+            return float(match.group())
+    return value
+
+
+class ComponentOutput(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+
+class PlanStep(ComponentOutput):
+    action: str
+    description: str = ""
+    depends_on: Optional[List[Any]] = None
+
+
+class ExecutionResult(ComponentOutput):
+    result: Any
+    side_effects: Any = None
+    resources_used: Any
+    time_taken: float
+
+    @field_validator("time_taken", mode="before")
+    @classmethod
+    def coerce_time_taken(cls, value: Any) -> Any:
+        return coerce_number(value)
+
+
+class ErrorHandling(ComponentOutput):
+    analysis: Any = None
+    solution: Any = None
+    implementation_steps: Any = None
+
+
+class ActionEvaluation(ComponentOutput):
+    score: float
+    achievements: Any = None
+    improvements: Any = None
+    surprises: Any = None
+    recommendations: Any = None
+
+    @field_validator("score", mode="before")
+    @classmethod
+    def coerce_score(cls, value: Any) -> Any:
+        return coerce_number(value)
+
+
+class PlanEvaluation(ComponentOutput):
+    summary: Any = None
+    improvements: Any = None
+    lessons: Any = None
+    recommendations: Any = None
+
+
+class StepAnalysis(ComponentOutput):
+    challenges: Any = None
+    resources: Any = None
+    alternatives: Any = None
+    success_criteria: Any = None
+
+
+class Decision(ComponentOutput):
+    decision: Any
+    reasoning: Any = None
+
+
+class CriteriaScores(ComponentOutput):
+    scores: Dict[str, Dict[str, Any]]
+
+
+class Solution(ComponentOutput):
+    solution: Any
+    steps: List[Any] = []
+
+
+class PerformanceAnalysis(ComponentOutput):
+    success_patterns: Any = None
+    issues: Any = None
+    trends: Any = None
+    improvement_areas: Any = None
+
+
+class OptimizationSuggestions(ComponentOutput):
+    planning_suggestions: List[Any] = []
+    reasoning_suggestions: List[Any] = []
+    execution_suggestions: List[Any] = []
+    evaluation_suggestions: List[Any] = []
+
+
+class RetrievalResult(ComponentOutput):
+    relevant_info: List[Any] = []
+    synthesis: Any = None
+
+
+Plan = List[PlanStep]
+ActionEvaluations = List[ActionEvaluation]
+Insights = Dict[str, Any]
@@ -0,0 +1,160 @@
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, List, Optional, Union
+import asyncio
+import logging
+from config.config import PIPELINE_ABORT_SCORE, PIPELINE_QUEUE_SIZE
+from components.reasoner import Reasoner
+from components.executor import Executor
+from components.evaluator import Evaluator
+from src.utils.tracing import instrument
+
+StepCallback = Callable[[int, Dict[str, Any], Dict[str, Any]], Awaitable[None]]
+
+# Marks the end of the plan on a stage queue
+DONE = object()
+
+
+class EarlyAbort(Exception):
+    pass
+
+
+@instrument("staged")
+class StagedRunner:
+    """Runs a plan as a reason -> execute -> evaluate pipeline.
+
+    Each stage is a worker connected to the next by a bounded queue: steps
+    are analyzed ahead of execution, executed by Executor.execute_plan (so
+    independent steps still run in parallel), and scored by
+    Evaluator.evaluate_actions in its configured mode as results come in.
+    Once a step scores below the abort threshold the remaining steps are
+    dropped.
+    """
+
+    def __init__(
+        self,
+        reasoner: Reasoner,
+        executor: Executor,
+        evaluator: Evaluator,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        abort_score: float = PIPELINE_ABORT_SCORE,
+    ):
+        self.reasoner = reasoner
+        self.executor = executor
+        self.evaluator = evaluator
+        self.queue_size = queue_size
+        self.abort_score = abort_score
+
+    async def run(
+        self,
+        plan: Union[List[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+        context: Dict[str, Any],
+        api: str = "groq",
+        on_step: Optional[StepCallback] = None,
+    ) -> Dict[str, Any]:
+        steps: List[Dict[str, Any]] = []
+        analyses: Dict[int, Dict[str, Any]] = {}
+        results: Dict[int, Dict[str, Any]] = {}
+        evaluations: Dict[int, Dict[str, Any]] = {}
+        base_context = dict(context)
+        to_execute: asyncio.Queue = asyncio.Queue(self.queue_size)
+        to_evaluate: asyncio.Queue = asyncio.Queue(self.queue_size)
+        aborted: Optional[Dict[str, Any]] = None
+
+        async def reason():
+            async def planned():
+                if isinstance(plan, list):
+                    for step in plan:
+                        yield step
+                else:
+                    async for step in plan:
+                        yield step
+
+            async for step in planned():
+                index = len(steps)
+                steps.append(step)
+                # Analysis only sees the starting context, so it never waits on execution
+                analyses[index] = await self.reasoner.analyze_step(step, base_context, api)
+                await to_execute.put({**step, "analysis": analyses[index]})
+            await to_execute.put(DONE)
+
+        async def analyzed_steps():
+            while (step := await to_execute.get()) is not DONE:
+                yield step
+
+        async def executed(index: int, step: Dict[str, Any], result: Dict[str, Any]):
+            results[index] = result
+            if on_step is not None:
+                await on_step(index, steps[index], result)
+            await to_evaluate.put(index)
+
+        async def execute():
+            await self.executor.execute_plan(
+                analyzed_steps(), context, api, on_step=executed
+            )
+            await to_evaluate.put(DONE)
+
+        async def evaluate():
+            nonlocal aborted
+            finished = False
+            while not finished:
+                # Everything executed since the last round is scored together
+                batch = [await to_evaluate.get()]
+                while not to_evaluate.empty():
+                    batch.append(to_evaluate.get_nowait())
+                if batch[-1] is DONE:
+                    finished = True
+                    batch.pop()
+                if not batch:
+                    continue
+                scored = await self.evaluator.evaluate_actions(
+                    [steps[index] for index in batch],
+                    [results[index] for index in batch],
+                    base_context,
+                    api,
+                )
+                for index, evaluation in zip(batch, scored):
+                    evaluations[index] = evaluation
+                    if (
+                        aborted is None
+                        and self.abort_score
+                        and evaluation["score"] < self.abort_score
+                    ):
+                        aborted = {
+                            "index": index,
+                            "action": steps[index]["action"],
+                            "score": evaluation["score"],
+                        }
+                if aborted is not None:
+                    raise EarlyAbort()
+
+        workers = [
+            asyncio.create_task(reason()),
+            asyncio.create_task(execute()),
+            asyncio.create_task(evaluate()),
+        ]
+        try:
+            done, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        for worker in workers:
+            error = worker.exception() if worker in done else None
+            if error is not None and not isinstance(error, EarlyAbort):
+                raise error
+        if aborted is not None:
+            logging.warning(
+                f"Aborting plan after step {aborted['index']} ({aborted['action']}) "
+                f"scored {aborted['score']}"
+            )
+
+        # Only evaluated steps are reported, in plan order; work past an abort is discarded
+        evaluated = sorted(evaluations)
+        return {
+            "plan": steps,
+            "steps": [steps[index] for index in evaluated],
+            "analyses": [analyses[index] for index in evaluated],
+            "results": [results[index] for index in evaluated],
+            "evaluations": [evaluations[index] for index in evaluated],
+            "aborted": aborted,
+        }
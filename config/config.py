@@ -19,3 +19,208 @@ GROQ_MODELS = [
     "llama-guard-3-8b",
 ]
 OPENROUTER_MODEL = "meta-llama/llama-3.1-8b-instruct:free"
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# Local llama.cpp provider ("local"): a GGUF model loaded once and shared by LOCAL_WORKERS
+# replicas, with CPU cores split between them and a RAM KV cache for repeated prompt prefixes
+LOCAL_MODEL_PATH = os.getenv("LOCAL_MODEL_PATH")
+LOCAL_MODEL_NAME = os.getenv(
+    "LOCAL_MODEL_NAME",
+    os.path.splitext(os.path.basename(LOCAL_MODEL_PATH))[0] if LOCAL_MODEL_PATH else "local",
+)
+LOCAL_N_CTX = int(os.getenv("LOCAL_N_CTX", "4096"))
+LOCAL_WORKERS = int(os.getenv("LOCAL_WORKERS", "1"))
+LOCAL_THREADS = int(os.getenv("LOCAL_THREADS", str(max(1, (os.cpu_count() or 1) // LOCAL_WORKERS))))
+LOCAL_N_GPU_LAYERS = int(os.getenv("LOCAL_N_GPU_LAYERS", "0"))
+LOCAL_KV_CACHE_BYTES = int(os.getenv("LOCAL_KV_CACHE_BYTES", str(1 << 30)))
+
+# Provider HTTP pools: one keep-alive (HTTP/2 when enabled) pool per provider
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+
+# Response cache: in-process LRU, optionally backed by SQLite when a path is set
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB")
+
+# Stream the plan into the executor so steps start while later ones are still being generated
+PLAN_STREAMING_ENABLED = os.getenv("PLAN_STREAMING_ENABLED", "true").lower() == "true"
+
+# How AgentPipeline runs a plan: "dag" executes the whole plan with independent steps in
+# parallel and then evaluates it; "staged" also analyzes each step first (one more LLM call
+# per step) and scores steps while later ones run, with bounded queues of PIPELINE_QUEUE_SIZE
+# steps between the stages
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "dag")
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+# A staged run stops once a step scores below this (0 disables early abort)
+PIPELINE_ABORT_SCORE = float(os.getenv("PIPELINE_ABORT_SCORE", "20"))
+
+# Maximum number of independent plan steps the executor runs at once
+EXECUTOR_MAX_CONCURRENCY = int(os.getenv("EXECUTOR_MAX_CONCURRENCY", "4"))
+# Range (min,max seconds) of the simulated work done before each executed action
+EXECUTOR_SIMULATED_DELAY = tuple(
+    float(bound) for bound in os.getenv("EXECUTOR_SIMULATED_DELAY", "0.5,2.0").split(",")
+)
+
+# How Evaluator.evaluate_plan scores individual actions: "sequential",
+# "concurrent" (bounded by EVALUATOR_MAX_CONCURRENCY) or "batch" (EVALUATOR_BATCH_SIZE per prompt)
+EVALUATOR_MODE = os.getenv("EVALUATOR_MODE", "concurrent")
+EVALUATOR_MAX_CONCURRENCY = int(os.getenv("EVALUATOR_MAX_CONCURRENCY", "4"))
+EVALUATOR_BATCH_SIZE = int(os.getenv("EVALUATOR_BATCH_SIZE", "5"))
+
+# Providers that accept response_format={"type": "json_object"}
+JSON_MODE_APIS = ["groq", "openai", "local"]
+# Providers whose completions can be streamed token by token
+STREAMING_APIS = ["groq", "openai", "openrouter", "local"]
+# How many times a reply that cannot be parsed or repaired is re-requested
+STRUCTURED_OUTPUT_MAX_REASKS = int(os.getenv("STRUCTURED_OUTPUT_MAX_REASKS", "1"))
+
+# Long-term memory lives in SQLite (WAL); single writes commit at once and bulk writes
+# commit MEMORY_BATCH_SIZE rows at a time. memory_storage.json is import/export only
+MEMORY_DB_PATH = os.getenv("MEMORY_DB_PATH", "memory_storage.db")
+MEMORY_BATCH_SIZE = int(os.getenv("MEMORY_BATCH_SIZE", "32"))
+
+# Concurrent identical provider requests share one upstream call
+LLM_COALESCING_ENABLED = os.getenv("LLM_COALESCING_ENABLED", "true").lower() == "true"
+
+# Memory retrieval: local hashing embeddings searched with NumPy ("numpy") or hnswlib ("hnsw")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+MEMORY_INDEX_BACKEND = os.getenv("MEMORY_INDEX_BACKEND", "numpy")
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "8"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1000"))
+MEMORY_MIN_SCORE = float(os.getenv("MEMORY_MIN_SCORE", "0.05"))
+
+# Task history: every run is persisted, only the most recent ones stay in memory
+TASK_HISTORY_DB = os.getenv("TASK_HISTORY_DB", "task_history.db")
+TASK_HISTORY_BUFFER_SIZE = int(os.getenv("TASK_HISTORY_BUFFER_SIZE", "100"))
+
+# Reasoner.make_decision: "score" ranks options locally from per-criterion scores in
+# context["scores"] (the LLM only scores what is missing), "narrative" asks the LLM to decide
+REASONER_DECISION_MODE = os.getenv("REASONER_DECISION_MODE", "score")
+REASONER_DECISION_TOP_K = int(os.getenv("REASONER_DECISION_TOP_K", "5"))
+
+# Plan library: plans that scored at least PLAN_LIBRARY_MIN_SCORE are kept; the same task reuses
+# its plan as is, and a stored plan at PLAN_LIBRARY_SEED_SIMILARITY seeds Planner.refine_plan
+# instead of planning from scratch
+PLAN_LIBRARY_ENABLED = os.getenv("PLAN_LIBRARY_ENABLED", "true").lower() == "true"
+PLAN_LIBRARY_DB = os.getenv("PLAN_LIBRARY_DB", "plan_library.db")
+PLAN_LIBRARY_MIN_SCORE = float(os.getenv("PLAN_LIBRARY_MIN_SCORE", "70"))
+PLAN_LIBRARY_SEED_SIMILARITY = float(os.getenv("PLAN_LIBRARY_SEED_SIMILARITY", "0.6"))
+
+# Adaptive routing: per-backend fallback chains (first model is the provider default)
+# and hedging, where a slow call is raced against the next backend after its p95 latency
+ROUTER_BACKENDS = {
+    "groq": ["llama-3.1-8b-instant", "llama-3.1-70b-versatile", "gemma2-9b-it"],
+    "openai": ["gpt-3.5-turbo"],
+    "openrouter": [OPENROUTER_MODEL],
+}
+if LOCAL_MODEL_PATH:
+    ROUTER_BACKENDS["local"] = [LOCAL_MODEL_NAME]
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+ROUTER_CROSS_PROVIDER_FALLBACK = os.getenv("ROUTER_CROSS_PROVIDER_FALLBACK", "false").lower() == "true"
+ROUTER_WINDOW_SIZE = int(os.getenv("ROUTER_WINDOW_SIZE", "100"))
+ROUTER_WINDOW_SECONDS = float(os.getenv("ROUTER_WINDOW_SECONDS", "300"))
+ROUTER_UNHEALTHY_ERROR_RATE = float(os.getenv("ROUTER_UNHEALTHY_ERROR_RATE", "0.5"))
+ROUTER_HEDGE_ENABLED = os.getenv("ROUTER_HEDGE_ENABLED", "true").lower() == "true"
+ROUTER_HEDGE_DEFAULT_DELAY = float(os.getenv("ROUTER_HEDGE_DEFAULT_DELAY", "10"))
+ROUTER_HEDGE_MIN_DELAY = float(os.getenv("ROUTER_HEDGE_MIN_DELAY", "0.25"))
+
+# Model tiers: each component call uses its speed tier's model (calls not listed use
+# DEFAULT_MODEL_TIER); a reply that fails to parse or validate is re-asked one tier up
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+MODEL_TIER_ORDER = ["fast", "strong"]
+MODEL_TIERS = {
+    "groq": {
+        "fast": os.getenv("GROQ_FAST_MODEL", "llama-3.1-8b-instant"),
+        "strong": os.getenv("GROQ_STRONG_MODEL", "llama-3.1-70b-versatile"),
+    },
+    "openai": {
+        "fast": os.getenv("OPENAI_FAST_MODEL", "gpt-4o-mini"),
+        "strong": os.getenv("OPENAI_STRONG_MODEL", "gpt-4o"),
+    },
+    "openrouter": {
+        "fast": OPENROUTER_MODEL,
+        "strong": os.getenv("OPENROUTER_STRONG_MODEL", OPENROUTER_MODEL),
+    },
+}
+DEFAULT_MODEL_TIER = os.getenv("DEFAULT_MODEL_TIER", "fast")
+METHOD_TIERS = {
+    "planner.create_plan": "strong",
+    "planner.refine_plan": "strong",
+    "reasoner.solve_problem": "strong",
+    "evaluator.evaluate_plan": "strong",
+    "optimizer.generate_optimization_suggestions": "strong",
+}
+
+# Client-side rate limits per (provider, model), in requests and estimated tokens per minute
+# (0 = unlimited). Calls wait up to RATE_LIMIT_MAX_WAIT seconds for capacity, and /run_task
+# is refused with 429 when a new task would wait longer than RATE_LIMIT_ADMISSION_WAIT
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMITS = {
+    "groq": {
+        "rpm": int(os.getenv("GROQ_RPM", "30")),
+        "tpm": int(os.getenv("GROQ_TPM", "6000")),
+    },
+    "openrouter": {
+        "rpm": int(os.getenv("OPENROUTER_RPM", "20")),
+        "tpm": int(os.getenv("OPENROUTER_TPM", "0")),
+    },
+    "openai": {
+        "rpm": int(os.getenv("OPENAI_RPM", "500")),
+        "tpm": int(os.getenv("OPENAI_TPM", "30000")),
+    },
+}
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))
+RATE_LIMIT_ADMISSION_WAIT = float(os.getenv("RATE_LIMIT_ADMISSION_WAIT", "10"))
+# Completion tokens assumed for a request that does not set max_tokens
+RATE_LIMIT_OUTPUT_TOKENS = int(os.getenv("RATE_LIMIT_OUTPUT_TOKENS", "400"))
+
+# Per-backend timeout (seconds) for multi-provider response comparisons
+COMPARISON_TIMEOUT = float(os.getenv("COMPARISON_TIMEOUT", "60"))
+
+# Tracing: spans for component methods and provider calls, kept in memory (GET /traces)
+# and pushed as OTLP/JSON to OTEL_EXPORTER_OTLP_ENDPOINT when it is set
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "2048"))
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "ai-agent")
+OTEL_EXPORT_INTERVAL = float(os.getenv("OTEL_EXPORT_INTERVAL", "5"))
+
+# Prompt assembly: per-call token budgets for the user prompt; oversized fields are compacted
+PROMPT_BUDGET_ENABLED = os.getenv("PROMPT_BUDGET_ENABLED", "true").lower() == "true"
+PROMPT_DEFAULT_BUDGET = int(os.getenv("PROMPT_DEFAULT_BUDGET", "2000"))
+PROMPT_TOKEN_BUDGETS = {
+    "planner.create_plan": 1500,
+    "planner.refine_plan": 2500,
+    "reasoner.analyze_step": 1500,
+    "reasoner.make_decision": 2000,
+    "reasoner.score_criteria": 3000,
+    "reasoner.solve_problem": 2000,
+    "executor.execute_action": 1500,
+    "executor.handle_error": 1500,
+    "evaluator.evaluate_action": 1500,
+    "evaluator.evaluate_action_batch": 3000,
+    "evaluator.evaluate_plan": 3000,
+    "evaluator.generate_report": 2000,
+    "memory.summarize_and_store": 2500,
+    "memory.retrieve_relevant_info": 2000,
+    "optimizer.analyze_performance": 2000,
+    "optimizer.generate_optimization_suggestions": 2000,
+    "optimizer.apply_optimizations": 1500,
+}
+
+# Background jobs: queued /jobs runs stored in SQLite (default) or Redis ("redis"),
+# run by a pool of JOB_WORKERS asyncio workers with per-tenant limits
+JOB_BACKEND = os.getenv("JOB_BACKEND", "sqlite")
+JOB_DB = os.getenv("JOB_DB", "jobs.db")
+JOB_REDIS_URL = os.getenv("JOB_REDIS_URL", "redis://localhost:6379/0")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_TENANT_CONCURRENCY = int(os.getenv("JOB_TENANT_CONCURRENCY", "2"))
+JOB_TENANT_MAX_PENDING = int(os.getenv("JOB_TENANT_MAX_PENDING", "50"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
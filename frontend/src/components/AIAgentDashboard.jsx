@@ -18,6 +18,7 @@ export default function AIAgentDashboard() {
   const [task, setTask] = useState("");
   const [context, setContext] = useState("");
   const [result, setResult] = useState(null);
+  const [progress, setProgress] = useState([]);
   const [taskHistory, setTaskHistory] = useState([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
@@ -51,7 +52,8 @@ export default function AIAgentDashboard() {
       }
       const data = await response.json();
       console.log("Fetched data:", data);
-      setTaskHistory(data.task_history);
+      // The API pages newest-first; the chart reads oldest-first
+      setTaskHistory([...data.task_history].reverse());
     } catch (e) {
       console.error("Error fetching task history:", e);
       setError("Failed to fetch task history. Please try again later.");
@@ -63,13 +65,16 @@ export default function AIAgentDashboard() {
     e.preventDefault();
     setLoading(true);
     setError(null);
+    setResult(null);
+    setProgress([]);
     try {
       let token = "";
       if (user && typeof user.getToken === "function") {
         token = await user.getToken();
       }
 
-      const response = await fetch(`${API_URL}/run_task`, {
+      // Stream stage events so progress shows up as each stage finishes
+      const response = await fetch(`${API_URL}/run_task/stream?format=ndjson`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -84,8 +89,34 @@ export default function AIAgentDashboard() {
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
-      const data = await response.json();
-      setResult(data);
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const { event, data } = JSON.parse(line);
+          if (event === "result") {
+            setResult(data);
+          } else if (event === "error") {
+            throw new Error(data.detail);
+          } else if (event === "plan_step") {
+            setProgress((prev) => [...prev, `Planned step: ${data.action}`]);
+          } else if (event === "plan") {
+            setProgress((prev) => [...prev, `Plan ready: ${data.length} steps`]);
+          } else if (event === "step") {
+            setProgress((prev) => [...prev, `Finished step: ${data.action}`]);
+          } else if (event === "evaluation") {
+            setProgress((prev) => [...prev, `Evaluation score: ${data.score}`]);
+          }
+        }
+      }
       await fetchTaskHistory();
     } catch (error) {
       console.error("Error:", error);
@@ -94,10 +125,12 @@ export default function AIAgentDashboard() {
     setLoading(false);
   };
 
-  const performanceData = taskHistory.map((task, index) => ({
-    name: `Task ${index + 1}`,
-    score: task.evaluation.score,
-  }));
+  const performanceData = taskHistory
+    .filter((task) => task.evaluation)
+    .map((task, index) => ({
+      name: `Task ${index + 1}`,
+      score: task.evaluation.score,
+    }));
 
   return (
     <div
@@ -158,6 +191,17 @@ export default function AIAgentDashboard() {
           </div>
         )}
 
+        {loading && progress.length > 0 && (
+          <div className="mb-8 bg-white dark:bg-gray-800 p-6 rounded-lg shadow-md">
+            <h2 className="text-2xl font-bold mb-4">Progress:</h2>
+            <ul className="list-disc pl-6">
+              {progress.map((message, index) => (
+                <li key={index}>{message}</li>
+              ))}
+            </ul>
+          </div>
+        )}
+
         {result && (
           <>
             <DecisionProcessVisualization result={result} />
@@ -1,13 +1,16 @@
 from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import uvicorn
-import os
 from dotenv import load_dotenv
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 import logging
+import asyncio
+import math
+import orjson
 
 # Import our AI agent components
 from components.planner import Planner
@@ -16,20 +19,53 @@ from components.executor import Executor
 from components.evaluator import Evaluator
 from components.memory import Memory
 from components.optimizer import Optimizer
+from components.pipeline import AgentPipeline
 
 # Import API clients
-from openai import OpenAI
-from groq import Groq
+from src.clients.gateway import LLMGateway
+from src.clients.model_tiers import ModelTiers
+from src.clients.rate_limiter import RateLimitExceeded, rate_limiter
+from src.clients.registry import registry
+from src.clients.router import router
+from src.evaluator.response_evaluator import compare_responses
+from src.jobs.job_queue import JobQueue, TenantLimitError
 
 # Import configuration
 from config.config import (
     OPENAI_API_KEY,
     GROQ_API_KEY,
     OPENROUTER_API_KEY,
-    OPENAI_MODEL,
     GROQ_MODELS,
-    OPENROUTER_MODEL,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_DB,
+    TASK_HISTORY_DB,
+    TASK_HISTORY_BUFFER_SIZE,
+    PLAN_LIBRARY_ENABLED,
+    PLAN_LIBRARY_DB,
+    PLAN_LIBRARY_MIN_SCORE,
+    EMBEDDING_DIM,
+    MEMORY_INDEX_BACKEND,
+    ROUTER_ENABLED,
+    MODEL_ROUTING_ENABLED,
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_ADMISSION_WAIT,
+    JOB_BACKEND,
+    JOB_DB,
+    JOB_REDIS_URL,
+    JOB_WORKERS,
+    JOB_TENANT_CONCURRENCY,
+    JOB_TENANT_MAX_PENDING,
+    JOB_POLL_INTERVAL,
 )
+from src.utils.response_cache import ResponseCache
+from src.storage.plan_library import PlanLibrary
+from src.storage.task_history import TaskHistoryStore
+from src.utils.metrics import metrics, rate_limit_rejections
+from src.utils.prompt_budget import prompt_metrics
+from src.utils.tracing import tracer
 
 security = HTTPBearer()
 
@@ -53,6 +89,10 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
         )
 
 
+def tenant_id(user: Dict[str, Any]) -> str:
+    return str(user.get("id") or user.get("sub") or "anonymous")
+
+
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
@@ -74,29 +114,52 @@ app.add_middleware(
 # Load environment variables
 load_dotenv()
 
-# Load API keys from environment variables
-groq_api_key = os.getenv("GROQ_API_KEY")
-openai_api_key = os.getenv("OPENAI_API_KEY")
-openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
-
-# Initialize API clients
-groq_client = Groq(api_key=groq_api_key)
-openai_client = OpenAI(api_key=openai_api_key)
-openrouter_client = OpenAI(
-    base_url="https://openrouter.ai/api/v1", api_key=openrouter_api_key
-)
+# Async API clients on the registry's pooled connections, shared with src/clients
+groq_client = registry.async_client("groq")
+openai_client = registry.async_client("openai")
+openrouter_client = registry.async_client("openrouter")
 
 # Use the first Groq model in the list as the default
 DEFAULT_GROQ_MODEL = GROQ_MODELS[0]
 
+# Cache identical component prompts so repeated task templates skip the provider
+response_cache = (
+    ResponseCache(
+        max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes=RESPONSE_CACHE_MAX_BYTES,
+        ttl=RESPONSE_CACHE_TTL,
+        db_path=RESPONSE_CACHE_DB,
+    )
+    if RESPONSE_CACHE_ENABLED
+    else None
+)
+
+# Shared gateway used by every component
+gateway = LLMGateway(
+    groq_client,
+    openai_client,
+    openrouter_client,
+    DEFAULT_GROQ_MODEL,
+    cache=response_cache,
+    router=router if ROUTER_ENABLED else None,
+    limiter=rate_limiter if RATE_LIMIT_ENABLED else None,
+    tiers=ModelTiers() if MODEL_ROUTING_ENABLED else None,
+)
+
+# Well-scored plans are reused for similar tasks instead of planning them again
+plan_library = (
+    PlanLibrary(PLAN_LIBRARY_DB, EMBEDDING_DIM, MEMORY_INDEX_BACKEND, PLAN_LIBRARY_MIN_SCORE)
+    if PLAN_LIBRARY_ENABLED
+    else None
+)
 
-# Initialize the components with all API clients
-planner = Planner(groq_client, openai_client, openrouter_client, DEFAULT_GROQ_MODEL)
-reasoner = Reasoner(groq_client, openai_client, openrouter_client, DEFAULT_GROQ_MODEL)
-executor = Executor(groq_client, openai_client, openrouter_client, DEFAULT_GROQ_MODEL)
-evaluator = Evaluator(groq_client, openai_client, openrouter_client, DEFAULT_GROQ_MODEL)
-memory = Memory(groq_client, openai_client, openrouter_client, DEFAULT_GROQ_MODEL)
-optimizer = Optimizer(groq_client, openai_client, openrouter_client, DEFAULT_GROQ_MODEL)
+# Initialize the components with the shared gateway
+planner = Planner(gateway, DEFAULT_GROQ_MODEL, library=plan_library)
+reasoner = Reasoner(gateway, DEFAULT_GROQ_MODEL)
+executor = Executor(gateway, DEFAULT_GROQ_MODEL)
+evaluator = Evaluator(gateway, DEFAULT_GROQ_MODEL)
+memory = Memory(gateway, DEFAULT_GROQ_MODEL)
+optimizer = Optimizer(gateway, DEFAULT_GROQ_MODEL)
 
 # This is important for Vercel serverless function
 app = app
@@ -107,14 +170,104 @@ class TaskInput(BaseModel):
     context: Dict[str, Any]
 
 
+class BackendSpec(BaseModel):
+    api: str
+    model: Optional[str] = None
+
+
+class ComparisonInput(BaseModel):
+    prompt: str
+    reasoning_prompt: Optional[str] = None
+    backends: Optional[List[BackendSpec]] = None
+    scorer: str = "relevance"
+    json_mode: bool = False
+
+
 class TaskOutput(BaseModel):
     task: str
-    plan: List[Dict[str, str]]
+    plan: List[Dict[str, Any]]
     results: List[Dict[str, Any]]
     evaluation: Dict[str, Any]
 
 
-task_history = []
+task_history = TaskHistoryStore(TASK_HISTORY_DB, TASK_HISTORY_BUFFER_SIZE)
+pipeline = AgentPipeline(
+    planner, executor, evaluator, optimizer, task_history, reasoner=reasoner
+)
+
+
+async def run_job(payload: Dict[str, Any], emit) -> Dict[str, Any]:
+    return await pipeline.run(
+        payload["task"], payload["context"], payload["api"], emit=emit
+    )
+
+
+# Background runs for /jobs, so long tasks do not hold an HTTP request open
+job_queue = JobQueue(
+    run_job,
+    backend=JOB_BACKEND,
+    path=JOB_DB,
+    redis_url=JOB_REDIS_URL,
+    workers=JOB_WORKERS,
+    tenant_concurrency=JOB_TENANT_CONCURRENCY,
+    tenant_max_pending=JOB_TENANT_MAX_PENDING,
+    poll_interval=JOB_POLL_INTERVAL,
+)
+
+
+def resolve_task_request(payload: Dict[str, Any]):
+    # Process the payload
+    task = payload.get("task")
+    context = payload.get("context")
+    api = context.get("api", "groq")
+
+    logging.info(f"Received task: {task}, context: {context}, api: {api}")
+
+    # "auto" sends each call to whichever backend is currently healthiest
+    if api not in gateway.clients and not (api == "auto" and ROUTER_ENABLED):
+        logging.error(f"Invalid API specified: {api}")
+        raise HTTPException(status_code=400, detail="Invalid API specified")
+    # With model tiers every call picks its tier's model, so a context model is not checked
+    if api == "groq" and not MODEL_ROUTING_ENABLED:
+        model = context.get("model", DEFAULT_GROQ_MODEL)
+        if model not in GROQ_MODELS:
+            logging.error(f"Invalid Groq model: {model}")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid Groq model. Available models are: {', '.join(GROQ_MODELS)}",
+            )
+
+    return task, context, api
+
+
+def task_models(api: str) -> List[str]:
+    return gateway.call_models(api, pipeline.calls())
+
+
+def admit_task(api: str):
+    # Refuse synchronous runs up front when the rate limit queue of any model the
+    # task will call is already longer than a request should wait; /jobs queues them instead
+    if not RATE_LIMIT_ENABLED:
+        return
+    for model in task_models(api):
+        backends = gateway.backends(api, model)
+        wait = rate_limiter.projected_wait(backends)
+        if wait > RATE_LIMIT_ADMISSION_WAIT:
+            rate_limit_rejections.inc(*backends[0], "admission")
+            raise HTTPException(
+                status_code=429,
+                detail=f"Provider rate limit reached for {api}, retry later or submit a job",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
 
 
 @app.post("/run_task")
@@ -124,54 +277,265 @@ async def run_task(request: Request):
         payload = await request.json()
         logging.info(f"Received payload: {payload}")
 
-        # Process the payload
-        task = payload.get("task")
-        context = payload.get("context")
-        api = context.get("api", "groq")
-
-        logging.info(f"Received task: {task}, context: {context}, api: {api}")
-
-        # Select the appropriate model based on the API
-        if api == "groq":
-            model = context.get("model", DEFAULT_GROQ_MODEL)
-            if model not in GROQ_MODELS:
-                logging.error(f"Invalid Groq model: {model}")
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid Groq model. Available models are: {', '.join(GROQ_MODELS)}",
-                )
-        elif api == "openai":
-            model = OPENAI_MODEL
-        elif api == "openrouter":
-            model = OPENROUTER_MODEL
-        else:
-            logging.error(f"Invalid API specified: {api}")
-            raise HTTPException(status_code=400, detail="Invalid API specified")
-
-        logging.info(f"Selected model: {model}")
-
-        try:
-            # Optimize based on past performance
-            if task_history:
-                logging.info(f"Optimizing with task history: {task_history}")
-                optimizations = optimizer.optimize_all_components(
-                    task_history, task, context, api
-                )
-                logging.info(f"Optimizations: {optimizations}")
-            else:
-                logging.info("No task history available for optimization")
-        except Exception as e:
-            logging.error(f"Error during optimization: {e}")
-            raise
+        task, context, api = resolve_task_request(payload)
+        admit_task(api)
+        output = await pipeline.run(task, context, api)
+        return TaskOutput(**output)
 
     except Exception as e:
         logging.error(f"Unhandled exception: {e}")
         raise
 
 
+def format_event(event: str, data: Any, stream_format: str) -> bytes:
+    if stream_format == "ndjson":
+        return orjson.dumps({"event": event, "data": data}, default=str) + b"\n"
+    body = orjson.dumps(data, default=str)
+    return b"event: " + event.encode() + b"\ndata: " + body + b"\n\n"
+
+
+@app.post("/run_task/stream")
+async def run_task_stream(request: Request, format: str = "sse", tokens: bool = True):
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
+
+    payload = await request.json()
+    logging.info(f"Received streaming payload: {payload}")
+    task, context, api = resolve_task_request(payload)
+    admit_task(api)
+
+    # Pipeline stages push events onto the queue as they finish
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def emit(event: str, data: Any):
+        await events.put((event, data))
+
+    async def run():
+        try:
+            output = await pipeline.run(
+                task, context, api, emit=emit, stream_tokens=tokens
+            )
+            await events.put(("result", output))
+        except Exception as e:
+            logging.error(f"Unhandled exception in streamed task: {e}")
+            await events.put(("error", {"detail": str(e)}))
+        finally:
+            await events.put(None)
+
+    async def event_stream():
+        runner = asyncio.create_task(run())
+        try:
+            while True:
+                item = await events.get()
+                if item is None:
+                    break
+                yield format_event(*item, format)
+        finally:
+            # The client went away: stop spending provider calls on it
+            if not runner.done():
+                runner.cancel()
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: Request, user: Dict[str, Any] = Depends(verify_token)):
+    payload = await request.json()
+    logging.info(f"Received job payload: {payload}")
+    task, context, api = resolve_task_request(payload)
+    try:
+        return job_queue.submit(
+            tenant_id(user),
+            {"task": task, "context": context, "api": api},
+        )
+    except TenantLimitError as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": "30"}
+        )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, user: Dict[str, Any] = Depends(verify_token)):
+    job = job_queue.get(tenant_id(user), job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, user: Dict[str, Any] = Depends(verify_token)):
+    job = await get_job(job_id, user)
+    if job["status"] in ("queued", "running"):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job is {job['status']}",
+            headers={"Retry-After": str(max(int(JOB_POLL_INTERVAL), 1))},
+        )
+    if job["status"] != "succeeded":
+        raise HTTPException(
+            status_code=422, detail=job["error"] or f"Job {job['status']}"
+        )
+    return TaskOutput(**job["result"])
+
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(
+    job_id: str, format: str = "sse", user: Dict[str, Any] = Depends(verify_token)
+):
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
+    tenant = tenant_id(user)
+    await get_job(job_id, user)
+
+    async def event_stream():
+        # Past events are replayed, so a client can (re)connect at any point
+        async for event, data in job_queue.follow(tenant, job_id):
+            yield format_event(event, data, format)
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, user: Dict[str, Any] = Depends(verify_token)):
+    job = job_queue.cancel(tenant_id(user), job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/job_stats")
+async def get_job_stats():
+    return job_queue.get_stats()
+
+
+@app.post("/compare_responses")
+async def compare_provider_responses(payload: ComparisonInput):
+    # Defaults to every configured provider and model
+    backends = None
+    if payload.backends:
+        backends = [
+            (spec.api, spec.model or gateway.default_models.get(spec.api))
+            for spec in payload.backends
+        ]
+    try:
+        return await compare_responses(
+            payload.prompt,
+            payload.reasoning_prompt,
+            backends,
+            payload.scorer,
+            payload.json_mode,
+            gateway=gateway,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.on_event("startup")
+async def startup():
+    # Push finished spans to the OTLP collector in the background
+    app.state.trace_exporter = (
+        asyncio.create_task(tracer.export_forever()) if tracer.endpoint else None
+    )
+    job_queue.start()
+    # Embed stored memories in the background instead of on the first retrieval
+    app.state.memory_index = asyncio.create_task(memory.load_index())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if app.state.trace_exporter is not None:
+        app.state.trace_exporter.cancel()
+    await job_queue.stop()
+    # The store must stay open until the index build has finished reading it
+    await asyncio.gather(app.state.memory_index, return_exceptions=True)
+    memory.close()
+    task_history.close()
+    if plan_library is not None:
+        plan_library.close()
+    await registry.aclose()
+
+
 @app.get("/task_history")
-async def get_task_history():
-    return {"task_history": task_history}
+async def get_task_history(cursor: Optional[int] = None, limit: int = 20):
+    return task_history.page(cursor, min(max(limit, 1), 100))
+
+
+@app.get("/task_stats")
+async def get_task_stats():
+    return {"total_tasks": len(task_history), "by_backend": task_history.stats()}
+
+
+@app.get("/plan_library_stats")
+async def get_plan_library_stats():
+    if plan_library is None:
+        return {"enabled": False}
+    return {"enabled": True, **plan_library.get_stats()}
+
+
+@app.get("/cache_stats")
+async def get_cache_stats():
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.get_stats()}
+
+
+@app.get("/coalescing_stats")
+async def get_coalescing_stats():
+    if gateway.single_flight is None:
+        return {"enabled": False}
+    return {"enabled": True, **gateway.single_flight.get_stats()}
+
+
+@app.get("/parser_metrics")
+async def get_parser_metrics():
+    return gateway.parser.get_metrics()
+
+
+@app.get("/router_stats")
+async def get_router_stats():
+    if not ROUTER_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **router.get_stats()}
+
+
+@app.get("/rate_limits")
+async def get_rate_limits():
+    if not RATE_LIMIT_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, "backends": rate_limiter.get_stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(
+        metrics.expose(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/traces")
+async def get_traces(limit: int = 100):
+    # Most recent finished spans, in OTLP/JSON
+    return tracer.recent(min(max(limit, 1), 1000))
+
+
+@app.get("/prompt_metrics")
+async def get_prompt_metrics():
+    return prompt_metrics.get_metrics()
+
+
+@app.get("/evaluation_metrics")
+async def get_evaluation_metrics():
+    return {"mode": evaluator.mode, "timings": evaluator.get_timing_metrics()}
 
 
 if __name__ == "__main__":
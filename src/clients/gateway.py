@@ -0,0 +1,542 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import time
+from openai import AsyncOpenAI
+from groq import AsyncGroq
+from config.config import (
+    GROQ_MODELS,
+    OPENROUTER_MODEL,
+    LOCAL_MODEL_NAME,
+    JSON_MODE_APIS,
+    STREAMING_APIS,
+    STRUCTURED_OUTPUT_MAX_REASKS,
+    LLM_COALESCING_ENABLED,
+)
+from src.clients.model_tiers import ModelTiers
+from src.clients.rate_limiter import RateLimiter, retry_after
+from src.clients.registry import registry
+from src.clients.router import Admission, AdaptiveRouter
+from src.utils.response_cache import ResponseCache
+from src.utils.structured_output import ArrayItemSplitter, ParseError, StructuredOutputParser
+from src.utils.metrics import (
+    llm_cache,
+    llm_retries,
+    model_escalations,
+    provider_duration,
+    provider_tokens,
+)
+from src.utils.single_flight import SingleFlight
+from src.utils.tokens import estimate_tokens
+from src.utils.tracing import Span, annotate, traced, tracer
+
+TokenCallback = Callable[[str], Awaitable[None]]
+
+# Backends the provider requests of the current run went to, in order, while a
+# caller (AgentPipeline.run) collects them
+called_backends: ContextVar[Optional[Dict[Tuple[str, str], None]]] = ContextVar(
+    "called_backends", default=None
+)
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        groq_client: Optional[AsyncGroq] = None,
+        openai_client: Optional[AsyncOpenAI] = None,
+        openrouter_client: Optional[AsyncOpenAI] = None,
+        default_groq_model: str = GROQ_MODELS[0],
+        cache: Optional[ResponseCache] = None,
+        router: Optional[AdaptiveRouter] = None,
+        local_client: Optional[Any] = None,
+        coalesce: bool = LLM_COALESCING_ENABLED,
+        limiter: Optional[RateLimiter] = None,
+        tiers: Optional[ModelTiers] = None,
+    ):
+        # Clients default to the shared, pooled ones owned by the provider registry
+        self.clients = {
+            "groq": groq_client or registry.async_client("groq"),
+            "openai": openai_client or registry.async_client("openai"),
+            "openrouter": openrouter_client or registry.async_client("openrouter"),
+            "local": local_client or registry.async_client("local"),
+        }
+        self.default_models = {
+            "groq": default_groq_model,
+            "openai": "gpt-3.5-turbo",
+            "openrouter": OPENROUTER_MODEL,
+            "local": LOCAL_MODEL_NAME,
+        }
+        self.cache = cache
+        self.router = router
+        self.limiter = limiter
+        self.tiers = tiers
+        self.parser = StructuredOutputParser()
+        self.single_flight = SingleFlight() if coalesce else None
+
+    def resolve_model(
+        self, api: str, model: Optional[str] = None, call: Optional[str] = None
+    ) -> str:
+        # "auto" lets the router pick the healthiest backend for every call
+        if api == "auto" and self.router is not None:
+            return "auto"
+        if api not in self.clients:
+            raise ValueError(f"Invalid API: {api}")
+        # An explicit model wins over the model tier of the calling component method
+        if model is None and self.tiers is not None:
+            model = self.tiers.model(api, call)
+        return model or self.default_models[api]
+
+    def call_models(self, api: str, calls: List[str]) -> List[str]:
+        # The distinct models a set of component calls resolve to, in call order
+        return list(dict.fromkeys(self.resolve_model(api, call=call) for call in calls))
+
+    def escalate(self, api: str, model: str) -> str:
+        # Re-asks after a reply failed to parse or validate go to the next larger model
+        escalated = self.tiers.escalate(api, model) if self.tiers is not None else None
+        if escalated is None:
+            return model
+        model_escalations.inc(api, model, escalated)
+        annotate("llm.escalated_to", escalated)
+        return escalated
+
+    def build_messages(self, system: str, prompt: str) -> List[Dict[str, str]]:
+        messages = [{"role": "system", "content": system}] if system else []
+        return messages + [{"role": "user", "content": prompt}]
+
+    def cache_key(
+        self,
+        api: str,
+        model: str,
+        system: str,
+        prompt: str,
+        json_mode: bool,
+        use_cache: bool,
+        params: Dict[str, Any],
+    ) -> Optional[str]:
+        if self.cache is None or not use_cache:
+            return None
+        return self.cache.make_key(
+            api, model, system, prompt, {"json_mode": json_mode, **params}
+        )
+
+    @contextmanager
+    def provider_span(self, api: str, model: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        # One span and one histogram sample per provider request, including
+        # fallbacks and hedged duplicates
+        annotate("llm.attempts", 1, increment=True)
+        backends = called_backends.get()
+        if backends is not None:
+            backends[(api, model)] = None
+        status = "error"
+        started = time.perf_counter()
+        try:
+            with tracer.span(
+                "provider.request",
+                **{"gen_ai.system": api, "gen_ai.request.model": model},
+                **attributes,
+            ) as span:
+                yield span
+            status = "ok"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            provider_duration.observe(time.perf_counter() - started, api, model, status)
+
+    def record_usage(
+        self, span: Optional[Span], api: str, model: str, input_tokens: int, output_tokens: int
+    ):
+        provider_tokens.inc(api, model, "input", amount=input_tokens)
+        provider_tokens.inc(api, model, "output", amount=output_tokens)
+        if span is not None:
+            span.set("gen_ai.usage.input_tokens", input_tokens)
+            span.set("gen_ai.usage.output_tokens", output_tokens)
+
+    def admission(
+        self, system: str, prompt: str, params: Dict[str, Any]
+    ) -> Optional[Admission]:
+        if self.limiter is None:
+            return None
+        tokens = self.limiter.cost(system, prompt, params)
+
+        async def admit(api: str, model: str):
+            await self.limiter.acquire(api, model, tokens)
+
+        return admit
+
+    def record_error(self, api: str, model: str, error: Exception):
+        # A provider 429 also pauses our own budget for that backend
+        delay = retry_after(error)
+        if delay is not None and self.limiter is not None:
+            self.limiter.throttle(api, model, delay)
+
+    def backends(self, api: str, model: str) -> List[Tuple[str, str]]:
+        if self.router is None:
+            return [(api, model)]
+        return self.router.candidates(api, None if api == "auto" else model)
+
+    async def send(
+        self,
+        api: str,
+        model: str,
+        system: str,
+        prompt: str,
+        json_mode: bool = False,
+        **params: Any,
+    ) -> str:
+        kwargs = {
+            "model": model,
+            "messages": self.build_messages(system, prompt),
+            **params,
+        }
+        if json_mode and api in JSON_MODE_APIS:
+            kwargs["response_format"] = {"type": "json_object"}
+
+        with self.provider_span(api, model, json_mode="response_format" in kwargs) as span:
+            try:
+                response = await self.clients[api].chat.completions.create(**kwargs)
+            except Exception as e:
+                self.record_error(api, model, e)
+                raise
+            content = response.choices[0].message.content
+            usage = getattr(response, "usage", None)
+            self.record_usage(
+                span,
+                api,
+                model,
+                getattr(usage, "prompt_tokens", None) or estimate_tokens(system + prompt),
+                getattr(usage, "completion_tokens", None) or estimate_tokens(content or ""),
+            )
+        return content
+
+    async def request(
+        self,
+        api: str,
+        model: str,
+        system: str,
+        prompt: str,
+        json_mode: bool = False,
+        fallback: bool = True,
+        **params: Any,
+    ) -> str:
+        if self.single_flight is None:
+            return await self.dispatch(
+                api, model, system, prompt, json_mode, fallback, **params
+            )
+        # Identical requests already in flight (same task from several users,
+        # the same analysis for several components) share that call's result
+        key = ResponseCache.make_key(
+            api, model, system, prompt, {"json_mode": json_mode, "fallback": fallback, **params}
+        )
+        return await self.single_flight.do(
+            key,
+            lambda: self.dispatch(api, model, system, prompt, json_mode, fallback, **params),
+        )
+
+    async def dispatch(
+        self,
+        api: str,
+        model: str,
+        system: str,
+        prompt: str,
+        json_mode: bool = False,
+        fallback: bool = True,
+        **params: Any,
+    ) -> str:
+        admit = self.admission(system, prompt, params)
+        # Without fallback the call goes to exactly this backend (e.g. when comparing backends)
+        if self.router is None or not fallback:
+            if admit is not None:
+                await admit(api, model)
+            return await self.send(api, model, system, prompt, json_mode, **params)
+
+        async def call(backend_api: str, backend_model: str) -> str:
+            return await self.send(
+                backend_api, backend_model, system, prompt, json_mode, **params
+            )
+
+        return await self.router.call(call, self.backends(api, model), admit=admit)
+
+    async def request_stream(
+        self,
+        api: str,
+        model: str,
+        system: str,
+        prompt: str,
+        on_token: TokenCallback,
+        json_mode: bool = False,
+        **params: Any,
+    ) -> str:
+        async def call(backend_api: str, backend_model: str) -> str:
+            kwargs = {
+                "model": backend_model,
+                "messages": self.build_messages(system, prompt),
+                "stream": True,
+                **params,
+            }
+            if json_mode and backend_api in JSON_MODE_APIS:
+                kwargs["response_format"] = {"type": "json_object"}
+
+            with self.provider_span(
+                backend_api, backend_model, json_mode="response_format" in kwargs, stream=True
+            ) as span:
+                try:
+                    stream = await self.clients[backend_api].chat.completions.create(**kwargs)
+                except Exception as e:
+                    self.record_error(backend_api, backend_model, e)
+                    raise
+                parts = []
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        await on_token(delta)
+                content = "".join(parts)
+                # Streamed replies carry no usage block
+                self.record_usage(
+                    span,
+                    backend_api,
+                    backend_model,
+                    estimate_tokens(system + prompt),
+                    estimate_tokens(content),
+                )
+            return content
+
+        # Tokens are already on the wire once a stream starts, so streams are
+        # never hedged; the router only picks the backend and records its health
+        backend = self.backends(api, model)[0]
+        admit = self.admission(system, prompt, params)
+        if self.router is None:
+            if admit is not None:
+                await admit(*backend)
+            return await call(*backend)
+        return await self.router.attempt(call, backend, admit)
+
+    def record_cache_lookup(self, hit: bool):
+        llm_cache.inc("hit" if hit else "miss")
+        annotate("llm.cache_hit", hit)
+
+    @traced("gateway", "complete")
+    async def complete(
+        self,
+        api: str,
+        system: str,
+        prompt: str,
+        model: Optional[str] = None,
+        json_mode: bool = False,
+        use_cache: bool = True,
+        call: Optional[str] = None,
+        fallback: bool = True,
+        **params: Any,
+    ) -> str:
+        model = self.resolve_model(api, model, call)
+        annotate("gen_ai.system", api)
+        annotate("gen_ai.request.model", model)
+        cache_key = self.cache_key(
+            api, model, system, prompt, json_mode, use_cache, params
+        )
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            self.record_cache_lookup(cached is not None)
+            if cached is not None:
+                return cached
+
+        content = await self.request(
+            api, model, system, prompt, json_mode, fallback, **params
+        )
+        if cache_key is not None and content is not None:
+            self.cache.set(cache_key, content)
+        return content
+
+    @traced("gateway", "complete_structured")
+    async def complete_structured(
+        self,
+        api: str,
+        system: str,
+        prompt: str,
+        schema: Any,
+        model: Optional[str] = None,
+        max_reasks: int = STRUCTURED_OUTPUT_MAX_REASKS,
+        use_cache: bool = True,
+        on_token: Optional[TokenCallback] = None,
+        call: Optional[str] = None,
+        **params: Any,
+    ) -> Any:
+        model = self.resolve_model(api, model, call)
+        annotate("gen_ai.system", api)
+        annotate("gen_ai.request.model", model)
+        # JSON mode only guarantees a top-level object, so lists are left to the parser;
+        # it is dropped per backend for providers that do not support it
+        json_mode = self.parser.expects_object(schema)
+        cache_key = self.cache_key(
+            api, model, system, prompt, json_mode, use_cache, params
+        )
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            self.record_cache_lookup(cached is not None)
+            if cached is not None:
+                try:
+                    data = self.parser.parse(cached, schema, record=False)
+                except ParseError:
+                    pass
+                else:
+                    if on_token is not None:
+                        await on_token(cached)
+                    return data
+
+        if on_token is not None and (api == "auto" or api in STREAMING_APIS):
+            content = await self.request_stream(
+                api, model, system, prompt, on_token, json_mode, **params
+            )
+        else:
+            content = await self.request(
+                api, model, system, prompt, json_mode, **params
+            )
+        for attempt in range(max_reasks + 1):
+            try:
+                data = self.parser.parse(content, schema)
+            except ParseError as e:
+                if attempt == max_reasks:
+                    raise
+                self.parser.record_reask()
+                llm_retries.inc("reask")
+                annotate("llm.reasks", 1, increment=True)
+                model = self.escalate(api, model)
+                content = await self.request(
+                    api,
+                    model,
+                    system,
+                    self.parser.reask_prompt(prompt, content, e),
+                    json_mode,
+                    **params,
+                )
+                continue
+
+            # Only replies that parse are cached, keyed on the original prompt
+            if cache_key is not None:
+                self.cache.set(cache_key, content)
+            return data
+
+    async def stream_items(
+        self,
+        api: str,
+        system: str,
+        prompt: str,
+        item_schema: Any,
+        model: Optional[str] = None,
+        max_reasks: int = STRUCTURED_OUTPUT_MAX_REASKS,
+        use_cache: bool = True,
+        on_token: Optional[TokenCallback] = None,
+        call: Optional[str] = None,
+        **params: Any,
+    ) -> AsyncIterator[Any]:
+        # Yields the elements of a JSON list reply one by one, each as soon as
+        # the stream has produced all of it
+        model = self.resolve_model(api, model, call)
+        schema = List[item_schema]
+        if not (api == "auto" or api in STREAMING_APIS):
+            for item in await self.complete_structured(
+                api,
+                system,
+                prompt,
+                schema,
+                model=model,
+                max_reasks=max_reasks,
+                use_cache=use_cache,
+                on_token=on_token,
+                **params,
+            ):
+                yield item
+            return
+
+        cache_key = self.cache_key(api, model, system, prompt, False, use_cache, params)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            self.record_cache_lookup(cached is not None)
+            if cached is not None:
+                try:
+                    items = self.parser.parse(cached, schema, record=False)
+                except ParseError:
+                    pass
+                else:
+                    if on_token is not None:
+                        await on_token(cached)
+                    for item in items:
+                        yield item
+                    return
+
+        splitter = ArrayItemSplitter()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def on_chunk(token: str):
+            if on_token is not None:
+                await on_token(token)
+            for element in splitter.feed(token):
+                queue.put_nowait(("item", element))
+
+        async def produce():
+            try:
+                content = await self.request_stream(
+                    api, model, system, prompt, on_chunk, False, **params
+                )
+                queue.put_nowait(("done", content))
+            except Exception as e:
+                queue.put_nowait(("error", e))
+
+        producer = asyncio.create_task(produce())
+        # Positions (among the array's elements) of the items already yielded
+        yielded = set()
+        position = -1
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "error":
+                    raise value
+                if kind == "done":
+                    content = value
+                    break
+                position += 1
+                try:
+                    item = self.parser.parse(value, item_schema, record=False)
+                except ParseError:
+                    # Left to the parse of the whole reply below
+                    continue
+                yielded.add(position)
+                yield item
+        finally:
+            if not producer.done():
+                producer.cancel()
+
+        # The whole reply is still parsed: it may hold elements the splitter
+        # could not cut (e.g. Python literals), and it is what gets cached
+        for attempt in range(max_reasks + 1):
+            try:
+                items = self.parser.parse(content, schema)
+            except ParseError as e:
+                # Items already handed out cannot be taken back
+                if yielded:
+                    return
+                if attempt == max_reasks:
+                    raise
+                self.parser.record_reask()
+                llm_retries.inc("reask")
+                annotate("llm.reasks", 1, increment=True)
+                model = self.escalate(api, model)
+                content = await self.request(
+                    api, model, system, self.parser.reask_prompt(prompt, content, e), False, **params
+                )
+                continue
+
+            if cache_key is not None:
+                self.cache.set(cache_key, content)
+            for index, item in enumerate(items):
+                if index not in yielded:
+                    yield item
+            return
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.close()
@@ -1,10 +1,20 @@
-from groq import Groq
-from config.config import GROQ_API_KEY, GROQ_MODELS
-
-client = Groq(api_key=GROQ_API_KEY)
+import time
+from config.config import GROQ_MODELS, RATE_LIMIT_ENABLED
+from src.clients.rate_limiter import RateLimitExceeded, rate_limiter, retry_after
+from src.clients.registry import registry
+from src.clients.router import router
 
 def get_groq_response(prompt: str, json_mode: bool = False) -> str:
-    for model in GROQ_MODELS:
+    # Models that are currently failing or slow are tried last
+    for model in router.order_models("groq", GROQ_MODELS):
+        if RATE_LIMIT_ENABLED:
+            # A model without capacity is skipped rather than hit into a 429
+            try:
+                rate_limiter.acquire_sync("groq", model, rate_limiter.cost("", prompt, {}))
+            except RateLimitExceeded as e:
+                print(f"Skipping model {model}: {e}")
+                continue
+        started = time.perf_counter()
         try:
             kwargs = {
                 "model": model,
@@ -13,9 +23,14 @@ def get_groq_response(prompt: str, json_mode: bool = False) -> str:
             if json_mode:
                 kwargs["response_format"] = {"type": "json_object"}
 
-            response = client.chat.completions.create(**kwargs)
+            response = registry.sync_client("groq").chat.completions.create(**kwargs)
+            router.record("groq", model, time.perf_counter() - started, True)
             return response.choices[0].message.content
         except Exception as e:
+            router.record("groq", model, time.perf_counter() - started, False)
+            delay = retry_after(e)
+            if delay is not None:
+                rate_limiter.throttle("groq", model, delay)
             print(f"Error with model {model}: {e}")
     
-    raise Exception("All Groq models failed")
\ No newline at end of file
+    raise Exception("All Groq models failed")
@@ -0,0 +1,14 @@
+from config.config import LOCAL_MODEL_NAME
+from src.clients.registry import registry
+
+def get_local_response(prompt: str, json_mode: bool = False) -> str:
+    kwargs = {
+        "model": LOCAL_MODEL_NAME,
+        "messages": [{"role": "user", "content": prompt}]
+    }
+
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+
+    response = registry.sync_client("local").chat.completions.create(**kwargs)
+    return response.choices[0].message.content
@@ -0,0 +1,214 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+import asyncio
+import queue
+import threading
+import types
+from config.config import (
+    LOCAL_MODEL_PATH,
+    LOCAL_N_CTX,
+    LOCAL_WORKERS,
+    LOCAL_THREADS,
+    LOCAL_N_GPU_LAYERS,
+    LOCAL_KV_CACHE_BYTES,
+)
+
+try:
+    from llama_cpp import Llama, LlamaRAMCache
+except ImportError:
+    Llama = None
+
+# OpenAI-style request fields that llama.cpp's chat completion understands
+PASSTHROUGH_PARAMS = [
+    "temperature",
+    "top_p",
+    "max_tokens",
+    "stop",
+    "seed",
+    "presence_penalty",
+    "frequency_penalty",
+    "response_format",
+]
+
+
+def to_namespace(value: Any) -> Any:
+    # llama.cpp returns OpenAI-shaped dicts; the gateway reads SDK-style attributes
+    if isinstance(value, dict):
+        return types.SimpleNamespace(**{k: to_namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [to_namespace(v) for v in value]
+    return value
+
+
+class LocalModelPool:
+    """GGUF model replicas served through llama.cpp.
+
+    Replicas are loaded once, on first use, and handed out to at most
+    `workers` threads at a time; CPU cores are split evenly between them.
+    Each replica keeps a RAM prompt cache so the shared component system
+    prompts are evaluated once and their KV state is reused afterwards.
+    """
+
+    def __init__(
+        self,
+        model_path: Optional[str] = LOCAL_MODEL_PATH,
+        workers: int = LOCAL_WORKERS,
+        n_threads: int = LOCAL_THREADS,
+        n_ctx: int = LOCAL_N_CTX,
+        n_gpu_layers: int = LOCAL_N_GPU_LAYERS,
+        kv_cache_bytes: int = LOCAL_KV_CACHE_BYTES,
+    ):
+        self.model_path = model_path
+        self.workers = max(1, workers)
+        self.n_threads = max(1, n_threads)
+        self.n_ctx = n_ctx
+        self.n_gpu_layers = n_gpu_layers
+        self.kv_cache_bytes = kv_cache_bytes
+        self.idle: "queue.Queue[Any]" = queue.Queue()
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="llama"
+        )
+
+    def load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            if Llama is None:
+                raise ImportError("The 'local' provider requires llama-cpp-python")
+            if not self.model_path:
+                raise RuntimeError("LOCAL_MODEL_PATH is not set")
+            for _ in range(self.workers):
+                llm = Llama(
+                    model_path=self.model_path,
+                    n_ctx=self.n_ctx,
+                    n_threads=self.n_threads,
+                    n_gpu_layers=self.n_gpu_layers,
+                    verbose=False,
+                )
+                if self.kv_cache_bytes:
+                    llm.set_cache(LlamaRAMCache(capacity_bytes=self.kv_cache_bytes))
+                self.idle.put(llm)
+            self.loaded = True
+
+    @contextmanager
+    def acquire(self):
+        self.load()
+        llm = self.idle.get()
+        try:
+            yield llm
+        finally:
+            self.idle.put(llm)
+
+    def build_params(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        params = {k: kwargs[k] for k in PASSTHROUGH_PARAMS if k in kwargs}
+        params["messages"] = kwargs["messages"]
+        return params
+
+    def create(self, **kwargs: Any) -> Dict[str, Any]:
+        # response_format={"type": "json_object"} makes llama.cpp sample under its JSON grammar
+        with self.acquire() as llm:
+            return llm.create_chat_completion(**self.build_params(kwargs))
+
+    def stream(
+        self, stop_event: Optional[threading.Event] = None, **kwargs: Any
+    ) -> Iterator[Dict[str, Any]]:
+        with self.acquire() as llm:
+            for chunk in llm.create_chat_completion(
+                stream=True, **self.build_params(kwargs)
+            ):
+                if stop_event is not None and stop_event.is_set():
+                    break
+                yield chunk
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+_pool: Optional[LocalModelPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_local_pool() -> LocalModelPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LocalModelPool()
+        return _pool
+
+
+class LocalCompletions:
+    def __init__(self, pool: LocalModelPool):
+        self.pool = pool
+
+    def create(self, **kwargs: Any):
+        if kwargs.pop("stream", False):
+            return (to_namespace(chunk) for chunk in self.pool.stream(**kwargs))
+        return to_namespace(self.pool.create(**kwargs))
+
+
+class AsyncLocalCompletions:
+    def __init__(self, pool: LocalModelPool):
+        self.pool = pool
+
+    async def create(self, **kwargs: Any):
+        loop = asyncio.get_running_loop()
+        if kwargs.pop("stream", False):
+            return self.stream(loop, kwargs)
+        result = await loop.run_in_executor(
+            self.pool.executor, partial(self.pool.create, **kwargs)
+        )
+        return to_namespace(result)
+
+    async def stream(
+        self, loop: asyncio.AbstractEventLoop, kwargs: Dict[str, Any]
+    ) -> AsyncIterator[Any]:
+        # A worker thread generates tokens and hands them to the event loop
+        chunks: asyncio.Queue = asyncio.Queue()
+        stop_event = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                for chunk in self.pool.stream(stop_event, **kwargs):
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, done)
+
+        loop.run_in_executor(self.pool.executor, produce)
+        try:
+            while True:
+                item = await chunks.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield to_namespace(item)
+        finally:
+            # Consumer went away (cancelled or hedged out): stop generating
+            stop_event.set()
+
+
+class LocalLlamaClient:
+    def __init__(self, pool: Optional[LocalModelPool] = None):
+        self.chat = types.SimpleNamespace(
+            completions=LocalCompletions(pool or get_local_pool())
+        )
+
+    def close(self):
+        pass
+
+
+class AsyncLocalLlamaClient:
+    def __init__(self, pool: Optional[LocalModelPool] = None):
+        self.chat = types.SimpleNamespace(
+            completions=AsyncLocalCompletions(pool or get_local_pool())
+        )
+
+    async def close(self):
+        pass
@@ -0,0 +1,49 @@
+from typing import Dict, List, Optional
+from config.config import (
+    DEFAULT_MODEL_TIER,
+    METHOD_TIERS,
+    MODEL_TIER_ORDER,
+    MODEL_TIERS,
+)
+
+
+class ModelTiers:
+    """Picks a model per component call from per-provider speed tiers.
+
+    High-volume calls such as scoring run on the fast tier and planning runs
+    on the strong tier. A call whose reply fails to parse or validate can be
+    escalated to the next tier up.
+    """
+
+    def __init__(
+        self,
+        tiers: Dict[str, Dict[str, str]] = MODEL_TIERS,
+        order: List[str] = MODEL_TIER_ORDER,
+        methods: Dict[str, str] = METHOD_TIERS,
+        default_tier: str = DEFAULT_MODEL_TIER,
+    ):
+        for tier in [default_tier, *methods.values()]:
+            if tier not in order:
+                raise ValueError(f"Invalid model tier: {tier}")
+        self.tiers = tiers
+        self.order = order
+        self.methods = methods
+        self.default_tier = default_tier
+
+    def model(self, api: str, call: Optional[str]) -> Optional[str]:
+        models = self.tiers.get(api)
+        if not models or call is None:
+            return None
+        return models.get(self.methods.get(call, self.default_tier))
+
+    def escalate(self, api: str, model: str) -> Optional[str]:
+        # The first larger tier with a different model, if any
+        models = self.tiers.get(api) or {}
+        tiers = [tier for tier in self.order if tier in models]
+        current = [tier for tier in tiers if models[tier] == model]
+        if not current:
+            return None
+        for tier in tiers[tiers.index(current[-1]) + 1 :]:
+            if models[tier] != model:
+                return models[tier]
+        return None
@@ -1,7 +1,5 @@
-from openai import OpenAI
-from config.config import OPENAI_API_KEY, OPENAI_MODEL
-
-client = OpenAI(api_key=OPENAI_API_KEY)
+from config.config import OPENAI_MODEL
+from src.clients.registry import registry
 
 def get_openai_response(prompt: str, json_mode: bool = False) -> str:
     kwargs = {
@@ -12,5 +10,5 @@ def get_openai_response(prompt: str, json_mode: bool = False) -> str:
     if json_mode:
         kwargs["response_format"] = {"type": "json_object"}
 
-    response = client.chat.completions.create(**kwargs)
+    response = registry.sync_client("openai").chat.completions.create(**kwargs)
     return response.choices[0].message.content
\ No newline at end of file
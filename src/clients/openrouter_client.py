@@ -1,10 +1,5 @@
-from openai import OpenAI
-from config.config import OPENROUTER_API_KEY, OPENROUTER_MODEL
-
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=OPENROUTER_API_KEY
-)
+from config.config import OPENROUTER_MODEL
+from src.clients.registry import registry
 
 def get_openrouter_response(prompt: str, json_mode: bool = False) -> str:
     kwargs = {
@@ -15,5 +10,5 @@ def get_openrouter_response(prompt: str, json_mode: bool = False) -> str:
     if json_mode:
         kwargs["response_format"] = {"type": "json_object"}
 
-    response = client.chat.completions.create(**kwargs)
+    response = registry.sync_client("openrouter").chat.completions.create(**kwargs)
     return response.choices[0].message.content
\ No newline at end of file
@@ -0,0 +1,217 @@
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import threading
+import time
+from config.config import (
+    RATE_LIMITS,
+    RATE_LIMIT_MAX_WAIT,
+    RATE_LIMIT_OUTPUT_TOKENS,
+)
+from src.utils.metrics import rate_limit_rejections, rate_limit_wait
+from src.utils.tokens import estimate_tokens
+
+Backend = Tuple[str, str]
+
+
+class RateLimitExceeded(RuntimeError):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.balance = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.balance = min(self.capacity, self.balance + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # The balance goes negative while callers hold reservations, so later
+        # callers wait behind earlier ones
+        return max(0.0, min(amount, self.capacity) - self.balance) / self.rate
+
+    def take(self, amount: float):
+        self.balance -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self.balance = min(self.capacity, self.balance + min(amount, self.capacity))
+
+
+class BackendLimit:
+    def __init__(self, rpm: int, tpm: int):
+        self.buckets = [
+            (TokenBucket(rpm) if rpm else None),
+            (TokenBucket(tpm) if tpm else None),
+        ]
+        self.stats = {"granted": 0, "delayed": 0, "wait_sum": 0.0, "rejected": 0, "throttled": 0}
+        self.queued = 0
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        waits = [0.0]
+        for bucket, amount in zip(self.buckets, (1, tokens)):
+            if bucket is not None:
+                bucket.refill(now)
+                waits.append(bucket.wait_time(amount))
+        return max(waits)
+
+    def take(self, tokens: int):
+        for bucket, amount in zip(self.buckets, (1, tokens)):
+            if bucket is not None:
+                bucket.take(amount)
+
+    def refund(self, tokens: int):
+        for bucket, amount in zip(self.buckets, (1, tokens)):
+            if bucket is not None:
+                bucket.refund(amount)
+
+
+class RateLimiter:
+    """Client-side request and token budgets per (provider, model).
+
+    Every provider request reserves one request and its estimated tokens
+    (prompt plus expected output) from two token buckets that refill at the
+    provider's per-minute limits. A request without capacity waits for its
+    reservation instead of failing, unless the wait would exceed the
+    deadline; a 429 from the provider drains the buckets for its Retry-After.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, Dict[str, int]] = RATE_LIMITS,
+        max_wait: float = RATE_LIMIT_MAX_WAIT,
+        output_tokens: int = RATE_LIMIT_OUTPUT_TOKENS,
+    ):
+        self.limits = limits
+        self.max_wait = max_wait
+        self.output_tokens = output_tokens
+        self.backends: Dict[Backend, Optional[BackendLimit]] = {}
+        self.lock = threading.Lock()
+
+    def backend_limit(self, api: str, model: str) -> Optional[BackendLimit]:
+        key = (api, model)
+        if key not in self.backends:
+            limit = self.limits.get(api) or {}
+            rpm, tpm = limit.get("rpm", 0), limit.get("tpm", 0)
+            self.backends[key] = BackendLimit(rpm, tpm) if rpm or tpm else None
+        return self.backends[key]
+
+    def cost(self, system: str, prompt: str, params: Dict[str, Any]) -> int:
+        return estimate_tokens(system) + estimate_tokens(prompt) + int(
+            params.get("max_tokens") or self.output_tokens
+        )
+
+    def reserve(self, api: str, model: str, tokens: int, max_wait: float) -> float:
+        limit = self.backend_limit(api, model)
+        if limit is None:
+            return 0.0
+        with self.lock:
+            wait = limit.wait_time(tokens, time.monotonic())
+            if wait > max_wait:
+                limit.stats["rejected"] += 1
+                rate_limit_rejections.inc(api, model, "deadline")
+                raise RateLimitExceeded(
+                    f"Rate limit for {api}/{model}: no capacity within {max_wait:.0f}s",
+                    retry_after=wait,
+                )
+            limit.take(tokens)
+            limit.stats["granted"] += 1
+            if wait > 0:
+                limit.stats["delayed"] += 1
+                limit.stats["wait_sum"] += wait
+        rate_limit_wait.observe(wait, api, model)
+        return wait
+
+    def refund(self, api: str, model: str, tokens: int):
+        limit = self.backend_limit(api, model)
+        if limit is not None:
+            with self.lock:
+                limit.refund(tokens)
+
+    async def acquire(
+        self, api: str, model: str, tokens: int, max_wait: Optional[float] = None
+    ):
+        wait = self.reserve(
+            api, model, tokens, self.max_wait if max_wait is None else max_wait
+        )
+        if wait <= 0:
+            return
+        limit = self.backends[(api, model)]
+        limit.queued += 1
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # Hedged or abandoned calls give their reservation back
+            self.refund(api, model, tokens)
+            raise
+        finally:
+            limit.queued -= 1
+
+    def acquire_sync(
+        self, api: str, model: str, tokens: int, max_wait: Optional[float] = None
+    ):
+        wait = self.reserve(
+            api, model, tokens, self.max_wait if max_wait is None else max_wait
+        )
+        if wait > 0:
+            time.sleep(wait)
+
+    def throttle(self, api: str, model: str, retry_after: float):
+        # The provider says we are over its limit: nothing more until Retry-After
+        limit = self.backend_limit(api, model)
+        if limit is None:
+            return
+        with self.lock:
+            limit.stats["throttled"] += 1
+            for bucket in limit.buckets:
+                if bucket is not None:
+                    bucket.refill(time.monotonic())
+                    bucket.balance = min(bucket.balance, -retry_after * bucket.rate)
+
+    def projected_wait(self, backends: List[Backend]) -> float:
+        # How long a new request would queue on the least loaded of these backends
+        waits = []
+        with self.lock:
+            for api, model in backends:
+                limit = self.backend_limit(api, model)
+                waits.append(
+                    limit.wait_time(self.output_tokens, time.monotonic()) if limit else 0.0
+                )
+        return min(waits) if waits else 0.0
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            view = []
+            for (api, model), limit in self.backends.items():
+                if limit is None:
+                    continue
+                requests, tokens = limit.buckets
+                view.append(
+                    {
+                        "api": api,
+                        "model": model,
+                        "requests_available": round(requests.balance, 2) if requests else None,
+                        "tokens_available": round(tokens.balance) if tokens else None,
+                        "queued": limit.queued,
+                        **limit.stats,
+                    }
+                )
+            return view
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    # Seconds to back off if the error is a provider 429, else None
+    if getattr(error, "status_code", None) != 429:
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 1))
+    except ValueError:
+        return 1.0
+
+
+rate_limiter = RateLimiter()
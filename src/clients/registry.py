@@ -0,0 +1,114 @@
+from typing import Any, Dict
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from groq import AsyncGroq, Groq
+from src.clients.local_llm import AsyncLocalLlamaClient, LocalLlamaClient
+from config.config import (
+    GROQ_API_KEY,
+    OPENAI_API_KEY,
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+    HTTP2_ENABLED,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+)
+
+PROVIDERS = {
+    "groq": {"api_key": GROQ_API_KEY, "sync": Groq, "async": AsyncGroq, "options": {}},
+    "openai": {
+        "api_key": OPENAI_API_KEY,
+        "sync": OpenAI,
+        "async": AsyncOpenAI,
+        "options": {},
+    },
+    "openrouter": {
+        "api_key": OPENROUTER_API_KEY,
+        "sync": OpenAI,
+        "async": AsyncOpenAI,
+        "options": {"base_url": OPENROUTER_BASE_URL},
+    },
+    # In-process llama.cpp: no API key and no HTTP pool
+    "local": {
+        "api_key": None,
+        "sync": LocalLlamaClient,
+        "async": AsyncLocalLlamaClient,
+        "options": {},
+        "network": False,
+    },
+}
+
+
+class ProviderRegistry:
+    """Owns one tuned, keep-alive HTTP/2 connection pool per provider.
+
+    SDK clients are built lazily on top of those pools and shared by the
+    async component gateway and the sync helpers in src/clients, so every
+    call to a provider reuses warm connections instead of opening new ones.
+    """
+
+    def __init__(self, providers: Dict[str, Dict[str, Any]] = PROVIDERS):
+        self.providers = providers
+        self.limits = httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        )
+        self.timeout = httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+        self.async_clients: Dict[str, Any] = {}
+        self.sync_clients: Dict[str, Any] = {}
+
+    def provider(self, name: str) -> Dict[str, Any]:
+        if name not in self.providers:
+            raise ValueError(f"Invalid API: {name}")
+        return self.providers[name]
+
+    def async_client(self, name: str):
+        if name not in self.async_clients:
+            provider = self.provider(name)
+            if not provider.get("network", True):
+                self.async_clients[name] = provider["async"](**provider["options"])
+                return self.async_clients[name]
+            http_client = httpx.AsyncClient(
+                http2=HTTP2_ENABLED, limits=self.limits, timeout=self.timeout
+            )
+            self.async_clients[name] = provider["async"](
+                api_key=provider["api_key"],
+                http_client=http_client,
+                timeout=self.timeout,
+                **provider["options"],
+            )
+        return self.async_clients[name]
+
+    def sync_client(self, name: str):
+        if name not in self.sync_clients:
+            provider = self.provider(name)
+            if not provider.get("network", True):
+                self.sync_clients[name] = provider["sync"](**provider["options"])
+                return self.sync_clients[name]
+            http_client = httpx.Client(
+                http2=HTTP2_ENABLED, limits=self.limits, timeout=self.timeout
+            )
+            self.sync_clients[name] = provider["sync"](
+                api_key=provider["api_key"],
+                http_client=http_client,
+                timeout=self.timeout,
+                **provider["options"],
+            )
+        return self.sync_clients[name]
+
+    async def aclose(self):
+        for client in self.async_clients.values():
+            await client.close()
+        self.async_clients.clear()
+        self.close()
+
+    def close(self):
+        for client in self.sync_clients.values():
+            client.close()
+        self.sync_clients.clear()
+
+
+registry = ProviderRegistry()
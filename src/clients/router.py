@@ -0,0 +1,206 @@
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import asyncio
+import time
+import numpy as np
+from src.utils.metrics import llm_retries
+from config.config import (
+    ROUTER_BACKENDS,
+    ROUTER_CROSS_PROVIDER_FALLBACK,
+    ROUTER_WINDOW_SIZE,
+    ROUTER_WINDOW_SECONDS,
+    ROUTER_UNHEALTHY_ERROR_RATE,
+    ROUTER_HEDGE_ENABLED,
+    ROUTER_HEDGE_DEFAULT_DELAY,
+    ROUTER_HEDGE_MIN_DELAY,
+)
+
+Backend = Tuple[str, str]
+# Awaited before a backend is called (e.g. rate limiting); time spent there
+# and errors raised there do not count against the backend's health
+Admission = Callable[[str, str], Awaitable[None]]
+
+
+class BackendHealth:
+    def __init__(self, window_size: int, window_seconds: float):
+        self.window_seconds = window_seconds
+        # (timestamp, latency, ok)
+        self.samples: Deque[Tuple[float, float, bool]] = deque(maxlen=window_size)
+
+    def record(self, latency: float, ok: bool):
+        self.samples.append((time.monotonic(), latency, ok))
+
+    def recent(self) -> List[Tuple[float, float, bool]]:
+        # Old samples age out so a backend that failed a while ago gets retried
+        cutoff = time.monotonic() - self.window_seconds
+        return [sample for sample in self.samples if sample[0] >= cutoff]
+
+    def stats(self) -> Dict[str, Any]:
+        samples = self.recent()
+        latencies = [latency for _, latency, ok in samples if ok]
+        errors = sum(1 for _, _, ok in samples if not ok)
+        p50, p95 = np.percentile(latencies, [50, 95]) if latencies else (None, None)
+        return {
+            "samples": len(samples),
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "latency_p50": float(p50) if p50 is not None else None,
+            "latency_p95": float(p95) if p95 is not None else None,
+        }
+
+
+class AdaptiveRouter:
+    """Health-aware backend selection with hedged requests.
+
+    Rolling latency and error rates are tracked per (provider, model).
+    Fallbacks are tried in order of live health, and when a call runs past
+    the p95 latency of its backend a duplicate is fired at the next one;
+    whichever answers first wins and the other is cancelled.
+    """
+
+    def __init__(
+        self,
+        backends: Dict[str, List[str]] = ROUTER_BACKENDS,
+        cross_provider: bool = ROUTER_CROSS_PROVIDER_FALLBACK,
+        hedge: bool = ROUTER_HEDGE_ENABLED,
+    ):
+        self.backends = backends
+        self.cross_provider = cross_provider
+        self.hedge = hedge
+        self.health: Dict[Backend, BackendHealth] = {}
+        self.counters = {"calls": 0, "fallbacks": 0, "hedges": 0, "hedge_wins": 0}
+
+    def backend_health(self, backend: Backend) -> BackendHealth:
+        if backend not in self.health:
+            self.health[backend] = BackendHealth(ROUTER_WINDOW_SIZE, ROUTER_WINDOW_SECONDS)
+        return self.health[backend]
+
+    def record(self, api: str, model: str, latency: float, ok: bool):
+        self.backend_health((api, model)).record(latency, ok)
+
+    def is_unhealthy(self, backend: Backend) -> bool:
+        stats = self.backend_health(backend).stats()
+        return stats["samples"] >= 3 and stats["error_rate"] >= ROUTER_UNHEALTHY_ERROR_RATE
+
+    def order(self, backends: List[Backend]) -> List[Backend]:
+        # Healthy before unhealthy, then fastest median; untried backends keep
+        # their configured position at the front so they get explored
+        def key(item):
+            position, backend = item
+            p50 = self.backend_health(backend).stats()["latency_p50"]
+            return (self.is_unhealthy(backend), p50 if p50 is not None else 0.0, position)
+
+        return [backend for _, backend in sorted(enumerate(backends), key=key)]
+
+    def candidates(self, api: str, model: Optional[str] = None) -> List[Backend]:
+        if api == "auto":
+            return self.order(
+                [(name, m) for name, models in self.backends.items() for m in models]
+            )
+
+        primary = (api, model or self.backends[api][0])
+        fallbacks = [(api, m) for m in self.backends.get(api, []) if m != primary[1]]
+        if self.cross_provider:
+            fallbacks += [
+                (name, models[0])
+                for name, models in self.backends.items()
+                if name != api and models
+            ]
+        fallbacks = self.order(fallbacks)
+        # The requested backend goes first unless it is currently failing
+        if self.is_unhealthy(primary) and fallbacks:
+            return fallbacks + [primary]
+        return [primary] + fallbacks
+
+    def order_models(self, api: str, models: List[str]) -> List[str]:
+        return [model for _, model in self.order([(api, model) for model in models])]
+
+    def hedge_delay(self, backend: Backend) -> float:
+        stats = self.backend_health(backend).stats()
+        if stats["latency_p95"] is None or stats["samples"] < 5:
+            return ROUTER_HEDGE_DEFAULT_DELAY
+        return max(stats["latency_p95"], ROUTER_HEDGE_MIN_DELAY)
+
+    async def attempt(
+        self,
+        call: Callable[[str, str], Awaitable[Any]],
+        backend: Backend,
+        admit: Optional[Admission] = None,
+    ) -> Any:
+        if admit is not None:
+            await admit(*backend)
+        started = time.perf_counter()
+        try:
+            result = await call(*backend)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.record(*backend, time.perf_counter() - started, False)
+            raise
+        self.record(*backend, time.perf_counter() - started, True)
+        return result
+
+    async def call(
+        self,
+        call: Callable[[str, str], Awaitable[Any]],
+        backends: List[Backend],
+        hedge: Optional[bool] = None,
+        admit: Optional[Admission] = None,
+    ) -> Any:
+        hedge = self.hedge if hedge is None else hedge
+        self.counters["calls"] += 1
+        remaining = list(backends)
+        running: Dict[asyncio.Task, Backend] = {}
+        last_error: Optional[Exception] = None
+        hedged = False
+
+        def start_next():
+            backend = remaining.pop(0)
+            running[asyncio.create_task(self.attempt(call, backend, admit))] = backend
+            return backend
+
+        latest = start_next()
+        try:
+            while running:
+                timeout = None
+                if hedge and not hedged and remaining:
+                    timeout = self.hedge_delay(latest)
+                done, _ = await asyncio.wait(
+                    running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # The call is slower than this backend's p95: race a duplicate
+                    hedged = True
+                    self.counters["hedges"] += 1
+                    llm_retries.inc("hedge")
+                    latest = start_next()
+                    continue
+
+                for task in done:
+                    backend = running.pop(task)
+                    if task.exception() is None:
+                        if hedged and backend != backends[0]:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    last_error = task.exception()
+
+                if not running and remaining:
+                    self.counters["fallbacks"] += 1
+                    llm_retries.inc("fallback")
+                    latest = start_next()
+        finally:
+            for task in running:
+                task.cancel()
+
+        raise last_error or RuntimeError("No backends available")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "backends": [
+                {"api": api, "model": model, **health.stats()}
+                for (api, model), health in self.health.items()
+            ],
+        }
+
+
+router = AdaptiveRouter()
@@ -1,13 +1,215 @@
-from src.utils.response_handler import get_llm_response
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+import asyncio
+import inspect
+import re
+import time
+import numpy as np
+from config.config import ROUTER_BACKENDS, COMPARISON_TIMEOUT, RATE_LIMIT_ENABLED
+from src.clients.gateway import LLMGateway
+from src.clients.rate_limiter import rate_limiter
+from src.clients.registry import registry
+from src.utils.embeddings import HashingEmbedder
+from src.utils.structured_output import ParseError, StructuredOutputParser
+from src.utils.tokens import estimate_tokens
 
-def evaluate_responses(prompt: str, reasoning_prompt: str = None):
+Scorer = Callable[[str, str], Union[float, Awaitable[float]]]
+
+embedder = HashingEmbedder()
+parser = StructuredOutputParser()
+
+
+def relevance_scorer(prompt: str, output: str) -> float:
+    # Cosine similarity between prompt and output, scaled to 0-100
+    similarity = float(np.dot(embedder.embed(prompt), embedder.embed(output)))
+    return round(max(similarity, 0.0) * 100, 2)
+
+
+def json_scorer(prompt: str, output: str) -> float:
+    try:
+        _, repaired = parser.decode(output)
+    except ParseError:
+        return 0.0
+    return 50.0 if repaired else 100.0
+
+
+@lru_cache(maxsize=1)
+def default_gateway() -> LLMGateway:
+    # Used when the caller has no gateway of its own (e.g. evaluate_responses)
+    return LLMGateway(limiter=rate_limiter if RATE_LIMIT_ENABLED else None)
+
+
+def make_judge_scorer(
+    api: str = "groq", model: Optional[str] = None, gateway: Optional[LLMGateway] = None
+) -> Scorer:
+    model = model or ROUTER_BACKENDS[api][0]
+
+    async def judge_scorer(prompt: str, output: str) -> float:
+        judge_prompt = f"""
+        Prompt: {prompt}
+        Response: {output}
+
+        Rate how well the response answers the prompt on a scale from 0 to 100.
+        Format the output as a JSON object with a single key 'score'.
+        """
+        reply = await call_backend(
+            gateway or default_gateway(), api, model, judge_prompt, json_mode=True
+        )
+        data, _ = parser.decode(reply["output"])
+        match = re.search(r"\d+(\.\d+)?", str(data.get("score", "")))
+        return float(match.group()) if match else 0.0
+
+    return judge_scorer
+
+
+SCORERS: Dict[str, Scorer] = {
+    "relevance": relevance_scorer,
+    "json": json_scorer,
+    "judge": make_judge_scorer(),
+}
+
+
+def configured_backends() -> List[Tuple[str, str]]:
+    return [(api, model) for api, models in ROUTER_BACKENDS.items() for model in models]
+
+
+async def call_backend(
+    gateway: LLMGateway, api: str, model: str, prompt: str, json_mode: bool = False
+) -> Dict[str, Any]:
+    # Through the gateway, so comparisons share its rate limits; the cache and fallback
+    # are off because the latency and reply must come from this exact backend
+    output = (
+        await gateway.complete(
+            api,
+            "",
+            prompt,
+            model=model,
+            json_mode=json_mode,
+            use_cache=False,
+            fallback=False,
+        )
+        or ""
+    )
+    prompt_tokens = estimate_tokens(prompt)
+    completion_tokens = estimate_tokens(output)
+    return {
+        "output": output,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+async def run_backend(
+    gateway: LLMGateway,
+    api: str,
+    model: str,
+    prompt: str,
+    scorer: Scorer,
+    json_mode: bool,
+    timeout: float,
+) -> Dict[str, Any]:
+    entry = {
+        "api": api,
+        "model": model,
+        "score": None,
+        "output": None,
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "total_tokens": None,
+        "error": None,
+    }
+    started = time.perf_counter()
+    try:
+        # Async clients: a timed-out call is cancelled, not left running
+        entry.update(
+            await asyncio.wait_for(
+                call_backend(gateway, api, model, prompt, json_mode), timeout
+            )
+        )
+    except Exception as e:
+        entry["latency"] = round(time.perf_counter() - started, 3)
+        entry["error"] = str(e) or type(e).__name__
+        return entry
+
+    # Comparison runs are not recorded as router health: they are one-off probes,
+    # not the traffic the router's latency and error windows describe
+    entry["latency"] = round(time.perf_counter() - started, 3)
+    try:
+        score = scorer(prompt, entry["output"])
+        entry["score"] = float(await score if inspect.isawaitable(score) else score)
+    except Exception as e:
+        entry["error"] = f"Scoring failed: {e}"
+    return entry
+
+
+async def compare_responses(
+    prompt: str,
+    reasoning_prompt: Optional[str] = None,
+    backends: Optional[List[Tuple[str, str]]] = None,
+    scorer: Union[str, Scorer] = "relevance",
+    json_mode: bool = False,
+    timeout: float = COMPARISON_TIMEOUT,
+    gateway: Optional[LLMGateway] = None,
+) -> Dict[str, Any]:
+    gateway = gateway or default_gateway()
     if reasoning_prompt:
         prompt = f"{prompt}\n\n{reasoning_prompt}"
+    scorer_name = scorer if isinstance(scorer, str) else getattr(scorer, "__name__", "custom")
+    if isinstance(scorer, str):
+        if scorer not in SCORERS:
+            raise ValueError(f"Invalid scorer: {scorer}")
+        scorer = (
+            make_judge_scorer(gateway=gateway) if scorer == "judge" else SCORERS[scorer]
+        )
+    backends = backends or configured_backends()
+    for api, _ in backends:
+        registry.provider(api)
+
+    # Every backend is queried at once: wall time is the slowest call, not the sum
+    started = time.perf_counter()
+    entries = await asyncio.gather(
+        *[
+            run_backend(gateway, api, model, prompt, scorer, json_mode, timeout)
+            for api, model in backends
+        ]
+    )
+    leaderboard = sorted(
+        entries,
+        key=lambda e: (e["score"] is None, -(e["score"] or 0.0), e["latency"]),
+    )
+    for rank, entry in enumerate(leaderboard, 1):
+        entry["rank"] = rank
+    return {
+        "prompt": prompt,
+        "scorer": scorer_name,
+        "wall_time": round(time.perf_counter() - started, 3),
+        "leaderboard": leaderboard,
+    }
+
 
-    openai_response = get_llm_response("openai", prompt)
-    groq_response = get_llm_response("groq", prompt)
-    openrouter_response = get_llm_response("openrouter", prompt)
+def evaluate_responses(
+    prompt: str,
+    reasoning_prompt: str = None,
+    backends: Optional[List[Tuple[str, str]]] = None,
+    scorer: Union[str, Scorer] = "relevance",
+) -> Dict[str, Any]:
+    async def compare():
+        try:
+            return await compare_responses(prompt, reasoning_prompt, backends, scorer)
+        finally:
+            # The pooled async clients belong to this event loop
+            await registry.aclose()
+            default_gateway.cache_clear()
 
-    print(f"OpenAI Response: {openai_response}")
-    print(f"\nGroq Response: {groq_response}")
-    print(f"\nOpenRouter Response: {openrouter_response}")
\ No newline at end of file
+    comparison = asyncio.run(compare())
+    for entry in comparison["leaderboard"]:
+        label = f"#{entry['rank']} {entry['api']}/{entry['model']}"
+        if entry["error"]:
+            print(f"{label} failed after {entry['latency']}s: {entry['error']}")
+        else:
+            print(
+                f"{label} score={entry['score']} latency={entry['latency']}s "
+                f"tokens={entry['total_tokens']}\n{entry['output']}\n"
+            )
+    return comparison
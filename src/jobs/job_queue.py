@@ -0,0 +1,213 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from src.storage.job_store import FINAL_STATUSES, open_job_store
+from src.utils.metrics import job_queue_wait, jobs_finished
+
+EventCallback = Callable[[str, Any], Awaitable[None]]
+# Runs one job: (payload, emit) -> result
+JobRunner = Callable[[Dict[str, Any], EventCallback], Awaitable[Dict[str, Any]]]
+
+
+class TenantLimitError(RuntimeError):
+    pass
+
+
+def dedup_key(tenant: str, payload: Dict[str, Any]) -> str:
+    body = json.dumps([tenant, payload], sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class JobQueue:
+    """Background execution of submitted agent runs.
+
+    Submissions are stored (SQLite or Redis) and return a job id at once;
+    an identical job the same tenant still has queued or running is reused
+    instead. A dispatcher starts queued jobs in submission order on up to
+    `workers` asyncio tasks, skipping tenants that already have
+    `tenant_concurrency` jobs running. Jobs share this process's gateway, so
+    rate limits, the response cache and task history cover them too. Job events are kept in
+    the store so a status or stream request can pick them up at any time.
+    """
+
+    def __init__(
+        self,
+        run_job: JobRunner,
+        backend: str = "sqlite",
+        path: str = "jobs.db",
+        redis_url: str = "",
+        workers: int = 4,
+        tenant_concurrency: int = 2,
+        tenant_max_pending: int = 50,
+        poll_interval: float = 0.5,
+    ):
+        self.run_job = run_job
+        self.store_config = (backend, path, redis_url)
+        self.store = open_job_store(*self.store_config)
+        self.workers = workers
+        self.tenant_concurrency = tenant_concurrency
+        self.tenant_max_pending = tenant_max_pending
+        self.poll_interval = poll_interval
+
+        self.running: Dict[str, asyncio.Task] = {}
+        self.tenant_running: Dict[str, int] = {}
+        self.signals: Dict[str, asyncio.Event] = {}
+        self.wakeup = asyncio.Event()
+        self.dispatcher: Optional[asyncio.Task] = None
+
+    def start(self):
+        requeued = self.store.requeue_running()
+        if requeued:
+            logging.info(f"Requeued {requeued} jobs left running by a previous process")
+        self.dispatcher = asyncio.create_task(self.dispatch_forever())
+
+    async def stop(self):
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+        for task in list(self.running.values()):
+            task.cancel()
+        await asyncio.gather(*self.running.values(), return_exceptions=True)
+        self.store.close()
+
+    def submit(self, tenant: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self.store.pending(tenant) >= self.tenant_max_pending:
+            raise TenantLimitError(
+                f"Tenant already has {self.tenant_max_pending} jobs queued or running"
+            )
+        job_id, deduplicated = self.store.submit(tenant, dedup_key(tenant, payload), payload)
+        self.wakeup.set()
+        return {
+            "job_id": job_id,
+            "status": self.store.get(job_id)["status"],
+            "deduplicated": deduplicated,
+        }
+
+    def get(self, tenant: str, job_id: str) -> Optional[Dict[str, Any]]:
+        # Jobs are only visible to the tenant that submitted them
+        job = self.store.get(job_id)
+        if job is None or job["tenant"] != tenant:
+            return None
+        return job
+
+    def cancel(self, tenant: str, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.get(tenant, job_id)
+        if job is None:
+            return None
+        if self.store.finish(job_id, "cancelled"):
+            self.store.append_event(job_id, "cancelled", {"job_id": job_id})
+            jobs_finished.inc("cancelled")
+            self.notify(job_id)
+            task = self.running.get(job_id)
+            if task is not None:
+                task.cancel()
+        return self.store.get(job_id)
+
+    def notify(self, job_id: str):
+        signal = self.signals.pop(job_id, None)
+        if signal is not None:
+            signal.set()
+
+    async def wait(self, job_id: str, timeout: float):
+        signal = self.signals.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(signal.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def follow(self, tenant: str, job_id: str) -> AsyncIterator[Tuple[str, Any]]:
+        # Replays the job's events so far, then the rest as they arrive. Jobs run
+        # by another server process only show up in the store, so it is also polled.
+        offset = 0
+        try:
+            while True:
+                job = self.get(tenant, job_id)
+                if job is None:
+                    return
+                events = self.store.events(job_id, offset)
+                offset += len(events)
+                for event in events:
+                    yield event
+                if job["status"] in FINAL_STATUSES:
+                    return
+                await self.wait(job_id, self.poll_interval)
+        finally:
+            self.signals.pop(job_id, None)
+
+    def saturated_tenants(self) -> Set[str]:
+        return {
+            tenant
+            for tenant, count in self.tenant_running.items()
+            if count >= self.tenant_concurrency
+        }
+
+    async def dispatch_forever(self):
+        while True:
+            # Woken by submissions and finished jobs; the timeout picks up
+            # jobs submitted through another process
+            self.wakeup.clear()
+            while len(self.running) < self.workers:
+                job = self.store.claim(self.saturated_tenants())
+                if job is None:
+                    break
+                self.launch(job)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def launch(self, job: Dict[str, Any]):
+        job_id, tenant = job["id"], job["tenant"]
+        job_queue_wait.observe(job["started_at"] - job["created_at"])
+        self.tenant_running[tenant] = self.tenant_running.get(tenant, 0) + 1
+        self.store.append_event(job_id, "started", {"job_id": job_id})
+        self.notify(job_id)
+        task = asyncio.create_task(self.execute(job_id, job))
+        self.running[job_id] = task
+
+        def done(_):
+            self.running.pop(job_id, None)
+            self.tenant_running[tenant] -= 1
+            if not self.tenant_running[tenant]:
+                del self.tenant_running[tenant]
+            self.wakeup.set()
+
+        task.add_done_callback(done)
+
+    async def execute(self, job_id: str, job: Dict[str, Any]):
+        payload = {key: job[key] for key in ("task", "context", "api")}
+
+        async def emit(event: str, data: Any):
+            self.store.append_event(job_id, event, data)
+            self.notify(job_id)
+
+        started = time.perf_counter()
+        try:
+            result = await self.run_job(payload, emit)
+        except asyncio.CancelledError:
+            if self.store.finish(job_id, "cancelled"):
+                jobs_finished.inc("cancelled")
+            self.notify(job_id)
+            raise
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {e}")
+            if self.store.finish(job_id, "failed", error=str(e)):
+                self.store.append_event(job_id, "error", {"detail": str(e)})
+                jobs_finished.inc("failed")
+        else:
+            if self.store.finish(job_id, "succeeded", result=result):
+                self.store.append_event(job_id, "result", result)
+                jobs_finished.inc("succeeded")
+        logging.info(f"Job {job_id} done in {time.perf_counter() - started:.2f}s")
+        self.notify(job_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.store_config[0],
+            "workers": self.workers,
+            "running": len(self.running),
+            "running_by_tenant": dict(self.tenant_running),
+            "jobs_by_status": self.store.counts(),
+        }
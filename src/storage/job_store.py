@@ -0,0 +1,322 @@
+from typing import Any, Collection, Dict, List, Optional, Tuple
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+ACTIVE_STATUSES = ("queued", "running")
+FINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class JobStore:
+    """SQLite-backed job records, queue order and per-job event logs.
+
+    Jobs are claimed with a conditional UPDATE, so a job is only ever started
+    once. The queue is meant to be dispatched by a single process; other
+    processes may open the same file to submit jobs or read their events.
+    """
+
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE NOT NULL, "
+                "tenant TEXT NOT NULL, dedup_key TEXT NOT NULL, status TEXT NOT NULL, "
+                "payload TEXT NOT NULL, result TEXT, error TEXT, created_at REAL NOT NULL, "
+                "started_at REAL, finished_at REAL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seq)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, "
+                "event TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, id)"
+            )
+
+    @staticmethod
+    def row_to_job(row: Tuple) -> Dict[str, Any]:
+        job_id, tenant, status, payload, result, error, created, started, finished = row
+        return {
+            "id": job_id,
+            "tenant": tenant,
+            "status": status,
+            **json.loads(payload),
+            "result": json.loads(result) if result is not None else None,
+            "error": error,
+            "created_at": created,
+            "started_at": started,
+            "finished_at": finished,
+        }
+
+    def submit(
+        self, tenant: str, dedup_key: str, payload: Dict[str, Any]
+    ) -> Tuple[str, bool]:
+        # Returns (job id, deduplicated): an identical active job is reused
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT id FROM jobs WHERE dedup_key = ? AND status IN (?, ?) LIMIT 1",
+                (dedup_key, *ACTIVE_STATUSES),
+            ).fetchone()
+            if row is not None:
+                return row[0], True
+            job_id = uuid.uuid4().hex
+            self.conn.execute(
+                "INSERT INTO jobs (id, tenant, dedup_key, status, payload, created_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, tenant, dedup_key, json.dumps(payload, default=str), time.time()),
+            )
+            return job_id, False
+
+    def claim(self, exclude_tenants: Collection[str] = ()) -> Optional[Dict[str, Any]]:
+        # Oldest queued job whose tenant is not already at its concurrency limit
+        excluded = list(exclude_tenants)
+        placeholders = ",".join("?" * len(excluded))
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued'"
+                + (f" AND tenant NOT IN ({placeholders})" if excluded else "")
+                + " ORDER BY seq LIMIT 1",
+                excluded,
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = self.conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (time.time(), row[0]),
+            ).rowcount
+        return self.get(row[0]) if claimed else None
+
+    def finish(
+        self,
+        job_id: str,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> bool:
+        # Only active jobs can finish, so a cancelled job stays cancelled
+        with self.lock, self.conn:
+            return bool(
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                    "WHERE id = ? AND status IN (?, ?)",
+                    (
+                        status,
+                        json.dumps(result, default=str) if result is not None else None,
+                        error,
+                        time.time(),
+                        job_id,
+                        *ACTIVE_STATUSES,
+                    ),
+                ).rowcount
+            )
+
+    def requeue_running(self) -> int:
+        # Jobs left running by a previous process start over
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'"
+            ).rowcount
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, tenant, status, payload, result, error, created_at, "
+                "started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return self.row_to_job(row) if row is not None else None
+
+    def pending(self, tenant: str) -> int:
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE tenant = ? AND status IN (?, ?)",
+                (tenant, *ACTIVE_STATUSES),
+            ).fetchone()[0]
+
+    def append_event(self, job_id: str, event: str, data: Any):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO job_events (job_id, event, data) VALUES (?, ?, ?)",
+                (job_id, event, json.dumps(data, default=str)),
+            )
+
+    def events(self, job_id: str, offset: int = 0) -> List[Tuple[str, Any]]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT event, data FROM job_events WHERE job_id = ? "
+                "ORDER BY id LIMIT -1 OFFSET ?",
+                (job_id, offset),
+            ).fetchall()
+        return [(event, json.loads(data)) for event, data in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class RedisJobStore:
+    """The same job store on Redis: a hash per job, a list as the queue,
+    a list of events per job and NX keys for deduplication."""
+
+    def __init__(self, url: str, prefix: str = "agent:jobs"):
+        if redis is None:
+            raise ImportError("The 'redis' job backend requires the redis package")
+        self.conn = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def key(self, *parts: str) -> str:
+        return ":".join((self.prefix, *parts))
+
+    def submit(
+        self, tenant: str, dedup_key: str, payload: Dict[str, Any]
+    ) -> Tuple[str, bool]:
+        job_id = uuid.uuid4().hex
+        dedup = self.key("dedup", dedup_key)
+        while not self.conn.set(dedup, job_id, nx=True):
+            existing = self.conn.get(dedup)
+            if existing is not None and self.conn.hget(
+                self.key("job", existing), "status"
+            ) in ACTIVE_STATUSES:
+                return existing, True
+            # The job it pointed to is gone or finished
+            self.conn.delete(dedup)
+        pipe = self.conn.pipeline()
+        pipe.hset(
+            self.key("job", job_id),
+            mapping={
+                "id": job_id,
+                "tenant": tenant,
+                "dedup_key": dedup_key,
+                "status": "queued",
+                "payload": json.dumps(payload, default=str),
+                "created_at": time.time(),
+            },
+        )
+        pipe.sadd(self.key("tenant", tenant), job_id)
+        pipe.rpush(self.key("queue"), job_id)
+        pipe.execute()
+        return job_id, False
+
+    def claim(
+        self, exclude_tenants: Collection[str] = (), scan: int = 100
+    ) -> Optional[Dict[str, Any]]:
+        for job_id in self.conn.lrange(self.key("queue"), 0, scan - 1):
+            tenant = self.conn.hget(self.key("job", job_id), "tenant")
+            if tenant in exclude_tenants:
+                continue
+            # LREM succeeds for exactly one claimer
+            if self.conn.lrem(self.key("queue"), 1, job_id):
+                self.conn.hset(
+                    self.key("job", job_id),
+                    mapping={"status": "running", "started_at": time.time()},
+                )
+                return self.get(job_id)
+        return None
+
+    def finish(
+        self,
+        job_id: str,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> bool:
+        job_key = self.key("job", job_id)
+        fields = self.conn.hmget(job_key, "status", "tenant", "dedup_key")
+        if fields[0] not in ACTIVE_STATUSES:
+            return False
+        update = {"status": status, "finished_at": time.time()}
+        if result is not None:
+            update["result"] = json.dumps(result, default=str)
+        if error is not None:
+            update["error"] = error
+        pipe = self.conn.pipeline()
+        pipe.hset(job_key, mapping=update)
+        pipe.srem(self.key("tenant", fields[1]), job_id)
+        pipe.lrem(self.key("queue"), 1, job_id)
+        pipe.execute()
+        dedup = self.key("dedup", fields[2])
+        if self.conn.get(dedup) == job_id:
+            self.conn.delete(dedup)
+        return True
+
+    def requeue_running(self) -> int:
+        requeued = 0
+        for job_key in self.conn.scan_iter(self.key("job", "*")):
+            if self.conn.hget(job_key, "status") == "running":
+                self.conn.hset(job_key, "status", "queued")
+                self.conn.hdel(job_key, "started_at")
+                self.conn.lpush(self.key("queue"), job_key.rsplit(":", 1)[1])
+                requeued += 1
+        return requeued
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.conn.hgetall(self.key("job", job_id))
+        if not job:
+            return None
+        return {
+            "id": job["id"],
+            "tenant": job["tenant"],
+            "status": job["status"],
+            **json.loads(job["payload"]),
+            "result": json.loads(job["result"]) if "result" in job else None,
+            "error": job.get("error"),
+            "created_at": float(job["created_at"]),
+            "started_at": float(job["started_at"]) if "started_at" in job else None,
+            "finished_at": float(job["finished_at"]) if "finished_at" in job else None,
+        }
+
+    def pending(self, tenant: str) -> int:
+        return self.conn.scard(self.key("tenant", tenant))
+
+    def append_event(self, job_id: str, event: str, data: Any):
+        self.conn.rpush(
+            self.key("events", job_id), json.dumps([event, data], default=str)
+        )
+
+    def events(self, job_id: str, offset: int = 0) -> List[Tuple[str, Any]]:
+        return [
+            tuple(json.loads(item))
+            for item in self.conn.lrange(self.key("events", job_id), offset, -1)
+        ]
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for job_key in self.conn.scan_iter(self.key("job", "*")):
+            status = self.conn.hget(job_key, "status")
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def close(self):
+        self.conn.close()
+
+
+def open_job_store(backend: str, path: str, redis_url: str):
+    if backend == "sqlite":
+        return JobStore(path)
+    if backend == "redis":
+        return RedisJobStore(redis_url)
+    raise ValueError(f"Invalid job backend: {backend}")
@@ -0,0 +1,103 @@
+from typing import Any, Iterable, Iterator, List, Tuple
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+class SQLiteMemoryStore:
+    """Key/value store for long-term memory backed by SQLite in WAL mode.
+
+    Every write is committed before it returns; bulk writes are committed in
+    batches of batch_size. Reads go straight to the database so nothing is
+    loaded up front. JSON files remain supported for import and export.
+    """
+
+    def __init__(self, path: str, batch_size: int = 32):
+        self.path = path
+        self.batch_size = batch_size
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS memory "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM memory WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key: str, value: Any):
+        self.write([(key, json.dumps(value, default=str))])
+
+    def set_many(self, items: Iterable[Tuple[str, Any]]):
+        batch = []
+        for key, value in items:
+            batch.append((key, json.dumps(value, default=str)))
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+        if batch:
+            self.write(batch)
+
+    def write(self, items: List[Tuple[str, str]]):
+        now = time.time()
+        # One transaction per write; a crash leaves either all or none of it
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO memory (key, value, updated_at) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in items],
+            )
+
+    def keys(self) -> List[str]:
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT key FROM memory")]
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        with self.lock:
+            rows = self.conn.execute("SELECT key, value FROM memory").fetchall()
+        for key, value in rows:
+            yield key, json.loads(value)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, self) is not self
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+
+    def import_json(self, path: str) -> int:
+        with open(path, "r") as f:
+            data = json.load(f)
+        self.set_many(data.items())
+        return len(data)
+
+    def export_json(self, path: str):
+        # Write to a temporary file and rename so readers never see a torn file
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(dict(self.items()), f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM memory")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,157 @@
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from src.storage.vector_index import VectorIndex
+from src.utils.embeddings import HashingEmbedder
+from src.utils.metrics import plan_library_lookups, plan_library_saved
+
+
+def task_key(task: str) -> str:
+    return hashlib.sha256(" ".join(task.lower().split()).encode()).hexdigest()
+
+
+class PlanLibrary:
+    """Persistent library of well-scored plans, searchable by task similarity.
+
+    Plans are stored in SQLite with the running mean of their evaluation
+    scores and the time it took to plan them from scratch. Plans scoring at
+    least min_score are kept in a vector index of task embeddings, so a new
+    task finds its own stored plan, or else the nearest one, without any LLM
+    call.
+    """
+
+    def __init__(
+        self, path: str, dim: int = 256, backend: str = "numpy", min_score: float = 70
+    ):
+        self.min_score = min_score
+        self.embedder = HashingEmbedder(dim)
+        self.index = VectorIndex(dim, backend)
+        self.lock = threading.Lock()
+        self.stats = {"reuse": 0, "refine": 0, "miss": 0, "saved_seconds": 0.0}
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS plans ("
+                "key TEXT PRIMARY KEY, task TEXT NOT NULL, plan TEXT NOT NULL, "
+                "score REAL NOT NULL, runs INTEGER NOT NULL, "
+                "plan_seconds REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+        for row in self.conn.execute(
+            "SELECT key, task, plan, score, runs, plan_seconds FROM plans WHERE score >= ?",
+            (min_score,),
+        ):
+            self.index_entry(self.entry(row))
+
+    @staticmethod
+    def entry(row) -> Dict[str, Any]:
+        key, task, plan, score, runs, plan_seconds = row
+        return {
+            "key": key,
+            "task": task,
+            "plan": json.loads(plan),
+            "score": score,
+            "runs": runs,
+            "plan_seconds": plan_seconds,
+        }
+
+    def index_entry(self, entry: Dict[str, Any]):
+        self.index.upsert(entry["key"], self.embedder.embed(entry["task"]), entry)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def lookup(self, task: str, min_similarity: float) -> Optional[Dict[str, Any]]:
+        # The same task (up to case and spacing) wins over any merely similar one
+        key = task_key(task)
+        with self.lock:
+            if key in self.index:
+                return {**self.index.payloads[key], "similarity": 1.0}
+            hits = self.index.search(self.embedder.embed(task), 1, min_similarity)
+        if not hits:
+            return None
+        _, similarity, entry = hits[0]
+        return {**entry, "similarity": similarity}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT key, task, plan, score, runs, plan_seconds FROM plans WHERE key = ?",
+            (key,),
+        ).fetchone()
+        return self.entry(row) if row else None
+
+    def record(
+        self,
+        task: str,
+        plan: List[Dict[str, Any]],
+        score: float,
+        plan_seconds: float,
+        reused_key: Optional[str] = None,
+    ):
+        with self.lock:
+            if reused_key is not None:
+                entry = self.get(reused_key)
+                if entry is None:
+                    return
+                # A reused plan keeps its own task; its score tracks how well it keeps doing
+                entry["score"] = (entry["score"] * entry["runs"] + score) / (entry["runs"] + 1)
+                entry["runs"] += 1
+            else:
+                entry = self.get(task_key(task))
+                # A task that already has a better plan keeps it
+                if entry is not None and entry["score"] > score:
+                    return
+                entry = {
+                    "key": task_key(task),
+                    "task": task,
+                    "plan": plan,
+                    "score": score,
+                    "runs": 1,
+                    "plan_seconds": plan_seconds,
+                }
+
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        entry["key"],
+                        entry["task"],
+                        json.dumps(entry["plan"], default=str),
+                        entry["score"],
+                        entry["runs"],
+                        entry["plan_seconds"],
+                        time.time(),
+                    ),
+                )
+            if entry["score"] >= self.min_score:
+                self.index_entry(entry)
+            else:
+                self.index.remove(entry["key"])
+
+    def record_lookup(self, result: str, saved_seconds: float = 0.0):
+        with self.lock:
+            self.stats[result] += 1
+            self.stats["saved_seconds"] += saved_seconds
+        plan_library_lookups.inc(result)
+        if saved_seconds:
+            plan_library_saved.inc(result, amount=saved_seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.stats["reuse"] + self.stats["refine"] + self.stats["miss"]
+            hits = lookups - self.stats["miss"]
+            return {
+                "plans": len(self.index),
+                "lookups": lookups,
+                "reused": self.stats["reuse"],
+                "refined": self.stats["refine"],
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "saved_seconds": round(self.stats["saved_seconds"], 3),
+            }
+
+    def close(self):
+        self.conn.close()
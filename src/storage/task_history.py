@@ -0,0 +1,214 @@
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import json
+import sqlite3
+import threading
+import time
+import numpy as np
+from src.utils.tokens import truncate_tokens
+
+
+class TaskHistoryStore:
+    """Persistent task history with a bounded in-memory view.
+
+    Every finished task is appended to SQLite. The most recent records are
+    kept in a ring buffer, and per-(api, model) aggregates are updated as
+    each task is recorded, so summaries never rescan the full history. A
+    task counts towards every backend its provider calls went to.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 100, latency_window: int = 1000):
+        self.lock = threading.Lock()
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self.latency_window = latency_window
+        self.latencies: Dict[Tuple[str, str], Deque[float]] = {}
+        self.aggregates: Dict[Tuple[str, str], Dict[str, float]] = {}
+        # Compact per-task digests are made once, when a task is recorded, and the
+        # whole summary is reused until the next task comes in
+        self.digests: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self.summary_cache: Dict[int, Dict[str, Any]] = {}
+        self.total = 0
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, "
+                "api TEXT NOT NULL, model TEXT NOT NULL, status TEXT NOT NULL, "
+                "latency REAL NOT NULL, score REAL, record TEXT NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS task_stats ("
+                "api TEXT NOT NULL, model TEXT NOT NULL, count INTEGER NOT NULL, "
+                "failures INTEGER NOT NULL, score_sum REAL NOT NULL, "
+                "score_count INTEGER NOT NULL, latency_sum REAL NOT NULL, "
+                "PRIMARY KEY (api, model))"
+            )
+        self.load()
+
+    def load(self):
+        for api, model, *values in self.conn.execute("SELECT * FROM task_stats"):
+            self.aggregates[(api, model)] = dict(
+                zip(
+                    ["count", "failures", "score_sum", "score_count", "latency_sum"],
+                    values,
+                )
+            )
+        self.total = self.conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        rows = self.conn.execute(
+            "SELECT id, api, model, latency, record FROM tasks ORDER BY id DESC LIMIT ?",
+            (max(self.recent.maxlen, self.latency_window),),
+        ).fetchall()
+        for task_id, api, model, latency, record in reversed(rows):
+            self.recent.append({"id": task_id, **json.loads(record)})
+            # Older records name a single model in their columns
+            backends = self.recent[-1].get("backends")
+            for backend in backends if backends is not None else [{"api": api, "model": model}]:
+                self.latency_bucket(backend["api"], backend["model"]).append(latency)
+            self.digests.append(self.digest(self.recent[-1]))
+
+    def latency_bucket(self, api: str, model: str) -> Deque[float]:
+        return self.latencies.setdefault((api, model), deque(maxlen=self.latency_window))
+
+    def __len__(self) -> int:
+        return self.total
+
+    def record(
+        self,
+        task: str,
+        api: str,
+        backends: List[Tuple[str, str]],
+        latency: float,
+        plan: Optional[List[Dict[str, Any]]] = None,
+        results: Optional[List[Dict[str, Any]]] = None,
+        evaluation: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> int:
+        status = "failed" if error else "success"
+        score = (evaluation or {}).get("score")
+        record = {
+            "task": task,
+            "api": api,
+            "backends": [{"api": name, "model": model} for name, model in backends],
+            "status": status,
+            "latency": latency,
+            "plan": plan,
+            "results": results,
+            "evaluation": evaluation,
+            "error": error,
+        }
+
+        with self.lock:
+            self.total += 1
+            for backend in backends:
+                stats = self.aggregates.setdefault(
+                    backend,
+                    {
+                        "count": 0,
+                        "failures": 0,
+                        "score_sum": 0.0,
+                        "score_count": 0,
+                        "latency_sum": 0.0,
+                    },
+                )
+                stats["count"] += 1
+                stats["failures"] += status == "failed"
+                stats["latency_sum"] += latency
+                if score is not None:
+                    stats["score_sum"] += score
+                    stats["score_count"] += 1
+
+            with self.conn:
+                cursor = self.conn.execute(
+                    "INSERT INTO tasks (created_at, api, model, status, latency, score, record) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        time.time(),
+                        api,
+                        backends[0][1] if backends else "",
+                        status,
+                        latency,
+                        score,
+                        json.dumps(record, default=str),
+                    ),
+                )
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO task_stats VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (*backend, *self.aggregates[backend].values())
+                        for backend in backends
+                    ],
+                )
+            for backend in backends:
+                self.latency_bucket(*backend).append(latency)
+            self.recent.append({"id": cursor.lastrowid, **record})
+            self.digests.append(self.digest(record))
+            self.summary_cache.clear()
+            return cursor.lastrowid
+
+    def page(self, cursor: Optional[int] = None, limit: int = 20) -> Dict[str, Any]:
+        # Newest first; pass the returned next_cursor to continue with older tasks
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, record FROM tasks WHERE id < ? ORDER BY id DESC LIMIT ?",
+                (cursor if cursor is not None else 2**63 - 1, limit + 1),
+            ).fetchall()
+        items = [{"id": task_id, **json.loads(record)} for task_id, record in rows[:limit]]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        return {"task_history": items, "next_cursor": next_cursor}
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            view = []
+            for (api, model), stats in self.aggregates.items():
+                latencies = np.array(self.latencies.get((api, model)) or [0.0])
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                view.append(
+                    {
+                        "api": api,
+                        "model": model,
+                        "tasks": int(stats["count"]),
+                        "failure_rate": round(stats["failures"] / stats["count"], 3),
+                        "avg_score": (
+                            round(stats["score_sum"] / stats["score_count"], 2)
+                            if stats["score_count"]
+                            else None
+                        ),
+                        "latency_p50": round(float(p50), 3),
+                        "latency_p95": round(float(p95), 3),
+                        "latency_p99": round(float(p99), 3),
+                    }
+                )
+            return view
+
+    @staticmethod
+    def digest(record: Dict[str, Any]) -> Dict[str, Any]:
+        evaluation = record.get("evaluation") or {}
+        return {
+            "task": truncate_tokens(record["task"], 50),
+            "status": record["status"],
+            "score": evaluation.get("score"),
+            "improvements": truncate_tokens(str(evaluation.get("improvements", "")), 75),
+            "error": truncate_tokens(record["error"], 50) if record.get("error") else None,
+        }
+
+    def summary(self, recent: int = 5) -> Dict[str, Any]:
+        # Compact view for the optimizer: aggregates plus a few recent task digests
+        with self.lock:
+            cached = self.summary_cache.get(recent)
+            if cached is not None:
+                return cached
+            digests = list(self.digests)[-recent:]
+        summary = {
+            "total_tasks": len(self),
+            "by_backend": self.stats(),
+            "recent_tasks": digests,
+        }
+        with self.lock:
+            self.summary_cache[recent] = summary
+        return summary
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,117 @@
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+class VectorIndex:
+    """In-memory vector index with incremental upserts and top-k search.
+
+    The default "numpy" backend is an exact brute-force inner product over a
+    contiguous float32 matrix. The optional "hnsw" backend (requires hnswlib)
+    keeps search latency flat for very large stores.
+    """
+
+    def __init__(self, dim: int, backend: str = "numpy", capacity: int = 1024):
+        if backend not in ("numpy", "hnsw"):
+            raise ValueError(f"Invalid vector index backend: {backend}")
+        if backend == "hnsw" and hnswlib is None:
+            raise ImportError("The 'hnsw' vector index backend requires hnswlib")
+        self.dim = dim
+        self.backend = backend
+        self.capacity = capacity
+        self.payloads: Dict[str, Any] = {}
+
+        if backend == "numpy":
+            self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+            self.keys: List[str] = []
+            self.rows: Dict[str, int] = {}
+        else:
+            self.ann = hnswlib.Index(space="ip", dim=dim)
+            self.ann.init_index(max_elements=capacity, ef_construction=200, M=16)
+            self.ann.set_ef(64)
+            self.labels: Dict[str, int] = {}
+            self.label_keys: Dict[int, str] = {}
+            self.next_label = 0
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.payloads
+
+    def upsert(self, key: str, vector: np.ndarray, payload: Any = None):
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.backend == "numpy":
+            row = self.rows.get(key)
+            if row is None:
+                row = len(self.keys)
+                if row == self.capacity:
+                    self.capacity *= 2
+                    grown = np.zeros((self.capacity, self.dim), dtype=np.float32)
+                    grown[:row] = self.vectors[:row]
+                    self.vectors = grown
+                self.keys.append(key)
+                self.rows[key] = row
+            self.vectors[row] = vector
+        else:
+            if key in self.labels:
+                self.ann.mark_deleted(self.labels.pop(key))
+            if self.next_label == self.capacity:
+                self.capacity *= 2
+                self.ann.resize_index(self.capacity)
+            label = self.next_label
+            self.next_label += 1
+            self.ann.add_items(vector.reshape(1, -1), np.array([label]))
+            self.labels[key] = label
+            self.label_keys[label] = key
+        self.payloads[key] = payload
+
+    def remove(self, key: str):
+        if key not in self.payloads:
+            return
+        del self.payloads[key]
+        if self.backend == "numpy":
+            # Swap the last row into the hole to keep the matrix contiguous
+            row = self.rows.pop(key)
+            last = len(self.keys) - 1
+            if row != last:
+                moved = self.keys[last]
+                self.vectors[row] = self.vectors[last]
+                self.keys[row] = moved
+                self.rows[moved] = row
+            self.keys.pop()
+        else:
+            label = self.labels.pop(key)
+            del self.label_keys[label]
+            self.ann.mark_deleted(label)
+
+    def search(
+        self, vector: np.ndarray, k: int, min_score: Optional[float] = None
+    ) -> List[Tuple[str, float, Any]]:
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        vector = np.asarray(vector, dtype=np.float32)
+
+        if self.backend == "numpy":
+            scores = self.vectors[: len(self.keys)] @ vector
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            hits = [(self.keys[row], float(scores[row])) for row in top]
+        else:
+            labels, distances = self.ann.knn_query(vector.reshape(1, -1), k=k)
+            # hnswlib's "ip" distance is 1 - inner product
+            hits = [
+                (self.label_keys[int(label)], 1.0 - float(distance))
+                for label, distance in zip(labels[0], distances[0])
+            ]
+
+        return [
+            (key, score, self.payloads[key])
+            for key, score in hits
+            if min_score is None or score >= min_score
+        ]
@@ -0,0 +1,56 @@
+from typing import Any, Dict, List, Tuple
+import math
+import re
+import numpy as np
+
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def as_number(value: Any) -> float:
+    # Scores given as "85" or "85/100" count; anything else is missing
+    if isinstance(value, str):
+        match = NUMBER_PATTERN.search(value)
+        value = float(match.group()) if match else None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    return float(value)
+
+
+def score_matrix(
+    options: List[str], criteria: List[str], scores: Dict[str, Dict[str, Any]]
+) -> np.ndarray:
+    # options x criteria, NaN where an option has no numeric score for a criterion
+    matrix = np.full((len(options), len(criteria)), np.nan)
+    for row, option in enumerate(options):
+        known = scores.get(option)
+        if not isinstance(known, dict):
+            continue
+        for column, criterion in enumerate(criteria):
+            matrix[row, column] = as_number(known.get(criterion))
+    return matrix
+
+
+def missing_cells(
+    matrix: np.ndarray, options: List[str], criteria: List[str]
+) -> Dict[str, List[str]]:
+    rows, columns = np.nonzero(np.isnan(matrix))
+    missing: Dict[str, List[str]] = {}
+    for row, column in zip(rows.tolist(), columns.tolist()):
+        missing.setdefault(options[row], []).append(criteria[column])
+    return missing
+
+
+def weighted_scores(matrix: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    # Cells still unknown count as the criterion's average, so they neither help nor hurt
+    column_means = np.nanmean(np.where(np.isnan(matrix).all(axis=0), 0.0, matrix), axis=0)
+    filled = np.where(np.isnan(matrix), column_means, matrix)
+    total = np.abs(weights).sum()
+    return filled @ weights / total if total else np.zeros(len(matrix))
+
+
+def rank(options: List[str], totals: np.ndarray, top_k: int) -> List[Tuple[str, float]]:
+    top_k = min(top_k, len(options))
+    top = np.argpartition(-totals, top_k - 1)[:top_k]
+    # Stable order, so ties go to the option listed first
+    top = top[np.lexsort((top, -totals[top]))]
+    return [(options[index], round(float(totals[index]), 3)) for index in top]
@@ -0,0 +1,180 @@
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+import threading
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values: Dict[LabelValues, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for values, total in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, values)} {total}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str],
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [per-bucket counts..., +Inf count], sum
+        self.values: Dict[LabelValues, Tuple[List[int], float]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self.lock:
+            counts, total = self.values.get(label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self.values[label_values] = (counts, total + value)
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for values, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = format_labels(self.labels, values, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.labels, values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Prometheus metrics in the text exposition format, without a client library."""
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str]) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help_text, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str],
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help_text, labels, buckets))
+
+    def expose(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+stage_duration = metrics.histogram(
+    "agent_stage_duration_seconds",
+    "Duration of component method calls",
+    ["component", "method", "status"],
+)
+provider_duration = metrics.histogram(
+    "agent_provider_request_duration_seconds",
+    "Duration of individual provider requests",
+    ["api", "model", "status"],
+)
+provider_tokens = metrics.counter(
+    "agent_provider_tokens_total",
+    "Tokens sent to and received from providers",
+    ["api", "model", "type"],
+)
+llm_cache = metrics.counter(
+    "agent_llm_cache_lookups_total",
+    "Response cache lookups made by the gateway",
+    ["result"],
+)
+llm_retries = metrics.counter(
+    "agent_llm_retries_total",
+    "Provider requests beyond the first one for a call, by cause",
+    ["cause"],
+)
+rate_limit_wait = metrics.histogram(
+    "agent_rate_limit_wait_seconds",
+    "Time provider requests queued for client-side rate limit capacity",
+    ["api", "model"],
+)
+rate_limit_rejections = metrics.counter(
+    "agent_rate_limit_rejections_total",
+    "Requests refused by the client-side rate limiter, by where they were refused",
+    ["api", "model", "stage"],
+)
+model_escalations = metrics.counter(
+    "agent_model_escalations_total",
+    "Re-asks sent to a larger model after a reply failed to parse or validate",
+    ["api", "model", "escalated_to"],
+)
+llm_coalesced = metrics.counter(
+    "agent_llm_coalesced_total",
+    "Provider requests by whether they led an upstream call or shared an identical in-flight one",
+    ["role"],
+)
+llm_coalesced_wait = metrics.histogram(
+    "agent_llm_coalesced_wait_seconds",
+    "Time requests spent waiting on an identical in-flight provider call",
+    [],
+)
+prompt_tokens = metrics.counter(
+    "agent_prompt_tokens_total",
+    "Prompt tokens per component call before (original) and after (sent) compaction",
+    ["call", "kind"],
+)
+jobs_finished = metrics.counter(
+    "agent_jobs_total",
+    "Background jobs that reached a final status",
+    ["status"],
+)
+job_queue_wait = metrics.histogram(
+    "agent_job_queue_wait_seconds",
+    "Time background jobs spent queued before a worker picked them up",
+    [],
+)
+plan_library_lookups = metrics.counter(
+    "agent_plan_library_lookups_total",
+    "Plan library lookups by outcome (reuse, refine or miss)",
+    ["result"],
+)
+plan_library_saved = metrics.counter(
+    "agent_plan_library_saved_seconds_total",
+    "Estimated planning time saved by reusing or refining stored plans",
+    ["result"],
+)
@@ -0,0 +1,187 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence, Tuple
+import re
+import textwrap
+import threading
+import orjson
+from config.config import PROMPT_BUDGET_ENABLED, PROMPT_TOKEN_BUDGETS, PROMPT_DEFAULT_BUDGET
+from src.utils.metrics import prompt_tokens
+from src.utils.tokens import estimate_tokens, truncate_tokens
+from src.utils.tracing import annotate
+
+PLACEHOLDER_PATTERN = re.compile(r"\{(\w+)\}")
+# Below this many tokens an element is not worth keeping in truncated form
+MIN_ITEM_TOKENS = 12
+
+
+def render(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    try:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    except TypeError:
+        return str(value)
+
+
+def is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def share(sizes: List[int], budget: int) -> List[int]:
+    # Water-filling: small parts keep their full size, large ones split what is left evenly
+    allocation = [0] * len(sizes)
+    remaining = budget
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while pending:
+        fair = remaining // len(pending)
+        index = pending.pop(0)
+        allocation[index] = min(sizes[index], fair)
+        remaining -= allocation[index]
+    return allocation
+
+
+def compact(value: Any, max_tokens: int) -> str:
+    """Render a value within max_tokens using deterministic rules.
+
+    Values that fit are rendered as compact JSON. Otherwise empty fields are
+    dropped from mappings, the budget is shared between entries (smallest
+    first), sequences keep as many leading items as fit plus a count of the
+    rest, and long strings keep their head and tail.
+    """
+    text = render(value)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    if isinstance(value, dict):
+        items = [(str(k), v) for k, v in value.items() if not is_empty(v)]
+        overhead = sum(estimate_tokens(key) + 2 for key, _ in items) + 2
+        sizes = [estimate_tokens(render(v)) for _, v in items]
+        allocation = share(sizes, max(max_tokens - overhead, 0))
+        parts = [
+            f"{key}: {compact(v, budget)}"
+            for (key, v), size, budget in zip(items, sizes, allocation)
+            if budget >= min(MIN_ITEM_TOKENS, size)
+        ]
+        dropped = len(items) - len(parts)
+        if dropped:
+            parts.append(f"(+{dropped} more fields)")
+        return "{" + ", ".join(parts) + "}"
+
+    if isinstance(value, (list, tuple)):
+        budget = max(max_tokens - 6, 0)
+        sizes = [estimate_tokens(render(item)) for item in value]
+        keep = len(value)
+        # Drop trailing items until each kept one can get a useful share
+        while keep > 1 and budget // keep < min(MIN_ITEM_TOKENS, max(sizes[:keep])):
+            keep -= 1
+        allocation = share(sizes[:keep], budget)
+        parts = [compact(item, size) for item, size in zip(value[:keep], allocation)]
+        if keep < len(value):
+            parts.append(f"... (+{len(value) - keep} more items)")
+        return "[" + ", ".join(parts) + "]"
+
+    return truncate_tokens(text, max_tokens)
+
+
+class PromptMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[str, Dict[str, int]] = {}
+
+    def record(self, name: str, original: int, sent: int, compacted_fields: int):
+        with self.lock:
+            stats = self.calls.setdefault(
+                name,
+                {"calls": 0, "original_tokens": 0, "sent_tokens": 0, "compacted_fields": 0},
+            )
+            stats["calls"] += 1
+            stats["original_tokens"] += original
+            stats["sent_tokens"] += sent
+            stats["compacted_fields"] += compacted_fields
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            return {
+                name: {
+                    **stats,
+                    "saved_tokens": stats["original_tokens"] - stats["sent_tokens"],
+                    "saved_ratio": round(
+                        1 - stats["sent_tokens"] / stats["original_tokens"], 3
+                    )
+                    if stats["original_tokens"]
+                    else 0.0,
+                }
+                for name, stats in self.calls.items()
+            }
+
+
+prompt_metrics = PromptMetrics()
+
+
+def call_budget(name: str) -> int:
+    return PROMPT_TOKEN_BUDGETS.get(name, PROMPT_DEFAULT_BUDGET)
+
+
+@lru_cache(maxsize=256)
+def prepare(template: str) -> Tuple[str, int, int]:
+    # Templates are constants: dedent and count their fixed text once
+    # (prompt templates are indented with the code, which is pure token overhead)
+    dedented = textwrap.dedent(template).strip()
+    return (
+        dedented,
+        estimate_tokens(PLACEHOLDER_PATTERN.sub("", template)),
+        estimate_tokens(PLACEHOLDER_PATTERN.sub("", dedented)),
+    )
+
+
+def fill(template: str, values: Dict[str, str]) -> str:
+    # Single-pass {name} substitution: other braces in prompts need no escaping,
+    # and placeholders inside field values are left alone
+    return PLACEHOLDER_PATTERN.sub(
+        lambda match: values.get(match.group(1), match.group(0)), template
+    )
+
+
+def build_prompt(
+    name: str, template: str, keep: Sequence[str] = (), **fields: Any
+) -> str:
+    """Assemble a prompt from a template and its fields within the call's token budget.
+
+    Fields named in `keep` are never compacted; the rest share what is left.
+    The original prompt (fields interpolated with str(), as the components
+    used to do) is counted too, so savings are recorded for every call:
+    on the active span, in /prompt_metrics and in Prometheus.
+    """
+    # Token counts are added up per part, so the full prompt is never re-tokenized
+    template, original_fixed, fixed = prepare(template)
+    original_fields = {key: str(value) for key, value in fields.items()}
+    original_sizes = {key: estimate_tokens(text) for key, text in original_fields.items()}
+    original = original_fixed + sum(original_sizes.values())
+    if not PROMPT_BUDGET_ENABLED:
+        values, sizes, compacted = original_fields, original_sizes, 0
+    else:
+        values, sizes, compacted = {}, {}, 0
+        for key in keep:
+            values[key] = original_fields[key] if isinstance(fields[key], str) else render(fields[key])
+            sizes[key] = estimate_tokens(values[key])
+        flexible = [key for key in fields if key not in values]
+        rendered = {key: render(fields[key]) for key in flexible}
+        rendered_sizes = [estimate_tokens(rendered[key]) for key in flexible]
+        available = max(call_budget(name) - fixed - sum(sizes.values()), 0)
+        for key, size, limit in zip(flexible, rendered_sizes, share(rendered_sizes, available)):
+            if size <= limit:
+                values[key], sizes[key] = rendered[key], size
+            else:
+                values[key] = compact(fields[key], limit)
+                sizes[key] = estimate_tokens(values[key])
+                compacted += 1
+    prompt = fill(template, values)
+    sent = fixed + sum(sizes.values())
+    prompt_metrics.record(name, original, sent, compacted)
+    prompt_tokens.inc(name, "original", amount=original)
+    prompt_tokens.inc(name, "sent", amount=sent)
+    annotate("prompt.name", name)
+    annotate("prompt.original_tokens", original)
+    annotate("prompt.tokens", sent)
+    annotate("prompt.saved_tokens", original - sent)
+    return prompt
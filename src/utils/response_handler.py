@@ -1,9 +1,37 @@
 from typing import Literal
+import time
+from config.config import JSON_MODE_APIS
 from src.clients.openai_client import get_openai_response
 from src.clients.groq_client import get_groq_response
 from src.clients.openrouter_client import get_openrouter_response
+from src.clients.local_client import get_local_response
+from src.clients.registry import registry
+from src.clients.router import router
 
-ClientType = Literal["openai", "groq", "openrouter"]
+ClientType = Literal["openai", "groq", "openrouter", "local", "auto"]
+
+def get_routed_response(prompt: str, json_mode: bool = False) -> str:
+    # Try every configured backend, healthiest first, until one answers
+    last_error = None
+    for api, model in router.candidates("auto"):
+        started = time.perf_counter()
+        try:
+            kwargs = {
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}]
+            }
+            if json_mode and api in JSON_MODE_APIS:
+                kwargs["response_format"] = {"type": "json_object"}
+
+            response = registry.sync_client(api).chat.completions.create(**kwargs)
+            router.record(api, model, time.perf_counter() - started, True)
+            return response.choices[0].message.content
+        except Exception as e:
+            router.record(api, model, time.perf_counter() - started, False)
+            print(f"Error with {api} model {model}: {e}")
+            last_error = e
+
+    raise Exception(f"All backends failed: {last_error}")
 
 def get_llm_response(client: ClientType, prompt: str, json_mode: bool = False) -> str:
     if client == "openai":
@@ -12,5 +40,9 @@ def get_llm_response(client: ClientType, prompt: str, json_mode: bool = False) -
         return get_groq_response(prompt, json_mode)
     elif client == "openrouter":
         return get_openrouter_response(prompt, json_mode)
+    elif client == "local":
+        return get_local_response(prompt, json_mode)
+    elif client == "auto":
+        return get_routed_response(prompt, json_mode)
     else:
-        raise ValueError(f"Invalid client: {client}")
\ No newline at end of file
+        raise ValueError(f"Invalid client: {client}")
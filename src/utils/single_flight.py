@@ -0,0 +1,72 @@
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+import time
+from src.utils.metrics import llm_coalesced, llm_coalesced_wait
+from src.utils.tracing import annotate
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one upstream call.
+
+    The first caller (the leader) starts the call as a task; callers that
+    arrive while it is in flight await the same task and get its result or
+    exception. The call is only cancelled once every caller waiting on it
+    has been cancelled.
+    """
+
+    def __init__(self):
+        self.calls: Dict[str, asyncio.Task] = {}
+        self.waiters: Dict[str, int] = {}
+        self.stats = {"calls": 0, "shared": 0, "shared_wait_sum": 0.0}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats["calls"] += 1
+        task = self.calls.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.create_task(func())
+            self.calls[key] = task
+            self.waiters[key] = 0
+            task.add_done_callback(lambda _: self.forget(key, task))
+            llm_coalesced.inc("leader")
+        else:
+            self.stats["shared"] += 1
+            llm_coalesced.inc("shared")
+            annotate("llm.coalesced", True)
+
+        self.waiters[key] += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self.waiters.get(key) == 1:
+                task.cancel()
+            raise
+        finally:
+            if self.calls.get(key) is task:
+                self.waiters[key] -= 1
+            if not leader:
+                waited = time.perf_counter() - started
+                self.stats["shared_wait_sum"] += waited
+                llm_coalesced_wait.observe(waited)
+
+    def forget(self, key: str, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+            del self.waiters[key]
+        # Nobody may be left to retrieve it, e.g. when the leader was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        calls, shared = self.stats["calls"], self.stats["shared"]
+        return {
+            "calls": calls,
+            "upstream_calls": calls - shared,
+            "shared": shared,
+            "shared_ratio": round(shared / calls, 3) if calls else 0.0,
+            "avg_shared_wait": round(self.stats["shared_wait_sum"] / shared, 4)
+            if shared
+            else 0.0,
+            "in_flight": len(self.calls),
+        }
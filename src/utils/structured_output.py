@@ -0,0 +1,205 @@
+from typing import Any, Dict, List, Optional, Tuple
+import ast
+import re
+import orjson
+from pydantic import TypeAdapter, ValidationError
+
+
+class ParseError(ValueError):
+    pass
+
+
+FENCE_PATTERN = re.compile(r"```(?:json|python|py)?\s*(.*?)```", re.S | re.I)
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+BARE_LITERALS = {"true": "True", "false": "False", "null": "None"}
+BARE_LITERAL_PATTERN = re.compile(r"\b(true|false|null)\b")
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+CLOSERS = {"{": "}", "[": "]"}
+
+
+def extract_candidate(text: str) -> str:
+    fenced = FENCE_PATTERN.search(text)
+    if fenced:
+        text = fenced.group(1)
+
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    if not starts:
+        return text.strip()
+    start = min(starts)
+    end = text.rfind(CLOSERS[text[start]])
+    return text[start : end + 1] if end > start else text[start:]
+
+
+def close_brackets(text: str) -> str:
+    # Append closers for a reply that was cut off mid-structure
+    stack = []
+    quote = None
+    escaped = False
+    for char in text:
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in CLOSERS:
+            stack.append(CLOSERS[char])
+        elif stack and char == stack[-1]:
+            stack.pop()
+    if quote:
+        text += quote
+    return text + "".join(reversed(stack))
+
+
+class StructuredOutputParser:
+    """Turns model replies into validated data without eval().
+
+    Replies are decoded with orjson first; if that fails a sequence of
+    deterministic repairs (code fences, surrounding prose, trailing commas,
+    Python literals, truncated brackets) is tried before the caller has to
+    re-ask the model.
+    """
+
+    def __init__(self):
+        self.adapters: Dict[Any, TypeAdapter] = {}
+        self.metrics = {
+            "parsed": 0,
+            "clean": 0,
+            "repaired": 0,
+            "reasks": 0,
+            "failures": 0,
+        }
+
+    def adapter(self, schema: Any) -> TypeAdapter:
+        key = repr(schema)
+        if key not in self.adapters:
+            self.adapters[key] = TypeAdapter(schema)
+        return self.adapters[key]
+
+    def expects_object(self, schema: Any) -> bool:
+        return self.adapter(schema).json_schema().get("type") == "object"
+
+    def decode(self, text: str) -> Tuple[Any, bool]:
+        try:
+            return orjson.loads(text), False
+        except orjson.JSONDecodeError:
+            pass
+
+        candidate = extract_candidate(text.translate(SMART_QUOTES))
+        candidates = [candidate, TRAILING_COMMA_PATTERN.sub(r"\1", candidate)]
+        candidates.append(close_brackets(candidates[-1]))
+        for attempt in candidates:
+            try:
+                return orjson.loads(attempt), True
+            except orjson.JSONDecodeError:
+                pass
+        for attempt in candidates:
+            for literal in (
+                attempt,
+                BARE_LITERAL_PATTERN.sub(lambda m: BARE_LITERALS[m.group(1)], attempt),
+            ):
+                try:
+                    return ast.literal_eval(literal), True
+                except (ValueError, SyntaxError, MemoryError, RecursionError):
+                    pass
+        raise ParseError("Reply is not valid JSON and could not be repaired")
+
+    def parse(self, text: Optional[str], schema: Any, record: bool = True) -> Any:
+        try:
+            if not text:
+                raise ParseError("Reply is empty")
+            data, repaired = self.decode(text)
+            adapter = self.adapter(schema)
+            try:
+                validated = adapter.validate_python(data)
+            except ValidationError as e:
+                # JSON mode forces an object, so lists often come back wrapped
+                wrapped = list(data.values()) if isinstance(data, dict) else []
+                if len(wrapped) != 1 or not isinstance(wrapped[0], list):
+                    raise ParseError(
+                        f"Reply does not match the expected format: {e}"
+                    ) from e
+                try:
+                    validated = adapter.validate_python(wrapped[0])
+                except ValidationError:
+                    raise ParseError(
+                        f"Reply does not match the expected format: {e}"
+                    ) from e
+                repaired = True
+        except ParseError:
+            if record:
+                self.metrics["failures"] += 1
+            raise
+
+        if record:
+            self.metrics["parsed"] += 1
+            self.metrics["repaired" if repaired else "clean"] += 1
+        return adapter.dump_python(validated, exclude_unset=True)
+
+    def record_reask(self):
+        self.metrics["reasks"] += 1
+
+    @staticmethod
+    def reask_prompt(prompt: str, reply: str, error: Exception) -> str:
+        return (
+            f"{prompt}\n\nYour previous reply could not be used:\n{reply}\n\n"
+            f"Problem: {error}\n"
+            "Reply again with only valid JSON in the requested format and nothing else."
+        )
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {**self.metrics, "reasks_avoided": self.metrics["repaired"]}
+
+
+class ArrayItemSplitter:
+    """Cuts the elements of the first JSON array in a streamed reply.
+
+    Text is fed as it arrives; every call returns the source of the array
+    elements that were completed by it, so each can be parsed before the
+    rest of the reply exists. Prose or an object wrapped around the array
+    is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        # Depth of the array whose elements are emitted, once it has been seen
+        self.root: Optional[int] = None
+        self.start: Optional[int] = None
+        self.quote: Optional[str] = None
+        self.escaped = False
+        self.done = False
+
+    def feed(self, text: str) -> List[str]:
+        self.buffer += text
+        items = []
+        while self.position < len(self.buffer) and not self.done:
+            char = self.buffer[self.position]
+            if self.quote:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == self.quote:
+                    self.quote = None
+            elif char == '"':
+                self.quote = char
+            elif char in "[{":
+                self.depth += 1
+                if self.root is None and char == "[":
+                    self.root = self.depth
+                elif self.root is not None and self.depth == self.root + 1:
+                    self.start = self.position
+            elif char in "]}":
+                if self.root is not None and self.depth == self.root + 1:
+                    items.append(self.buffer[self.start : self.position + 1])
+                    self.start = None
+                elif self.depth == self.root:
+                    self.done = True
+                self.depth -= 1
+            self.position += 1
+        return items
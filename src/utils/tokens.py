@@ -0,0 +1,79 @@
+from functools import lru_cache
+from typing import List, Tuple
+import logging
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Fallback pre-tokenizer: runs of letters/digits and single punctuation marks,
+# roughly how BPE vocabularies split English text and code
+PIECE_PATTERN = re.compile(r"[^\W\d_]+|\d{1,3}|[^\w\s]|_")
+# BPE splits long words into pieces of about this many characters
+CHARS_PER_PIECE = 6
+
+
+@lru_cache(maxsize=1)
+def encoding():
+    # tiktoken may need to fetch its vocabulary once; stay offline-safe if it cannot
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logging.warning(f"tiktoken unavailable, using the approximate tokenizer: {e}")
+        return None
+
+
+def token_spans(text: str) -> List[Tuple[int, int]]:
+    spans = []
+    for match in PIECE_PATTERN.finditer(text):
+        start, end = match.span()
+        for piece_start in range(start, end, CHARS_PER_PIECE):
+            spans.append((piece_start, min(piece_start + CHARS_PER_PIECE, end)))
+    return spans
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return sum(
+        (len(piece) + CHARS_PER_PIECE - 1) // CHARS_PER_PIECE
+        for piece in PIECE_PATTERN.findall(text)
+    )
+
+
+def truncate_tokens(text: str, max_tokens: int, marker: str = " ... ") -> str:
+    # Deterministic head-and-tail cut: beginnings and conclusions carry the most signal
+    if max_tokens <= 0:
+        return ""
+    enc = encoding()
+    if enc is not None:
+        tokens = enc.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        head = max_tokens * 2 // 3
+        tail = max_tokens - head
+        omitted = len(tokens) - max_tokens
+        return (
+            enc.decode(tokens[:head])
+            + f"{marker}[{omitted} tokens omitted]{marker}"
+            + (enc.decode(tokens[-tail:]) if tail else "")
+        )
+
+    spans = token_spans(text)
+    if len(spans) <= max_tokens:
+        return text
+    head = max_tokens * 2 // 3
+    tail = max_tokens - head
+    omitted = len(spans) - max_tokens
+    return (
+        text[: spans[head][0]].rstrip()
+        + f"{marker}[{omitted} tokens omitted]{marker}"
+        + (text[spans[-tail][0] :].lstrip() if tail else "")
+    )
@@ -0,0 +1,193 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+import asyncio
+import functools
+import inspect
+import logging
+import os
+import time
+import httpx
+from config.config import (
+    TRACING_ENABLED,
+    TRACE_BUFFER_SIZE,
+    OTEL_EXPORTER_OTLP_ENDPOINT,
+    OTEL_SERVICE_NAME,
+    OTEL_EXPORT_INTERVAL,
+)
+from src.utils.metrics import stage_duration
+
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float = 1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Tracer:
+    """Span tracing for component methods and provider calls.
+
+    Spans nest through a context variable, so the tasks the pipeline fans
+    out stay in the trace of the request that started them. Finished spans
+    are kept in a ring buffer (served as OTLP/JSON) and, when an OTLP
+    endpoint is configured, batched and pushed to it over HTTP.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = TRACING_ENABLED,
+        buffer_size: int = TRACE_BUFFER_SIZE,
+        endpoint: Optional[str] = OTEL_EXPORTER_OTLP_ENDPOINT,
+        service_name: str = OTEL_SERVICE_NAME,
+    ):
+        self.enabled = enabled
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.finished: Deque[Span] = deque(maxlen=buffer_size)
+        self.pending: Deque[Span] = deque(maxlen=buffer_size)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        if not self.enabled:
+            yield None
+            return
+        span = Span(name, current_span.get(), attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = str(e) or type(e).__name__
+            raise
+        finally:
+            current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self.finished.append(span)
+            if self.endpoint:
+                self.pending.append(span)
+
+    def otlp(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [otlp_attribute("service.name", self.service_name)]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "ai-agent"},
+                            "spans": [span.to_otlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def recent(self, limit: int = 100) -> Dict[str, Any]:
+        return self.otlp(list(self.finished)[-limit:])
+
+    async def export(self, client: httpx.AsyncClient):
+        batch = [self.pending.popleft() for _ in range(len(self.pending))]
+        if not batch:
+            return
+        try:
+            response = await client.post(
+                f"{self.endpoint.rstrip('/')}/v1/traces", json=self.otlp(batch)
+            )
+            response.raise_for_status()
+        except Exception as e:
+            logging.warning(f"Trace export failed for {len(batch)} spans: {e}")
+
+    async def export_forever(self, interval: float = OTEL_EXPORT_INTERVAL):
+        async with httpx.AsyncClient(timeout=10) as client:
+            try:
+                while True:
+                    await asyncio.sleep(interval)
+                    await self.export(client)
+            finally:
+                await self.export(client)
+
+
+tracer = Tracer()
+
+
+def annotate(key: str, value: Any = 1, increment: bool = False):
+    # Attach data to whatever span is active, if any
+    span = current_span.get()
+    if span is not None:
+        span.add(key, value) if increment else span.set(key, value)
+
+
+def traced(component: str, method: str):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            status = "error"
+            started = time.perf_counter()
+            try:
+                with tracer.span(f"{component}.{method}", component=component):
+                    result = await func(*args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                stage_duration.observe(
+                    time.perf_counter() - started, component, method, status
+                )
+
+        return wrapper
+
+    return decorator
+
+
+def instrument(component: str):
+    # Class decorator: trace every public coroutine method of a component
+    def decorator(cls):
+        for name, member in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.iscoroutinefunction(member):
+                setattr(cls, name, traced(component, name)(member))
+        return cls
+
+    return decorator